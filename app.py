@@ -1,10 +1,18 @@
 import os
-import re
-import glob
-from flask import Flask, render_template, request, redirect, url_for, jsonify, render_template_string, send_file
+from flask import Flask, render_template, request, redirect, url_for, jsonify, render_template_string, send_file, stream_with_context
+import click
+from flask.cli import AppGroup
 import appconfig
 import tmdb_api
-from lib.database import db
+from lib import (
+    apk, assets, clicks, httpcache, iconcache, imageproxy, images, linkio, pagecache, paging, popscripts, prewarm,
+    ratelimit, resilience, shortlinks, tmdbstandin, views
+)
+from lib import sitemap as sitemap_builder
+from lib.genres import catalog as genre_catalog
+from lib import database
+from lib.parallel import fetch_parallel
+from lib.views import error_page
 
 # Load environment variables from web.env file
 from dotenv import load_dotenv
@@ -12,47 +20,144 @@ load_dotenv('env.web')
 
 app = Flask(__name__)
 app.config.from_object(appconfig.Config)
-# app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI')
-# db.init_app(app)
+# The environment (or env.web) may point the app at a TMDB stand-in, see `flask standin serve`
+for name in ('TMDB_API_URL', 'TMDB_IMAGE_BASE_URL'):
+    if os.environ.get(name):
+        app.config[name] = os.environ[name]
+database.init_app(app)
+iconcache.load(app.static_folder)
+assets.init_app(app)
+images.init_app(app)
 
 # ZAP_DOMAIN = 'https://zap.buzz'
 # ### ### ### ### ### ### ###
 
-ZAPS = {}
-# ZAPS_COUNT = 100000
+@app.before_request
+def start_prewarmer():
+    # Threads do not survive the fork into workers, so start lazily per process
+    prewarm.start(app)
+    shortlinks.start_warming(app)
+
+@app.after_request
+def add_cache_headers(response):
+    return httpcache.apply(response)
+
+@app.cli.command('prewarm')
+def prewarm_command():
+    """Refresh the home, listing and genre feeds once."""
+    errors = prewarm.Prewarmer(app).run_once()
+    print("Prewarm finished with {} error(s)".format(errors))
+
+@app.cli.command('sitemap')
+def sitemap_command():
+    """Build a sitemap generation unless the current one is fresh (run at deploy time)."""
+    with ratelimit.priority(ratelimit.BACKGROUND):
+        index = sitemap_builder.regenerate()
+    print("Sitemap generation {} has {} shard(s)".format(index['generation'], len(index['shards'])))
+
+# Paths requested by `flask smoke`: the home page and the JSON endpoints pages rely on
+SMOKE_PATHS = ('/', '/api/genres', '/api/tv/genres')
+
+@app.cli.command('smoke')
+@click.argument('paths', nargs=-1)
+def smoke_command(paths):
+    """Request pages in-process and fail if any does not answer 200."""
+    failures = 0
+    with app.test_client() as client:
+        for path in paths or SMOKE_PATHS:
+            response = client.get(path)
+            print("{} {}".format(response.status_code, path))
+            failures += response.status_code != 200
+    if failures:
+        raise SystemExit(1)
+
+links_cli = AppGroup('links', help='Bulk short-link import and export.')
+
+@links_cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None, help='Defaults to the file extension.')
+@click.option('--batch-size', default=linkio.DEFAULT_BATCH_SIZE, show_default=True)
+def import_links_command(source, fmt, batch_size):
+    """Import links from a CSV or JSONL file ('-' for stdin)."""
+    fmt = fmt or ('jsonl' if source.name.endswith(('.jsonl', '.json')) else 'csv')
+    imported, skipped, conflicts, invalid = linkio.import_links(
+        source, fmt, batch_size=batch_size,
+        code_length=app.config.get('SHORTLINK_CODE_LENGTH', linkio.DEFAULT_CODE_LENGTH)
+    )
+    print("Imported {} link(s), skipped {} row(s) without url, {} row(s) with a code already in use "
+          "and {} invalid row(s)".format(imported, skipped, conflicts, invalid))
+
+@links_cli.command('export')
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='jsonl', show_default=True)
+@click.option('--batch-size', default=linkio.DEFAULT_BATCH_SIZE, show_default=True)
+def export_links_command(target, fmt, batch_size):
+    """Stream every link to a CSV or JSONL file (stdout by default)."""
+    count = linkio.export_links(target, fmt, batch_size=batch_size)
+    click.echo("Exported {} link(s)".format(count), err=True)
+
+app.cli.add_command(links_cli)
+
+assets_cli = AppGroup('assets', help='Static bundle pipeline.')
+
+@assets_cli.command('build')
+def build_assets_command():
+    """Minify, fingerprint and precompress the CSS/JS bundles."""
+    for source, hashed in sorted(assets.build(app.static_folder).items()):
+        print("{} -> {}".format(source, hashed))
+
+app.cli.add_command(assets_cli)
+
+standin_cli = AppGroup('standin', help='Local TMDB stand-in for offline load testing.')
+
+@standin_cli.command('serve')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=tmdbstandin.DEFAULT_PORT, show_default=True)
+@click.option('--fixtures', default=None, help='Fixture directory, defaults to TMDB_STANDIN_FIXTURES_DIR.')
+@click.option('--record', is_flag=True, help='Fetch requests without a fixture from TMDB once and save them.')
+@click.option('--synthesize/--no-synthesize', default=True, show_default=True,
+              help='Generate responses for requests without a fixture.')
+@click.option('--latency', default=0.0, show_default=True, help='Milliseconds added to every response.')
+@click.option('--jitter', default=0.0, show_default=True, help='Extra random milliseconds, up to this.')
+@click.option('--error-rate', default=0.0, show_default=True, help='Fraction of requests answered with --error-status.')
+@click.option('--error-status', default=503, show_default=True)
+@click.option('--retry-after', default=0, show_default=True, help='Retry-After seconds sent with injected errors.')
+@click.option('--drop-rate', default=0.0, show_default=True, help='Fraction of connections closed without a response.')
+@click.option('--verbose', is_flag=True, help='Log every request.')
+def standin_serve_command(host, port, fixtures, record, synthesize, latency, jitter, error_rate, error_status,
+                          retry_after, drop_rate, verbose):
+    """Serve recorded (or synthesized) TMDB responses with injected latency and errors."""
+    directory = fixtures or app.config.get('TMDB_STANDIN_FIXTURES_DIR') or os.path.join(app.instance_path, 'tmdb-fixtures')
+    faults = tmdbstandin.Faults(latency, jitter, error_rate, error_status, retry_after, drop_rate)
+    standin = tmdbstandin.StandIn(directory, record=record, synthesize=synthesize, faults=faults)
+    server = tmdbstandin.make_server(standin, host, port, verbose=verbose)
+    base_url = 'http://{}:{}'.format(host, server.server_address[1])
+    print("TMDB stand-in on {} ({}), fixtures in {}".format(base_url, 'recording' if record else 'replay', directory))
+    print("Run the app with TMDB_API_URL={0}/3 TMDB_IMAGE_BASE_URL={0}/t/p/".format(base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+app.cli.add_command(standin_cli)
 
 @app.route('/<zap_code>')
 def redirect_short_url(zap_code):
     try:
-        return redirect(ZAPS[zap_code])
-    except KeyError as e:
-        from lib.link import Link
-        item = Link.query.filter_by(short_code=zap_code).first()
-        if item:
-            if len(ZAPS) < ZAPS_COUNT:
-                ZAPS[zap_code] = item.url
-            return redirect(item.url)
-        else:
-            return redirect(url_for('.index'))
-    return redirect(url_for('.index')) 
+        url = shortlinks.resolve(zap_code)
+    except Exception as e:
+        app.logger.error("Error resolving short code {}: {}".format(zap_code, str(e)))
+        url = None
+    if url:
+        clicks.record(app, zap_code)
+        return redirect(url)
+    return redirect(url_for('.index'))
 
 @app.route('/sub/<code>', methods=['GET', 'POST'])
 def system(code):
-    url= ''
-    if code == 'da4da2w':
-        url = 'https://xml.revrtb.net/redirect?feed=800738&auth=PEEB&pubid=217546'
-    elif code == 'r67qr6r':
-        url = 'https://xml.popmonetizer.net/redirect?feed=800775&auth=2l1V&pubid=217594'
-    elif code == 'rwe5qe':
-        url = 'https://xml.adxnexus.com/redirect?feed=800794&auth=OV4I&pubid=217593'
-    elif code == 'dqwd7':
-        url = 'https://xml.zeusadx.com/redirect?feed=800880&auth=ZQXK&pubid=217595'
-    elif code == 'adad8ad':
-        url = 'https://xml.acertb.com/redirect?feed=800865&auth=QY6P&pubid=217596'
-    elif code == 'w8qe8':
-        url = 'https://xml.poprtb.com/redirect?feed=800895&auth=U1lO&pubid=217598'
-    elif code == 'da7adsu3':
-        url = 'https://engine.spotscenered.info/link.engine?z=87558&guid=64ce86d5-613e-46af-b41b-6f9885140eab'
+    url = app.config['SUB_ROUTES'].get(code, '')
     return render_template('load.html', url=url)
 
 @app.route('/load', methods=['POST'])
@@ -63,50 +168,34 @@ def load():
 @app.route('/firstpage_home')
 def firstpage_home():
     try:
-        delay = 60
-        max = 20
-        dur = 0
-        default_url = "https://engine.spotscenered.info/link.engine?z=87558&guid=64ce86d5-613e-46af-b41b-6f9885140eab"
-        url1 = "https://engine.spotscenered.info/link.engine?z=87558&guid=64ce86d5-613e-46af-b41b-6f9885140eab"
-        url2 = "https://xml.revrtb.net/redirect?feed=800738&auth=PEEB&pubid=217546"
-        url3 = "https://xml.popmonetizer.net/redirect?feed=800775&auth=2l1V&pubid=217594"
-        url4 = "https://xml.adxnexus.com/redirect?feed=800794&auth=OV4I&pubid=217593"
-        page_key = 'firstpage'
-        
-        return render_template('pop_templatex.js', PAR_PAGE_KEY=page_key, 
-                                PAR_TRGURL1=url1, PAR_TRGURL2=url2, PAR_TRGURL3=url3, PAR_TRGURL4=url4, 
-                                PAR_TRGURL5=url1, PAR_DELAY=delay, PAR_MAX=max, PAR_DUR=dur, PAR_DEFURL=default_url, 
-                                PAR_MAX_PP=4)
+        return popscripts.make_response('firstpage_home')
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e)
 
 @app.route('/watch_page')
 def watch_page():
     try:
-        delay = 60
-        max = 20
-        dur = 0
-        default_url = "https://xml.zeusadx.com/redirect?feed=800880&auth=ZQXK&pubid=217595"
-        url1 = "https://xml.zeusadx.com/redirect?feed=800880&auth=ZQXK&pubid=217595"
-        url2 = "https://xml.acertb.com/redirect?feed=800865&auth=QY6P&pubid=217596"
-        url3 = "https://xml.poprtb.com/redirect?feed=800895&auth=U1lO&pubid=217598"
-        page_key = 'firstpage'
-        
-        return render_template('pop_templatex.js', PAR_PAGE_KEY=page_key, 
-                                PAR_TRGURL1=url1, PAR_TRGURL2=url2, PAR_TRGURL3=url3, PAR_TRGURL4=url1, 
-                                PAR_TRGURL5=url1, PAR_DELAY=delay, PAR_MAX=max, PAR_DUR=dur, PAR_DEFURL=default_url, 
-                                PAR_MAX_PP=3)
+        return popscripts.make_response('watch_page')
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e)
+
+def genre_response(genre_list):
+    """Serve a pre-serialized genre list, answering revalidations with 304."""
+    response = app.response_class(genre_list.json, mimetype='application/json')
+    if not genre_list.genres:
+        # A failed load must not be kept by browsers and CDNs for a day
+        response.cache_control.no_store = True
+        return response
+    response.set_etag(genre_list.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config.get('GENRE_CACHE_MAX_AGE', 24 * 60 * 60)
+    return response.make_conditional(request)
 
 @app.route('/api/genres')
 def api_genres():
     """API endpoint to get all movie genres."""
     try:
-        genres = tmdb_api.get_movie_genres()
-        return jsonify(genres)
+        return genre_response(genre_catalog.get('movie'))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -114,11 +203,28 @@ def api_genres():
 def api_tv_genres():
     """API endpoint to get all TV show genres."""
     try:
-        genres = tmdb_api.get_tv_show_genres()
-        return jsonify(genres)
+        return genre_response(genre_catalog.get('tv'))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    """API endpoint exposing TMDB response, rendered-output and short-link cache counters."""
+    # Internal details: only served where CACHE_STATS_ENABLED is set (keep it off public hosts)
+    if not app.config.get('CACHE_STATS_ENABLED'):
+        return render_template('404.html', title='Page Not Found'), 404
+    stats = {'tmdb': tmdb_api.cache_stats(), 'render': pagecache.stats(), 'snapshots': paging.get_store().stats(),
+             'shortlinks': shortlinks.stats(), 'clicks': clicks.stats(), 'images': imageproxy.stats(),
+             'breakers': resilience.stats(), 'ratelimit': ratelimit.stats()}
+    prewarmer = prewarm.get_running()
+    if prewarmer is not None:
+        stats['prewarm'] = {
+            'last_run': prewarmer.last_run,
+            'last_duration': prewarmer.last_duration,
+            'last_errors': prewarmer.last_errors
+        }
+    return jsonify(stats)
+
 @app.route('/adban')
 def adban():
     try:
@@ -127,170 +233,85 @@ def adban():
             'banner.html'
         )
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e)
 
 @app.route('/')
+@pagecache.cached('trending')
 def index():
     """Render the home page with popular and trending movies."""
     page = request.args.get('page', 1, type=int)
     
     try:
-        popular_movies = tmdb_api.get_popular_movies(page)
-        trending_movies = tmdb_api.get_trending_movies('week')
-        trending_tv_shows = tmdb_api.get_trending_tv_shows('week')
-        
-        # Check if we got empty results due to an error
-        if not popular_movies.get('results') and not trending_movies.get('results') and not trending_tv_shows.get('results'):
-            error_message = (
-                "Unable to fetch movies. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        return render_template(
-            'index.html', title='Home',
-            popular_movies=popular_movies,
-            trending_movies=trending_movies,
-            trending_tv_shows=trending_tv_shows,
-            current_page=page
+        popular_movies, trending_movies, trending_tv_shows = fetch_parallel(
+            (tmdb_api.get_popular_movies, page),
+            (tmdb_api.get_trending_movies, 'week'),
+            (tmdb_api.get_trending_tv_shows, 'week')
         )
+        return views.index_page(popular_movies, trending_movies, trending_tv_shows, page)
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'movies')
 
 @app.route('/movie/<int:movie_id>')
+@pagecache.cached('details')
 def movie_detail(movie_id):
     """Render the movie detail page."""
     try:
-        movie = tmdb_api.get_movie_details(movie_id)
-        if not movie:
-            return render_template('404.html', title='Movie Not Found'), 404
-        
-        # Get related movies
-        related_movies = tmdb_api.get_related_movies(movie_id)
-        
-        return render_template(
-            'movie_detail.html',
-            title=movie['title'],
-            movie=movie,
-            related_movies=related_movies
-        )
+        # Details and related items come from a single upstream request
+        details, related = tmdb_api.get_movie_bundle(movie_id)
+        return views.detail_page('movie', movie_id, details, related)
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'this movie')
 
 @app.route('/watch/<int:movie_id>')
+@pagecache.cached('details')
 def watch_movie(movie_id):
     """Render the movie watch page with player options."""
     try:
-        movie = tmdb_api.get_movie_details(movie_id)
-        if not movie:
-            return render_template('404.html', title='Movie Not Found'), 404
-        
-        # Get the vidsrc.to URL
-        vidsrc_url = tmdb_api.get_vidsrc_url(movie_id)
-        
-        # Get the embess.ws URL using IMDB ID
-        imdb_id = movie.get('external_ids', {}).get('imdb_id')
-        embess_url = tmdb_api.get_embess_url(imdb_id) if imdb_id else None
-        
-        # Get related movies
-        related_movies = tmdb_api.get_related_movies(movie_id)
-        
-        return render_template(
-            'watch_movie.html',
-            title="Watch {}".format(movie['title']),
-            movie=movie,
-            vidsrc_url=vidsrc_url,
-            embess_url=embess_url,
-            imdb_id=imdb_id,
-            related_movies=related_movies
-        )
+        # Details and related items come from a single upstream request
+        details, related = tmdb_api.get_movie_bundle(movie_id)
+        return views.detail_page('movie', movie_id, details, related, watch=True)
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'this movie')
 
 @app.route('/tv')
+@pagecache.cached('trending')
 def tv_index():
     """Render the TV shows home page with popular and trending TV shows."""
     page = request.args.get('page', 1, type=int)
     
     try:
-        popular_shows = tmdb_api.get_popular_tv_shows(page)
-        trending_shows = tmdb_api.get_trending_tv_shows('week')
-        
-        # Check if we got empty results due to an error
-        if not popular_shows.get('results') and not trending_shows.get('results'):
-            error_message = (
-                "Unable to fetch TV shows. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        return render_template(
-            'tv_index.html', title='TV Shows',
-            popular_shows=popular_shows,
-            trending_shows=trending_shows,
-            current_page=page
+        popular_shows, trending_shows = fetch_parallel(
+            (tmdb_api.get_popular_tv_shows, page),
+            (tmdb_api.get_trending_tv_shows, 'week')
         )
+        return views.tv_index_page(popular_shows, trending_shows, page)
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'TV shows')
 
 @app.route('/tv/<int:tv_id>')
+@pagecache.cached('details')
 def tv_detail(tv_id):
     """Render the TV show detail page."""
     try:
-        show = tmdb_api.get_tv_show_details(tv_id)
-        if not show:
-            return render_template('404.html', title='TV Show Not Found'), 404
-        
-        # Get related TV shows
-        related_shows = tmdb_api.get_related_tv_shows(tv_id)
-        
-        return render_template(
-            'tv_detail.html',
-            title=show['name'],
-            show=show,
-            related_shows=related_shows
-        )
+        # Details and related items come from a single upstream request
+        details, related = tmdb_api.get_tv_show_bundle(tv_id)
+        return views.detail_page('tv', tv_id, details, related)
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'this TV show')
 
 @app.route('/watch/tv/<int:tv_id>')
+@pagecache.cached('details')
 def watch_tv(tv_id):
     """Render the TV show watch page with player options."""
     try:
-        show = tmdb_api.get_tv_show_details(tv_id)
-        if not show:
-            return render_template('404.html', title='TV Show Not Found'), 404
-        
-        # Get the vidsrc.to URL
-        vidsrc_url = tmdb_api.get_vidsrc_tv_url(tv_id)
-        
-        # Get the embess.ws URL using IMDB ID
-        imdb_id = show.get('external_ids', {}).get('imdb_id')
-        embess_url = tmdb_api.get_embess_url(imdb_id) if imdb_id else None
-        
-        # Get related TV shows
-        related_shows = tmdb_api.get_related_tv_shows(tv_id)
-        
-        return render_template(
-            'watch_tv.html',
-            title="Watch {}".format(show['name']),
-            show=show,
-            vidsrc_url=vidsrc_url,
-            embess_url=embess_url,
-            imdb_id=imdb_id,
-            related_shows=related_shows
-        )
+        # Details and related items come from a single upstream request
+        details, related = tmdb_api.get_tv_show_bundle(tv_id)
+        return views.detail_page('tv', tv_id, details, related, watch=True)
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'this TV show')
 
 @app.route('/search')
+@pagecache.cached('search')
 def search():
     """Search for movies, TV shows, and actors and render results."""
     try:
@@ -311,582 +332,79 @@ def search():
             results = tmdb_api.search_actors(query, page)
         else:
             # Search all types and combine results
-            movie_results = tmdb_api.search_movies(query, page)
-            tv_results = tmdb_api.search_tv_shows(query, page)
-            actor_results = tmdb_api.search_actors(query, page)
-            
-            # Combine results (first page only for now)
-            combined_results = {
-                'results': [],
-                'total_results': (
-                    movie_results.get('total_results', 0) + 
-                    tv_results.get('total_results', 0) + 
-                    actor_results.get('total_results', 0)
-                ),
-                'total_pages': max(
-                    movie_results.get('total_pages', 0),
-                    tv_results.get('total_pages', 0),
-                    actor_results.get('total_pages', 0)
-                ),
-                'page': page
-            }
-            
-            # Add media_type to each result
-            for movie in movie_results.get('results', []):
-                movie['media_type'] = 'movie'
-                combined_results['results'].append(movie)
-            
-            for show in tv_results.get('results', []):
-                show['media_type'] = 'tv'
-                combined_results['results'].append(show)
-            
-            for actor in actor_results.get('results', []):
-                actor['media_type'] = 'person'
-                combined_results['results'].append(actor)
-            
-            # Sort by popularity (descending)
-            combined_results['results'] = sorted(
-                combined_results['results'],
-                key=lambda x: x.get('popularity', 0),
-                reverse=True
-            )
-            
-            results = combined_results
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=results,
-                current_page=page,
-                media_type=media_type,
-                query=query,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < results.get('total_pages', 1),
-                'next_page': page + 1 if page < results.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='Search Results',
-            query=query,
-            results=results,
-            current_page=page,
-            media_type=media_type,
-            has_more=page < results.get('total_pages', 1),
-            next_page=page + 1 if page < results.get('total_pages', 1) else None
-        )
+            results = views.combine_search_results(page, *fetch_parallel(
+                (tmdb_api.search_movies, query, page),
+                (tmdb_api.search_tv_shows, query, page),
+                (tmdb_api.search_actors, query, page)
+            ))
+        return views.search_page(results, query, page, media_type, is_ajax)
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'search results')
 
-@app.route('/recent')
-def recent_movies():
-    """Render all recently released movies with infinite scrolling."""
+def listing_view(endpoint):
+    """
+    Render a 24-item infinite-scroll listing assembled from TMDB's 20-item pages.
+    
+    Args:
+        endpoint (str): The route endpoint, a key of views.LISTINGS
+    """
     page = request.args.get('page', 1, type=int)
     is_ajax = request.args.get('ajax', '0') == '1'
+    feed, fetch, time_window = views.get_listing_feed(endpoint, getattr(tmdb_api, views.LISTINGS[endpoint][0]))
     
     try:
-        # Get the first 20 items from the current page
-        recent_movies = tmdb_api.get_recently_released_movies(page)
-        
-        if not recent_movies.get('results'):
-            error_message = (
-                "Unable to fetch recently released movies. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        # Get 4 more items from the next page
-        if len(recent_movies.get('results', [])) >= 20 and page < recent_movies.get('total_pages', 1):
-            next_page_movies = tmdb_api.get_recently_released_movies(page + 1)
-            # Add the first 4 items from the next page
-            if next_page_movies.get('results'):
-                # Create a set of existing movie IDs to avoid duplicates
-                existing_ids = {movie['id'] for movie in recent_movies.get('results', [])}
-                
-                # Add only non-duplicate movies from the next page
-                for movie in next_page_movies['results'][:4]:
-                    if movie['id'] not in existing_ids:
-                        recent_movies['results'].append(movie)
-                        existing_ids.add(movie['id'])
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=recent_movies,
-                current_page=page,
-                media_type='movie',
-                is_recent=True,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < recent_movies.get('total_pages', 1),
-                'next_page': page + 1 if page < recent_movies.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='Recently Released Movies',
-            results=recent_movies,
-            current_page=page,
-            media_type='movie',
-            is_recent=True,
-            page_type='recent',
-            has_more=page < recent_movies.get('total_pages', 1),
-            next_page=page + 1 if page < recent_movies.get('total_pages', 1) else None
-        )
+        results = paging.paginate(feed, fetch, page, **views.get_paging_options())
+        return views.listing_page(endpoint, results, page, is_ajax, time_window)
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, views.LISTINGS[endpoint][4])
+
+@app.route('/recent')
+@pagecache.cached('lists')
+def recent_movies():
+    """Render all recently released movies with infinite scrolling."""
+    return listing_view('recent_movies')
 
 @app.route('/popular')
+@pagecache.cached('lists')
 def popular_movies():
     """Render all popular movies with infinite scrolling."""
-    page = request.args.get('page', 1, type=int)
-    is_ajax = request.args.get('ajax', '0') == '1'
-    
-    try:
-        # Get the first 20 items from the current page
-        popular_movies = tmdb_api.get_popular_movies(page)
-        
-        if not popular_movies.get('results'):
-            error_message = (
-                "Unable to fetch popular movies. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        # Get 4 more items from the next page
-        if len(popular_movies.get('results', [])) >= 20 and page < popular_movies.get('total_pages', 1):
-            next_page_movies = tmdb_api.get_popular_movies(page + 1)
-            # Add the first 4 items from the next page
-            if next_page_movies.get('results'):
-                # Create a set of existing movie IDs to avoid duplicates
-                existing_ids = {movie['id'] for movie in popular_movies.get('results', [])}
-                
-                # Add only non-duplicate movies from the next page
-                for movie in next_page_movies['results'][:4]:
-                    if movie['id'] not in existing_ids:
-                        popular_movies['results'].append(movie)
-                        existing_ids.add(movie['id'])
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=popular_movies,
-                current_page=page,
-                media_type='movie',
-                is_popular=True,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < popular_movies.get('total_pages', 1),
-                'next_page': page + 1 if page < popular_movies.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='Popular Movies',
-            results=popular_movies,
-            current_page=page,
-            media_type='movie',
-            is_popular=True,
-            has_more=page < popular_movies.get('total_pages', 1),
-            next_page=page + 1 if page < popular_movies.get('total_pages', 1) else None
-        )
-    except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+    return listing_view('popular_movies')
 
 @app.route('/trending')
+@pagecache.cached('trending')
 def trending_movies():
     """Render all trending movies with infinite scrolling."""
-    page = request.args.get('page', 1, type=int)
-    time_window = request.args.get('time_window', 'week')
-    is_ajax = request.args.get('ajax', '0') == '1'
-    
-    try:
-        # Get the first 20 items from the current page
-        trending_movies = tmdb_api.get_trending_movies(time_window, page)
-        
-        if not trending_movies.get('results'):
-            error_message = (
-                "Unable to fetch trending movies. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        # Get 4 more items from the next page
-        if len(trending_movies.get('results', [])) >= 20 and page < trending_movies.get('total_pages', 1):
-            next_page_movies = tmdb_api.get_trending_movies(time_window, page + 1)
-            # Add the first 4 items from the next page
-            if next_page_movies.get('results'):
-                # Create a set of existing movie IDs to avoid duplicates
-                existing_ids = {movie['id'] for movie in trending_movies.get('results', [])}
-                
-                # Add only non-duplicate movies from the next page
-                for movie in next_page_movies['results'][:4]:
-                    if movie['id'] not in existing_ids:
-                        trending_movies['results'].append(movie)
-                        existing_ids.add(movie['id'])
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=trending_movies,
-                current_page=page,
-                media_type='movie',
-                is_trending=True,
-                time_window=time_window,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < trending_movies.get('total_pages', 1),
-                'next_page': page + 1 if page < trending_movies.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='Trending Movies',
-            results=trending_movies,
-            current_page=page,
-            media_type='movie',
-            is_trending=True,
-            time_window=time_window,
-            has_more=page < trending_movies.get('total_pages', 1),
-            next_page=page + 1 if page < trending_movies.get('total_pages', 1) else None
-        )
-    except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+    return listing_view('trending_movies')
 
 @app.route('/top_rated')
+@pagecache.cached('lists')
 def top_rated_movies():
     """Render all top-rated movies with infinite scrolling."""
-    page = request.args.get('page', 1, type=int)
-    is_ajax = request.args.get('ajax', '0') == '1'
-    
-    try:
-        # Get the first 20 items from the current page
-        top_rated_movies = tmdb_api.get_top_rated_movies(page)
-        
-        if not top_rated_movies.get('results'):
-            error_message = (
-                "Unable to fetch top-rated movies. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        # Get 4 more items from the next page
-        if len(top_rated_movies.get('results', [])) >= 20 and page < top_rated_movies.get('total_pages', 1):
-            next_page_movies = tmdb_api.get_top_rated_movies(page + 1)
-            # Add the first 4 items from the next page
-            if next_page_movies.get('results'):
-                # Create a set of existing movie IDs to avoid duplicates
-                existing_ids = {movie['id'] for movie in top_rated_movies.get('results', [])}
-                
-                # Add only non-duplicate movies from the next page
-                for movie in next_page_movies['results'][:4]:
-                    if movie['id'] not in existing_ids:
-                        top_rated_movies['results'].append(movie)
-                        existing_ids.add(movie['id'])
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=top_rated_movies,
-                current_page=page,
-                media_type='movie',
-                is_top_rated=True,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < top_rated_movies.get('total_pages', 1),
-                'next_page': page + 1 if page < top_rated_movies.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='Top Rated Movies',
-            results=top_rated_movies,
-            current_page=page,
-            media_type='movie',
-            is_top_rated=True,
-            has_more=page < top_rated_movies.get('total_pages', 1),
-            next_page=page + 1 if page < top_rated_movies.get('total_pages', 1) else None
-        )
-    except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+    return listing_view('top_rated_movies')
 
 @app.route('/tv/recent')
+@pagecache.cached('lists')
 def recent_tv_shows():
     """Render all recently released TV shows with infinite scrolling."""
-    page = request.args.get('page', 1, type=int)
-    is_ajax = request.args.get('ajax', '0') == '1'
-    
-    try:
-        # Get the first 20 items from the current page
-        recent_shows = tmdb_api.get_recently_released_tv_shows(page)
-        
-        if not recent_shows.get('results'):
-            error_message = (
-                "Unable to fetch recently released TV shows. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        # Get 4 more items from the next page
-        if len(recent_shows.get('results', [])) >= 20 and page < recent_shows.get('total_pages', 1):
-            next_page_shows = tmdb_api.get_recently_released_tv_shows(page + 1)
-            # Add the first 4 items from the next page
-            if next_page_shows.get('results'):
-                # Create a set of existing show IDs to avoid duplicates
-                existing_ids = {show['id'] for show in recent_shows.get('results', [])}
-                
-                # Add only non-duplicate shows from the next page
-                for show in next_page_shows['results'][:4]:
-                    if show['id'] not in existing_ids:
-                        recent_shows['results'].append(show)
-                        existing_ids.add(show['id'])
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=recent_shows,
-                current_page=page,
-                media_type='tv',
-                is_recent=True,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < recent_shows.get('total_pages', 1),
-                'next_page': page + 1 if page < recent_shows.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='Recently Released TV Shows',
-            results=recent_shows,
-            current_page=page,
-            media_type='tv',
-            is_recent=True,
-            page_type='recent',
-            has_more=page < recent_shows.get('total_pages', 1),
-            next_page=page + 1 if page < recent_shows.get('total_pages', 1) else None
-        )
-    except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+    return listing_view('recent_tv_shows')
 
 @app.route('/tv/popular')
+@pagecache.cached('lists')
 def popular_tv_shows():
     """Render all popular TV shows with infinite scrolling."""
-    page = request.args.get('page', 1, type=int)
-    is_ajax = request.args.get('ajax', '0') == '1'
-    
-    try:
-        # Get the first 20 items from the current page
-        popular_shows = tmdb_api.get_popular_tv_shows(page)
-        
-        if not popular_shows.get('results'):
-            error_message = (
-                "Unable to fetch popular TV shows. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        # Get 4 more items from the next page
-        if len(popular_shows.get('results', [])) >= 20 and page < popular_shows.get('total_pages', 1):
-            next_page_shows = tmdb_api.get_popular_tv_shows(page + 1)
-            # Add the first 4 items from the next page
-            if next_page_shows.get('results'):
-                # Create a set of existing show IDs to avoid duplicates
-                existing_ids = {show['id'] for show in popular_shows.get('results', [])}
-                
-                # Add only non-duplicate shows from the next page
-                for show in next_page_shows['results'][:4]:
-                    if show['id'] not in existing_ids:
-                        popular_shows['results'].append(show)
-                        existing_ids.add(show['id'])
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=popular_shows,
-                current_page=page,
-                media_type='tv',
-                is_popular=True,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < popular_shows.get('total_pages', 1),
-                'next_page': page + 1 if page < popular_shows.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='Popular TV Shows',
-            results=popular_shows,
-            current_page=page,
-            media_type='tv',
-            is_popular=True,
-            has_more=page < popular_shows.get('total_pages', 1),
-            next_page=page + 1 if page < popular_shows.get('total_pages', 1) else None
-        )
-    except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+    return listing_view('popular_tv_shows')
 
 @app.route('/tv/trending')
+@pagecache.cached('trending')
 def trending_tv_shows():
     """Render all trending TV shows with infinite scrolling."""
-    page = request.args.get('page', 1, type=int)
-    time_window = request.args.get('time_window', 'week')
-    is_ajax = request.args.get('ajax', '0') == '1'
-    
-    try:
-        # Get the first 20 items from the current page
-        trending_shows = tmdb_api.get_trending_tv_shows(time_window, page)
-        
-        if not trending_shows.get('results'):
-            error_message = (
-                "Unable to fetch trending TV shows. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        # Get 4 more items from the next page
-        if len(trending_shows.get('results', [])) >= 20 and page < trending_shows.get('total_pages', 1):
-            next_page_shows = tmdb_api.get_trending_tv_shows(time_window, page + 1)
-            # Add the first 4 items from the next page
-            if next_page_shows.get('results'):
-                # Create a set of existing show IDs to avoid duplicates
-                existing_ids = {show['id'] for show in trending_shows.get('results', [])}
-                
-                # Add only non-duplicate shows from the next page
-                for show in next_page_shows['results'][:4]:
-                    if show['id'] not in existing_ids:
-                        trending_shows['results'].append(show)
-                        existing_ids.add(show['id'])
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=trending_shows,
-                current_page=page,
-                media_type='tv',
-                is_trending=True,
-                time_window=time_window,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < trending_shows.get('total_pages', 1),
-                'next_page': page + 1 if page < trending_shows.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='Trending TV Shows',
-            results=trending_shows,
-            current_page=page,
-            media_type='tv',
-            is_trending=True,
-            time_window=time_window,
-            has_more=page < trending_shows.get('total_pages', 1),
-            next_page=page + 1 if page < trending_shows.get('total_pages', 1) else None
-        )
-    except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+    return listing_view('trending_tv_shows')
 
 @app.route('/tv/top_rated')
+@pagecache.cached('lists')
 def top_rated_tv_shows():
     """Render all top-rated TV shows with infinite scrolling."""
-    page = request.args.get('page', 1, type=int)
-    is_ajax = request.args.get('ajax', '0') == '1'
-    
-    try:
-        # Get the first 20 items from the current page
-        top_rated_shows = tmdb_api.get_top_rated_tv_shows(page)
-        
-        if not top_rated_shows.get('results'):
-            error_message = (
-                "Unable to fetch top-rated TV shows. Please make sure you have set a valid TMDB API key "
-                "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api"
-            )
-            return render_template('error.html', title='API Error', error_message=error_message)
-        
-        # Get 4 more items from the next page
-        if len(top_rated_shows.get('results', [])) >= 20 and page < top_rated_shows.get('total_pages', 1):
-            next_page_shows = tmdb_api.get_top_rated_tv_shows(page + 1)
-            # Add the first 4 items from the next page
-            if next_page_shows.get('results'):
-                # Create a set of existing show IDs to avoid duplicates
-                existing_ids = {show['id'] for show in top_rated_shows.get('results', [])}
-                
-                # Add only non-duplicate shows from the next page
-                for show in next_page_shows['results'][:4]:
-                    if show['id'] not in existing_ids:
-                        top_rated_shows['results'].append(show)
-                        existing_ids.add(show['id'])
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=top_rated_shows,
-                current_page=page,
-                media_type='tv',
-                is_top_rated=True,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < top_rated_shows.get('total_pages', 1),
-                'next_page': page + 1 if page < top_rated_shows.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='Top Rated TV Shows',
-            results=top_rated_shows,
-            current_page=page,
-            media_type='tv',
-            is_top_rated=True,
-            has_more=page < top_rated_shows.get('total_pages', 1),
-            next_page=page + 1 if page < top_rated_shows.get('total_pages', 1) else None
-        )
-    except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+    return listing_view('top_rated_tv_shows')
 
 @app.route('/search/tv')
 def search_tv():
@@ -900,39 +418,12 @@ def search_tv():
             return redirect(url_for('tv_index'))
         
         results = tmdb_api.search_tv_shows(query, page)
-        
-        # If it's an AJAX request, return only the movie cards HTML
-        if is_ajax:
-            movie_cards_html = render_template(
-                'search_results.html',
-                results=results,
-                current_page=page,
-                media_type='tv',
-                query=query,
-                ajax=True
-            )
-            return jsonify({
-                'html': movie_cards_html,
-                'has_more': page < results.get('total_pages', 1),
-                'next_page': page + 1 if page < results.get('total_pages', 1) else None
-            })
-        
-        # Regular request - return the full page
-        return render_template(
-            'search_results.html',
-            title='TV Show Search Results',
-            query=query,
-            results=results,
-            current_page=page,
-            media_type='tv',
-            has_more=page < results.get('total_pages', 1),
-            next_page=page + 1 if page < results.get('total_pages', 1) else None
-        )
+        return views.search_page(results, query, page, 'tv', is_ajax, title='TV Show Search Results')
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'search results')
 
 @app.route('/genre/<int:genre_id>')
+@pagecache.cached('discover')
 def genre(genre_id):
     """Render movies by genre with infinite scrolling."""
     try:
@@ -941,10 +432,6 @@ def genre(genre_id):
         
         movies = tmdb_api.get_movies_by_genre(genre_id, page)
         
-        # Get all genres to find the current genre name
-        genres = tmdb_api.get_movie_genres()
-        genre_name = next((g['name'] for g in genres if g['id'] == genre_id), 'Unknown Genre')
-        
         # If it's an AJAX request, return only the movie cards HTML
         if is_ajax:
             return jsonify({
@@ -954,6 +441,7 @@ def genre(genre_id):
             })
         
         # Regular request - return the full page
+        genre_name = genre_catalog.get_name(genre_id, 'movie')
         return render_template(
             'genre.html',
             title='{} Movies'.format(genre_name),
@@ -966,10 +454,10 @@ def genre(genre_id):
             next_page=page + 1 if page < movies.get('total_pages', 1) else None
         )
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'movies in this genre')
 
 @app.route('/tv/genre/<int:genre_id>')
+@pagecache.cached('discover')
 def tv_genre(genre_id):
     """Render TV shows by genre with infinite scrolling."""
     try:
@@ -978,10 +466,6 @@ def tv_genre(genre_id):
         
         shows = tmdb_api.get_tv_shows_by_genre(genre_id, page)
         
-        # Get all genres to find the current genre name
-        genres = tmdb_api.get_tv_show_genres()
-        genre_name = next((g['name'] for g in genres if g['id'] == genre_id), 'Unknown Genre')
-        
         # If it's an AJAX request, return only the TV show cards HTML
         if is_ajax:
             return jsonify({
@@ -991,6 +475,7 @@ def tv_genre(genre_id):
             })
         
         # Regular request - return the full page
+        genre_name = genre_catalog.get_name(genre_id, 'tv')
         return render_template(
             'genre.html',
             title='{} TV Shows'.format(genre_name),
@@ -1003,8 +488,7 @@ def tv_genre(genre_id):
             next_page=page + 1 if page < shows.get('total_pages', 1) else None
         )
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'TV shows in this genre')
 
 @app.route('/about')
 def about():
@@ -1031,61 +515,53 @@ def html_sitemap():
     """Render the HTML sitemap page."""
     return render_template('sitemap.html', title='Sitemap')
 
-def get_latest_apk():
-    """Find the latest APK version based on naming pattern Mooviestream-X.X.X.apk"""
-    apps_dir = os.path.join(app.static_folder, 'apps')
-    if not os.path.exists(apps_dir):
-        return None, None
-    
-    # Pattern to match Mooviestream-X.X.X.apk
-    pattern = os.path.join(apps_dir, 'Mooviestream-*.apk')
-    apk_files = glob.glob(pattern)
-    
-    if not apk_files:
-        return None, None
-    
-    # Extract version numbers and find the latest
-    def extract_version(filename):
-        match = re.search(r'Mooviestream-(\d+)\.(\d+)\.(\d+)\.apk', os.path.basename(filename))
-        if match:
-            return tuple(map(int, match.groups()))
-        return (0, 0, 0)
-    
-    # Sort by version number (latest first)
-    apk_files.sort(key=extract_version, reverse=True)
-    latest_apk = apk_files[0]
-    
-    # Extract version string
-    version_match = re.search(r'Mooviestream-(\d+\.\d+\.\d+)\.apk', os.path.basename(latest_apk))
-    version = version_match.group(1) if version_match else "Unknown"
-    
-    return latest_apk, version
-
 @app.route('/mobile-app')
 def mobile_app():
     """Render the mobile app download page."""
-    latest_apk, version = get_latest_apk()
-    return render_template('mobile_app.html', title='Mobile App', apk_version=version)
+    release = apk.get_latest(os.path.join(app.static_folder, 'apps'))
+    return render_template(
+        'mobile_app.html', title='Mobile App',
+        apk_version=release.version if release else None,
+        apk_size_mb=release.size_mb if release else None
+    )
 
 @app.route('/download/android')
 def download_android():
     """Serve the latest Android APK file for download."""
-    latest_apk, version = get_latest_apk()
+    release = apk.get_latest(os.path.join(app.static_folder, 'apps'))
     
-    if not latest_apk or not os.path.exists(latest_apk):
+    if release is None or not os.path.exists(release.path):
         return render_template('404.html', title='File Not Found'), 404
     
-    # Get file size
-    file_size = os.path.getsize(latest_apk)
-    size_mb = round(file_size / (1024 * 1024), 1)
+    download_name = f'Mooviestream-{release.version}.apk'
+    accel_prefix = app.config.get('APK_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        # Let nginx send the file (including Range and conditional requests)
+        response = app.response_class(mimetype='application/vnd.android.package-archive')
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + release.filename
+        response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        response.set_etag(release.sha256)
+        return response
     
-    # Send file with proper headers
-    return send_file(
-        latest_apk,
+    # send_file answers Range and If-None-Match/If-Modified-Since itself and uses
+    # the server's sendfile path (wsgi.file_wrapper, or X-Sendfile with USE_X_SENDFILE)
+    response = send_file(
+        release.path,
         as_attachment=True,
-        download_name=f'Mooviestream-{version}.apk',
-        mimetype='application/vnd.android.package-archive'
+        download_name=download_name,
+        mimetype='application/vnd.android.package-archive',
+        conditional=True,
+        etag=release.sha256,
+        last_modified=release.mtime,
+        max_age=app.config.get('APK_MAX_AGE', 60 * 60)
     )
+    response.headers['X-Checksum-Sha256'] = release.sha256
+    return response
+
+@app.route('/img/<size>/<filename>')
+def image_proxy(size, filename):
+    """Serve a TMDB image from the local image cache."""
+    return imageproxy.make_response(size, filename)
 
 @app.route('/actor/<int:actor_id>')
 def actor_detail(actor_id):
@@ -1101,8 +577,7 @@ def actor_detail(actor_id):
             actor=actor
         )
     except Exception as e:
-        error_message = "An error occurred: {}".format(str(e))
-        return render_template('error.html', title='Error', error_message=error_message)
+        return error_page(e, 'this actor')
 
 # Error handlers
 @app.errorhandler(404)
@@ -1118,25 +593,22 @@ def internal_server_error(e):
 @app.route('/robots.txt')
 def robots():
     """Serve robots.txt file."""
-    return app.send_static_file('robots.txt')
+    return iconcache.make_response('robots.txt') or app.send_static_file('robots.txt')
 
 @app.route('/manifest.json')
 def manifest():
     """Serve manifest.json file."""
-    return app.send_static_file('manifest.json')
+    return iconcache.make_response('manifest.json') or app.send_static_file('manifest.json')
 
 @app.route('/favicon.ico')
 def favicon():
     """Serve favicon for browsers that look for it at the root."""
-    return app.send_static_file('images/logo_fav.png')
+    return iconcache.make_response('logo_fav.png') or app.send_static_file('images/logo_fav.png')
 
 @app.route('/apple-touch-icon.png')
 @app.route('/apple-touch-icon-<int:size>.png')
 def apple_touch_icon(size=180):
-    """Serve apple-touch-icon with no-cache headers to prevent iOS caching issues."""
-    from flask import Response
-    import os
-    
+    """Serve apple-touch-icon, forcing revalidation to prevent iOS caching issues."""
     # Map sizes to actual files
     size_map = {
         76: 'logo-76.png',
@@ -1146,148 +618,60 @@ def apple_touch_icon(size=180):
     }
     
     filename = size_map.get(size, 'logo-180.png')
-    file_path = os.path.join(app.static_folder, 'images', filename)
-    
-    if os.path.exists(file_path):
-        with open(file_path, 'rb') as f:
-            image_data = f.read()
-        
-        response = Response(image_data, mimetype='image/png')
-        # Add headers to prevent caching - critical for iOS share sheet
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        response.headers['ETag'] = 'v2'  # Version identifier
-        response.headers['Last-Modified'] = 'Thu, 01 Jan 1970 00:00:00 GMT'  # Force revalidation
-        return response
-    else:
+    # iOS must revalidate on every use (critical for the share sheet), which the
+    # content-hash ETag turns into an empty 304 while the icon is unchanged
+    response = iconcache.make_response(filename, revalidate=True)
+    if response is None:
         return app.send_static_file('images/logo-180.png')
+    return response
 
 @app.route('/vast-mock.xml')
 def vast_mock():
     """Serve mock VAST XML for testing."""
     return app.send_static_file('vast-mock.xml')
 
+def sitemap_pending():
+    """Answer 503 until the first sitemap generation has been built."""
+    error_message = "The sitemap is being generated. Please try again in a few minutes."
+    response = app.make_response((render_template('error.html', title='Service Unavailable', error_message=error_message), 503))
+    response.headers['Retry-After'] = str(sitemap_builder.RETRY_AFTER)
+    return response
+
 @app.route('/sitemap.xml')
 def sitemap():
-    """Generate a dynamic sitemap.xml."""
+    """Stream the sitemap index pointing at the sharded child sitemaps."""
     try:
-        # Create a list to store all URLs
-        urls = []
+        index = sitemap_builder.get_index()
+        if index is None:
+            return sitemap_pending()
         host_base = request.host_url.rstrip('/')
-        
-        # Add static pages
-        urls.append({
-            'loc': host_base,
-            'priority': '1.0',
-            'changefreq': 'daily'
-        })
-        urls.append({
-            'loc': "{}/about".format(host_base),
-            'priority': '0.7',
-            'changefreq': 'monthly'
-        })
-        urls.append({
-            'loc': "{}/contact".format(host_base),
-            'priority': '0.7',
-            'changefreq': 'monthly'
-        })
-        urls.append({
-            'loc': f"{host_base}/privacy",
-            'priority': '0.5',
-            'changefreq': 'yearly'
-        })
-        urls.append({
-            'loc': f"{host_base}/terms",
-            'priority': '0.5',
-            'changefreq': 'yearly'
-        })
-        
-        # Add movie listing pages
-        urls.append({
-            'loc': f"{host_base}/popular",
-            'priority': '0.8',
-            'changefreq': 'daily'
-        })
-        urls.append({
-            'loc': f"{host_base}/recent",
-            'priority': '0.8',
-            'changefreq': 'daily'
-        })
-        urls.append({
-            'loc': f"{host_base}/top_rated",
-            'priority': '0.8',
-            'changefreq': 'weekly'
-        })
-        
-        # Add TV show listing pages
-        urls.append({
-            'loc': f"{host_base}/tv",
-            'priority': '0.8',
-            'changefreq': 'daily'
-        })
-        urls.append({
-            'loc': f"{host_base}/tv/popular",
-            'priority': '0.8',
-            'changefreq': 'daily'
-        })
-        urls.append({
-            'loc': f"{host_base}/tv/recent",
-            'priority': '0.8',
-            'changefreq': 'daily'
-        })
-        urls.append({
-            'loc': f"{host_base}/tv/top_rated",
-            'priority': '0.8',
-            'changefreq': 'weekly'
-        })
-        
-        # Add movie genres
-        try:
-            movie_genres = tmdb_api.get_movie_genres()
-            for genre in movie_genres:
-                urls.append({
-                    'loc': f"{host_base}/genre/{genre['id']}",
-                    'priority': '0.7',
-                    'changefreq': 'weekly'
-                })
-        except Exception as e:
-            app.logger.error(f"Error fetching movie genres for sitemap: {str(e)}")
-        
-        # Add TV show genres
-        try:
-            tv_genres = tmdb_api.get_tv_show_genres()
-            for genre in tv_genres:
-                urls.append({
-                    'loc': f"{host_base}/tv/genre/{genre['id']}",
-                    'priority': '0.7',
-                    'changefreq': 'weekly'
-                })
-        except Exception as e:
-            app.logger.error(f"Error fetching TV genres for sitemap: {str(e)}")
-        
-        # Generate XML sitemap
-        xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-        xml += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-        
-        for url in urls:
-            xml += '  <url>\n'
-            xml += f'    <loc>{url["loc"]}</loc>\n'
-            xml += f'    <changefreq>{url["changefreq"]}</changefreq>\n'
-            xml += f'    <priority>{url["priority"]}</priority>\n'
-            xml += '  </url>\n'
-        
-        xml += '</urlset>'
-        
-        response = app.response_class(
-            response=xml,
+        shard_url = lambda name, number: url_for('sitemap_shard', name=name, number=number)
+        return app.response_class(
+            stream_with_context(sitemap_builder.stream_index(index, host_base, shard_url)),
             status=200,
             mimetype='application/xml'
         )
-        return response
     except Exception as e:
         app.logger.error(f"Error generating sitemap: {str(e)}")
         return render_template('error.html', title='Error', error_message=f"Error generating sitemap: {str(e)}")
 
+@app.route('/sitemaps/<name>-<int:number>.xml')
+def sitemap_shard(name, number):
+    """Stream one child sitemap of at most SITEMAP_SHARD_SIZE URLs."""
+    try:
+        entries = sitemap_builder.get_shard(name, number)
+        if entries is None:
+            return render_template('404.html', title='Page Not Found'), 404
+        return app.response_class(
+            sitemap_builder.stream_shard(entries, request.host_url.rstrip('/')),
+            status=200,
+            mimetype='application/xml'
+        )
+    except LookupError:
+        return sitemap_pending()
+    except Exception as e:
+        app.logger.error(f"Error generating sitemap {name}-{number}: {str(e)}")
+        return render_template('error.html', title='Error', error_message=f"Error generating sitemap: {str(e)}")
+
 if __name__ == '__main__':
     app.run(debug=appconfig.Config.DEBUG, port=5003)
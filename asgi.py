@@ -0,0 +1,228 @@
+"""
+ASGI entry point serving the I/O-bound pages with the async TMDB client.
+
+The home, search, detail, watch and listing pages are handled natively on the
+event loop with tmdb_api_async; every other path falls through to the Flask
+WSGI app. Both render the same templates, share the rendered-output cache and
+run the same after_request hooks.
+
+Run with an ASGI server, e.g.:
+    uvicorn asgi:application --workers 4
+"""
+import asyncio
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import render_template, request, redirect, url_for
+from werkzeug.routing import Map, Rule
+from werkzeug.test import EnvironBuilder
+
+import tmdb_api_async
+from app import app
+from lib import pagecache, paging, views
+from lib.views import error_page
+
+url_map = Map([
+    Rule('/', endpoint='index'),
+    Rule('/tv', endpoint='tv_index'),
+    Rule('/search', endpoint='search'),
+    Rule('/movie/<int:movie_id>', endpoint='movie_detail'),
+    Rule('/watch/<int:movie_id>', endpoint='watch_movie'),
+    Rule('/tv/<int:tv_id>', endpoint='tv_detail'),
+    Rule('/watch/tv/<int:tv_id>', endpoint='watch_tv'),
+    Rule('/recent', endpoint='recent_movies'),
+    Rule('/popular', endpoint='popular_movies'),
+    Rule('/trending', endpoint='trending_movies'),
+    Rule('/top_rated', endpoint='top_rated_movies'),
+    Rule('/tv/recent', endpoint='recent_tv_shows'),
+    Rule('/tv/popular', endpoint='popular_tv_shows'),
+    Rule('/tv/trending', endpoint='trending_tv_shows'),
+    Rule('/tv/top_rated', endpoint='top_rated_tv_shows'),
+])
+
+async def index():
+    """Async version of app.index."""
+    page = request.args.get('page', 1, type=int)
+    try:
+        popular_movies, trending_movies, trending_tv_shows = await asyncio.gather(
+            tmdb_api_async.get_popular_movies(page),
+            tmdb_api_async.get_trending_movies('week'),
+            tmdb_api_async.get_trending_tv_shows('week')
+        )
+        return views.index_page(popular_movies, trending_movies, trending_tv_shows, page)
+    except Exception as e:
+        return error_page(e, 'movies')
+
+async def tv_index():
+    """Async version of app.tv_index."""
+    page = request.args.get('page', 1, type=int)
+    try:
+        popular_shows, trending_shows = await asyncio.gather(
+            tmdb_api_async.get_popular_tv_shows(page),
+            tmdb_api_async.get_trending_tv_shows('week')
+        )
+        return views.tv_index_page(popular_shows, trending_shows, page)
+    except Exception as e:
+        return error_page(e, 'TV shows')
+
+async def _detail(media_type, item_id, watch=False):
+    if media_type == 'movie':
+        fetch_bundle, subject = tmdb_api_async.get_movie_bundle, 'this movie'
+    else:
+        fetch_bundle, subject = tmdb_api_async.get_tv_show_bundle, 'this TV show'
+    try:
+        # Details and related items come from a single upstream request
+        details, related = await fetch_bundle(item_id)
+        return views.detail_page(media_type, item_id, details, related, watch=watch)
+    except Exception as e:
+        return error_page(e, subject)
+
+async def movie_detail(movie_id):
+    """Async version of app.movie_detail."""
+    return await _detail('movie', movie_id)
+
+async def watch_movie(movie_id):
+    """Async version of app.watch_movie."""
+    return await _detail('movie', movie_id, watch=True)
+
+async def tv_detail(tv_id):
+    """Async version of app.tv_detail."""
+    return await _detail('tv', tv_id)
+
+async def watch_tv(tv_id):
+    """Async version of app.watch_tv."""
+    return await _detail('tv', tv_id, watch=True)
+
+async def search():
+    """Async version of app.search."""
+    try:
+        query = request.args.get('query', '')
+        page = request.args.get('page', 1, type=int)
+        media_type = request.args.get('media_type', 'all')
+        is_ajax = request.args.get('ajax', '0') == '1'
+
+        if not query:
+            return redirect(url_for('index'))
+
+        if media_type == 'movie':
+            results = await tmdb_api_async.search_movies(query, page)
+        elif media_type == 'tv':
+            results = await tmdb_api_async.search_tv_shows(query, page)
+        elif media_type == 'person':
+            results = await tmdb_api_async.search_actors(query, page)
+        else:
+            results = views.combine_search_results(page, *await asyncio.gather(
+                tmdb_api_async.search_movies(query, page),
+                tmdb_api_async.search_tv_shows(query, page),
+                tmdb_api_async.search_actors(query, page)
+            ))
+        return views.search_page(results, query, page, media_type, is_ajax)
+    except Exception as e:
+        return error_page(e, 'search results')
+
+async def listing(endpoint):
+    """Async version of app.listing_view."""
+    page = request.args.get('page', 1, type=int)
+    is_ajax = request.args.get('ajax', '0') == '1'
+    feed, fetch, time_window = views.get_listing_feed(endpoint, getattr(tmdb_api_async, views.LISTINGS[endpoint][0]))
+
+    try:
+        results = await paging.paginate_async(feed, fetch, page, **views.get_paging_options())
+        return views.listing_page(endpoint, results, page, is_ajax, time_window)
+    except Exception as e:
+        return error_page(e, views.LISTINGS[endpoint][4])
+
+HANDLERS = {
+    'index': index,
+    'tv_index': tv_index,
+    'search': search,
+    'movie_detail': movie_detail,
+    'watch_movie': watch_movie,
+    'tv_detail': tv_detail,
+    'watch_tv': watch_tv,
+}
+
+def build_environ(scope):
+    """
+    Build a WSGI environ for an ASGI HTTP scope so Flask's request context works.
+
+    Args:
+        scope (dict): The ASGI connection scope
+
+    Returns:
+        dict: The WSGI environ
+    """
+    headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope.get('headers', [])]
+    host = next((value for name, value in headers if name.lower() == 'host'), None)
+    if host is None and scope.get('server'):
+        host = '{}:{}'.format(*scope['server'])
+    builder = EnvironBuilder(
+        path=scope['path'],
+        base_url='{}://{}{}'.format(scope.get('scheme', 'http'), host or 'localhost', scope.get('root_path', '')),
+        query_string=scope.get('query_string', b'').decode('latin-1'),
+        method=scope['method'],
+        headers=headers
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+async def send_response(response, send, include_body=True):
+    """Send a Flask response object over ASGI."""
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+    await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+    # 304 and 204 responses must not carry a body (make_conditional leaves it in place)
+    include_body = include_body and response.status_code not in (204, 304)
+    await send({'type': 'http.response.body', 'body': response.get_data() if include_body else b''})
+
+class AsyncApp:
+    """ASGI application: native async handlers with a WSGI fallback."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.adapter = url_map.bind('localhost')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                with self.flask_app.app_context():
+                    await tmdb_api_async.close_client()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD'):
+            return await self.wsgi(scope, receive, send)
+
+        try:
+            endpoint, view_args = self.adapter.match(scope['path'], method='GET')
+        except Exception:
+            # Unknown paths, redirects and 404s are left to Flask
+            return await self.wsgi(scope, receive, send)
+
+        app = self.flask_app
+        with app.request_context(build_environ(scope)):
+            try:
+                # before_request hooks (per-worker prewarm and link warming) run here too
+                rv = app.preprocess_request()
+                response = app.make_response(rv) if rv is not None else pagecache.lookup(endpoint)
+                if response is None:
+                    if endpoint in views.LISTINGS:
+                        rv = await listing(endpoint)
+                    else:
+                        rv = await HANDLERS[endpoint](**view_args)
+                    response = app.make_response(rv)
+                    pagecache.store(endpoint, response)
+            except Exception as e:
+                app.logger.exception("Unhandled error in async handler {}: {}".format(endpoint, str(e)))
+                response = app.make_response((render_template('500.html', title='Server Error'), 500))
+            response = app.process_response(response)
+            await send_response(response, send, include_body=scope['method'] != 'HEAD')
+
+application = AsyncApp(app)
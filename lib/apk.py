@@ -0,0 +1,109 @@
+"""
+Discovery of the latest Android APK in static/apps.
+
+The directory is scanned only when its mtime changes (a release adds or
+renames a file), or when the cached file itself changed in place. Everything
+else is one os.stat per request. The cached release carries version, size,
+mtime and SHA-256, which is used as the download's ETag.
+"""
+import hashlib
+import os
+import re
+import threading
+
+APK_PATTERN = re.compile(r'^Mooviestream-(\d+)\.(\d+)\.(\d+)\.apk$')
+
+_lock = threading.Lock()
+_cache = {}
+
+
+class ApkRelease:
+    """The latest APK file and its metadata."""
+
+    def __init__(self, path, version, size, mtime, sha256):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.version = version
+        self.size = size
+        self.mtime = mtime
+        self.sha256 = sha256
+
+    @property
+    def size_mb(self):
+        return round(self.size / (1024 * 1024), 1)
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Hash a file without reading it into memory at once.
+
+    Args:
+        path (str): The file path
+        chunk_size (int): Bytes read per step
+
+    Returns:
+        str: The hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan(apps_dir):
+    """
+    Find the APK with the highest version in a directory.
+
+    Args:
+        apps_dir (str): The directory
+
+    Returns:
+        ApkRelease: The latest release or None
+    """
+    latest = None
+    for name in os.listdir(apps_dir):
+        match = APK_PATTERN.match(name)
+        if match:
+            version = tuple(map(int, match.groups()))
+            if latest is None or version > latest[0]:
+                latest = (version, name)
+    if latest is None:
+        return None
+    path = os.path.join(apps_dir, latest[1])
+    stat = os.stat(path)
+    return ApkRelease(path, '.'.join(map(str, latest[0])), stat.st_size, stat.st_mtime, file_sha256(path))
+
+
+def _is_current(release):
+    try:
+        stat = os.stat(release.path)
+    except OSError:
+        return False
+    return stat.st_mtime == release.mtime and stat.st_size == release.size
+
+
+def get_latest(apps_dir):
+    """
+    Get the latest release, rescanning only when the directory changed.
+
+    Args:
+        apps_dir (str): The directory holding Mooviestream-X.X.X.apk files
+
+    Returns:
+        ApkRelease: The latest release or None
+    """
+    try:
+        dir_mtime = os.stat(apps_dir).st_mtime
+    except OSError:
+        return None
+    cached = _cache.get(apps_dir)
+    if cached is not None and cached[0] == dir_mtime and (cached[1] is None or _is_current(cached[1])):
+        return cached[1]
+    with _lock:
+        cached = _cache.get(apps_dir)
+        if cached is not None and cached[0] == dir_mtime and (cached[1] is None or _is_current(cached[1])):
+            return cached[1]
+        release = scan(apps_dir)
+        _cache[apps_dir] = (dir_mtime, release)
+        return release
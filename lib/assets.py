@@ -0,0 +1,510 @@
+"""
+Fingerprinted, minified and precompressed static bundles.
+
+The stylesheets and scripts in BUNDLES are minified and written to
+static/dist as <name>.<content hash>.<ext>, next to .gz and (when the brotli
+package is installed) .br siblings, and the mapping is stored in
+static/dist/manifest.json. url_for('static', filename='css/style.css')
+resolves to the hashed name, and the static view serves the best encoding the
+client accepts with one-year immutable caching: a changed file gets a new name,
+so cached copies never need revalidation.
+
+The minifiers are deliberately conservative: they drop comments and redundant
+whitespace but keep line breaks in scripts, so automatic semicolon insertion
+behaves exactly as in the source.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUNDLES = ('css/style.css', 'css/tv.css', 'js/main.js', 'js/tv-nav.js')
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+MIMETYPES = {'.css': 'text/css', '.js': 'application/javascript'}
+
+# Characters that never need whitespace next to them
+_JS_TIGHT = frozenset('{}()[];,:=?!&|')
+_CSS_TIGHT = frozenset('{};,>')
+# A '/' after these starts a regular expression rather than a division
+_REGEX_PRECEDERS = frozenset('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = frozenset(('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                             'void', 'throw', 'instanceof', 'yield', 'await'))
+_WORD_END = re.compile(r'[A-Za-z0-9_$]+$')
+
+
+class _Writer:
+    """Output buffer that collapses whitespace between tokens."""
+
+    def __init__(self, tight, keep_newlines):
+        self.out = []
+        self.tight = tight
+        self.keep_newlines = keep_newlines
+        self.space = False
+        self.newline = False
+
+    def last(self):
+        return self.out[-1][-1] if self.out else ''
+
+    def emit(self, text):
+        last = self.last()
+        if last and last != '\n':
+            if self.newline and self.keep_newlines:
+                self.out.append('\n')
+            elif (self.space or self.newline) and last not in self.tight and text[0] not in self.tight:
+                self.out.append(' ')
+        self.space = self.newline = False
+        self.out.append(text)
+
+    def value(self):
+        return ''.join(self.out)
+
+
+def _read_string(source, i, quote):
+    # Returns the index just past the closing quote (or the end of the line)
+    n = len(source)
+    i += 1
+    while i < n:
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        if c == '\n' and quote != '`':
+            return i
+        i += 1
+    return n
+
+
+def _read_regex(source, i):
+    n = len(source)
+    i += 1
+    in_class = False
+    while i < n:
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '\n':
+            return i
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            i += 1
+            while i < n and (source[i].isalnum() or source[i] in '_$'):
+                i += 1
+            return i
+        i += 1
+    return n
+
+
+def _starts_regex(writer):
+    text = ''.join(writer.out[-8:]).rstrip()
+    if not text:
+        return True
+    last = text[-1]
+    if text.endswith(('++', '--')):
+        return False
+    if last in _REGEX_PRECEDERS:
+        return True
+    word = _WORD_END.search(text)
+    return word is not None and word.group(0) in _REGEX_KEYWORDS
+
+
+def minify_js(source):
+    """
+    Remove comments and redundant whitespace from a script.
+
+    Strings, template literals and regular expressions are copied verbatim and
+    line breaks between statements are kept.
+
+    Args:
+        source (str): The script
+
+    Returns:
+        str: The minified script
+    """
+    writer = _Writer(_JS_TIGHT, keep_newlines=True)
+    # One entry per open '{' in code: True when it opened a template substitution
+    braces = []
+    n = len(source)
+    i = 0
+    in_template = False
+    while i < n:
+        if in_template:
+            # Copy template text up to the closing backtick or the next ${
+            start = i
+            while i < n:
+                c = source[i]
+                if c == '\\':
+                    i += 2
+                    continue
+                if c == '`':
+                    i += 1
+                    in_template = False
+                    break
+                if c == '$' and source[i + 1:i + 2] == '{':
+                    i += 2
+                    braces.append(True)
+                    in_template = False
+                    break
+                i += 1
+            if i > start:
+                writer.out.append(source[start:i])
+            continue
+
+        c = source[i]
+        if c == '\n':
+            writer.newline = True
+            i += 1
+        elif c in ' \t\r\f\v':
+            writer.space = True
+            i += 1
+        elif c == '/' and source[i + 1:i + 2] == '/':
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+        elif c == '/' and source[i + 1:i + 2] == '*':
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            if '\n' in source[i:end]:
+                writer.newline = True
+            else:
+                writer.space = True
+            i = end
+        elif c in '\'"':
+            end = _read_string(source, i, c)
+            writer.emit(source[i:end])
+            i = end
+        elif c == '`':
+            writer.emit('`')
+            in_template = True
+            i += 1
+        elif c == '/' and _starts_regex(writer):
+            end = _read_regex(source, i)
+            writer.emit(source[i:end])
+            i = end
+        elif c == '{':
+            braces.append(False)
+            writer.emit(c)
+            i += 1
+        elif c == '}':
+            if braces and braces.pop():
+                # End of a ${...} substitution: back to the template text
+                writer.emit(c)
+                in_template = True
+            else:
+                writer.emit(c)
+            i += 1
+        else:
+            start = i
+            while i < n and source[i] not in ' \t\r\f\v\n\'"`/{}':
+                i += 1
+            if start == i:
+                i += 1
+            writer.emit(source[start:i])
+    return writer.value().strip() + '\n'
+
+
+def minify_css(source):
+    """
+    Remove comments and redundant whitespace from a stylesheet.
+
+    Args:
+        source (str): The stylesheet
+
+    Returns:
+        str: The minified stylesheet
+    """
+    writer = _Writer(_CSS_TIGHT, keep_newlines=False)
+    n = len(source)
+    i = 0
+    while i < n:
+        c = source[i]
+        if c.isspace():
+            writer.space = True
+            i += 1
+        elif c == '/' and source[i + 1:i + 2] == '*':
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            writer.space = True
+        else:
+            if writer.last() == ':' and writer.space:
+                # 'color: red' -> 'color:red'; a space before ':' is kept (descendant selectors)
+                writer.space = False
+            if c in '\'"':
+                end = _read_string(source, i, c)
+                writer.emit(source[i:end])
+                i = end
+                continue
+            if c == '}' and writer.last() == ';':
+                # The last declaration of a block needs no semicolon
+                writer.out.pop()
+            writer.emit(c)
+            i += 1
+    return writer.value().strip()
+
+
+def hashed_name(filename, digest):
+    """
+    Insert a content hash before the extension of a file name.
+
+    Args:
+        filename (str): e.g. 'css/style.css'
+        digest (str): The content hash
+
+    Returns:
+        str: e.g. 'css/style.0123456789ab.css'
+    """
+    root, ext = os.path.splitext(filename)
+    return '{}.{}{}'.format(root, digest, ext)
+
+
+class Asset:
+    """A built bundle and its encoded variants."""
+
+    def __init__(self, source, path, data):
+        self.source = source
+        self.path = path
+        self.etag = os.path.splitext(path)[0].rsplit('.', 1)[-1]
+        self.mimetype = MIMETYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+        self.variants = {'identity': data}
+
+    def add_variant(self, encoding, data):
+        # Only keep encodings that are actually smaller
+        if len(data) < len(self.variants['identity']):
+            self.variants[encoding] = data
+
+
+def _write_atomic(path, data):
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def build_asset(static_folder, source, write=True):
+    """
+    Minify, fingerprint and compress one bundle.
+
+    Args:
+        static_folder (str): The app's static folder
+        source (str): Path of the bundle relative to the static folder
+        write (bool): Also write the files to static/dist
+
+    Returns:
+        Asset: The built bundle
+    """
+    with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+        text = f.read()
+    minify = minify_css if source.endswith('.css') else minify_js
+    data = minify(text).encode('utf-8')
+    digest = hashlib.sha1(data).hexdigest()[:12]
+    asset = Asset(source, '/'.join((DIST_DIR, hashed_name(source, digest))), data)
+    # mtime=0 keeps the gzip output identical across builds
+    asset.add_variant('gzip', gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        asset.add_variant('br', brotli.compress(data, quality=11))
+
+    if write:
+        path = os.path.join(static_folder, asset.path)
+        _write_atomic(path, data)
+        for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+            if encoding in asset.variants:
+                _write_atomic(path + suffix, asset.variants[encoding])
+    return asset
+
+
+def read_asset(static_folder, source, path):
+    """
+    Read a bundle written by an earlier build, with its encoded siblings.
+
+    Args:
+        static_folder (str): The app's static folder
+        source (str): Path of the bundle relative to the static folder
+        path (str): The hashed path from the manifest
+
+    Returns:
+        Asset: The bundle or None if its file is missing
+    """
+    full_path = os.path.join(static_folder, path)
+    try:
+        with open(full_path, 'rb') as f:
+            asset = Asset(source, path, f.read())
+    except OSError:
+        return None
+    for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+        try:
+            with open(full_path + suffix, 'rb') as f:
+                asset.add_variant(encoding, f.read())
+        except OSError:
+            pass
+    return asset
+
+
+_assets = {}
+_manifest = {}
+_lock = threading.Lock()
+
+
+def build(static_folder, write=True):
+    """
+    Build every bundle and write the manifest.
+
+    Args:
+        static_folder (str): The app's static folder
+        write (bool): Write the files to static/dist; without it the bundles
+            are only kept in memory
+
+    Returns:
+        dict: Manifest mapping source names to hashed names
+    """
+    built = {source: build_asset(static_folder, source, write) for source in BUNDLES
+             if os.path.exists(os.path.join(static_folder, source))}
+    manifest = {source: asset.path for source, asset in built.items()}
+    if write:
+        manifest_path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            os.unlink(manifest_path)
+        _write_atomic(manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    with _lock:
+        _assets.clear()
+        _assets.update({asset.path: asset for asset in built.values()})
+        _manifest.clear()
+        _manifest.update(manifest)
+    return manifest
+
+
+def load(static_folder):
+    """
+    Load a manifest written by an earlier build, e.g. `flask assets build`.
+
+    The bundles and their .gz/.br siblings are read into memory, so they are
+    served precompressed exactly as after a build on startup.
+
+    Args:
+        static_folder (str): The app's static folder
+
+    Returns:
+        dict: The manifest, empty if there is none
+    """
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    assets = [read_asset(static_folder, source, path) for source, path in manifest.items()]
+    with _lock:
+        _assets.clear()
+        _assets.update({asset.path: asset for asset in assets if asset is not None})
+        _manifest.clear()
+        _manifest.update(manifest)
+    return manifest
+
+
+def get_manifest():
+    """
+    Get the current manifest.
+
+    Returns:
+        dict: Source names mapped to hashed names
+    """
+    return dict(_manifest)
+
+
+def _choose_encoding(asset):
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and accepted[encoding]:
+            return encoding
+    return 'identity'
+
+
+def make_response(filename):
+    """
+    Serve a built bundle in the best encoding the client accepts.
+
+    Args:
+        filename (str): Path relative to the static folder, e.g. 'dist/css/style.<hash>.css'
+
+    Returns:
+        Response: The response or None if the bundle is not held in memory
+    """
+    asset = _assets.get(filename)
+    if asset is None:
+        return None
+    encoding = _choose_encoding(asset)
+    response = current_app.response_class(asset.variants[encoding], mimetype=asset.mimetype)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(asset.etag if encoding == 'identity' else '{}-{}'.format(asset.etag, encoding))
+    return response.make_conditional(request)
+
+
+def _set_immutable(response):
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('ASSETS_MAX_AGE', IMMUTABLE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    """
+    Build or load the bundles and hook them into url_for and the static view.
+
+    Args:
+        app (Flask): The application
+    """
+    if not app.config.get('ASSETS_ENABLED', True):
+        return
+    if app.config.get('ASSETS_BUILD_ON_STARTUP', True):
+        try:
+            build(app.static_folder)
+        except OSError as e:
+            # A read-only static folder still gets minified bundles from memory
+            app.logger.warning("Could not write static bundles, serving from memory: {}".format(str(e)))
+            build(app.static_folder, write=False)
+    else:
+        load(app.static_folder)
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static':
+            hashed = _manifest.get(values.get('filename'))
+            if hashed is not None:
+                values['filename'] = hashed
+
+    send_static = app.view_functions['static']
+
+    def static(filename):
+        if not filename.startswith(DIST_DIR + '/'):
+            return send_static(filename=filename)
+        response = make_response(filename)
+        if response is None:
+            # Bundles of earlier builds stay valid for pages cached with their names
+            response = send_static(filename=filename)
+        return _set_immutable(response)
+
+    app.view_functions['static'] = static
@@ -0,0 +1,521 @@
+"""
+Response caching primitives.
+
+``LRUCache`` is an in-process, byte-bounded LRU with per-entry TTLs.
+``SQLiteCache`` is an optional shared tier stored in a local SQLite file so
+that every worker process on the host can reuse the same entries.
+``TieredCache`` checks the local tier first and falls back to the shared one.
+
+Entries may outlive their TTL by a ``stale_ttl`` window. ``get`` only returns
+fresh values while ``get_entry`` also returns stale ones, so callers can serve
+a stale copy while a single background refresh runs (see ``SingleFlight``).
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache bounded by total value size in bytes."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): Upper bound for the sum of cached value sizes
+        """
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remove(self, key):
+        value, _, _ = self._data.pop(key)
+        self._bytes -= len(value)
+
+    def get(self, key):
+        """
+        Get a fresh value from the cache.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            bytes: The cached value or None if missing or past its TTL
+        """
+        entry = self.get_entry(key)
+        if entry is None or not entry[1]:
+            return None
+        return entry[0]
+
+    def get_entry(self, key):
+        """
+        Get a value from the cache, including values within their stale window.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            tuple: (value, is_fresh, fresh_until) or None if missing or expired
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, fresh_until, expires_at = item
+            now = time.time()
+            if expires_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            fresh = fresh_until > now
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return value, fresh, fresh_until
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """
+        Store a value in the cache, evicting least recently used entries as needed.
+
+        Args:
+            key (str): The cache key
+            value (bytes): The value to store
+            ttl (float): Time to live in seconds
+            stale_ttl (float): Extra seconds the value may be served stale
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            fresh_until = time.time() + ttl
+            self._data[key] = (value, fresh_until, fresh_until + stale_ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove a key from the cache if present."""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def keys(self, prefix=''):
+        """
+        List the unexpired keys starting with a prefix.
+
+        Args:
+            prefix (str): The key prefix
+
+        Returns:
+            list: The matching keys
+        """
+        now = time.time()
+        with self._lock:
+            return [key for key, item in self._data.items() if key.startswith(prefix) and item[2] > now]
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Hit, miss and eviction counters plus current size
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+class SQLiteCache:
+    """Cache stored in a local SQLite file, shared by all processes on a host."""
+
+    # Expired rows are purged every PRUNE_EVERY writes
+    PRUNE_EVERY = 500
+
+    def __init__(self, path, max_entries=100000):
+        """
+        Args:
+            path (str): Path of the SQLite database file
+            max_entries (int): Upper bound for the number of stored rows
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+            'fresh_until REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)')
+        conn.commit()
+
+    def _connection(self):
+        # SQLite connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """
+        Get a value and its expiry times from the shared cache.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            tuple: (value, fresh_until, expires_at) or None if missing or expired
+        """
+        try:
+            row = self._connection().execute(
+                'SELECT value, fresh_until, expires_at FROM cache WHERE key = ? AND expires_at > ?',
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print("Error: Shared cache read failed. {}".format(str(e)))
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return bytes(row[0]), row[1], row[2]
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """
+        Store a value in the shared cache.
+
+        Args:
+            key (str): The cache key
+            value (bytes): The value to store
+            ttl (float): Time to live in seconds
+            stale_ttl (float): Extra seconds the value may be served stale
+        """
+        fresh_until = time.time() + ttl
+        try:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, fresh_until, expires_at) VALUES (?, ?, ?, ?)',
+                (key, sqlite3.Binary(value), fresh_until, fresh_until + stale_ttl)
+            )
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % self.PRUNE_EVERY == 0
+            if prune:
+                self.prune()
+        except sqlite3.Error as e:
+            print("Error: Shared cache write failed. {}".format(str(e)))
+
+    def prune(self):
+        """Delete expired rows and trim the table down to max_entries."""
+        conn = self._connection()
+        conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        count = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self.max_entries:
+            excess = count - self.max_entries
+            conn.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY expires_at LIMIT ?)',
+                (excess,)
+            )
+            with self._lock:
+                self.evictions += excess
+
+    def delete(self, key):
+        """Remove a key from the shared cache if present."""
+        try:
+            self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            print("Error: Shared cache delete failed. {}".format(str(e)))
+
+    def clear(self):
+        """Remove every entry from the shared cache."""
+        self._connection().execute('DELETE FROM cache')
+
+    def keys(self, prefix=''):
+        """
+        List the unexpired keys starting with a prefix.
+
+        Args:
+            prefix (str): The key prefix
+
+        Returns:
+            list: The matching keys
+        """
+        try:
+            rows = self._connection().execute(
+                "SELECT key FROM cache WHERE substr(key, 1, ?) = ? AND expires_at > ?",
+                (len(prefix), prefix, time.time())
+            ).fetchall()
+        except sqlite3.Error as e:
+            print("Error: Shared cache read failed. {}".format(str(e)))
+            rows = []
+        return [row[0] for row in rows]
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Hit, miss and eviction counters for this process
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'path': self.path
+            }
+
+
+class TieredCache:
+    """Two-level cache: in-process LRU in front of an optional shared tier."""
+
+    def __init__(self, local, shared=None):
+        """
+        Args:
+            local (LRUCache): The in-process tier
+            shared (SQLiteCache): The optional shared tier
+        """
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        """
+        Get a fresh value, promoting shared hits into the local tier.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            bytes: The cached value or None if missing or past its TTL
+        """
+        entry = self.get_entry(key)
+        if entry is None or not entry[1]:
+            return None
+        return entry[0]
+
+    def get_entry(self, key):
+        """
+        Get a value that may be stale, promoting shared hits into the local tier.
+
+        A stale local copy is superseded by a fresher copy from the shared tier,
+        which another worker may already have refreshed.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            tuple: (value, is_fresh, fresh_until) or None if missing or expired
+        """
+        entry = self.local.get_entry(key)
+        if (entry is not None and entry[1]) or self.shared is None:
+            return entry
+        item = self.shared.get(key)
+        if item is None:
+            return entry
+        value, fresh_until, expires_at = item
+        now = time.time()
+        if entry is not None and fresh_until <= entry[2]:
+            return entry
+        self.local.set(key, value, fresh_until - now, expires_at - fresh_until)
+        return value, fresh_until > now, fresh_until
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """
+        Store a value in every tier.
+
+        Args:
+            key (str): The cache key
+            value (bytes): The value to store
+            ttl (float): Time to live in seconds
+            stale_ttl (float): Extra seconds the value may be served stale
+        """
+        self.local.set(key, value, ttl, stale_ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl, stale_ttl)
+
+    def delete(self, key):
+        """Remove a key from every tier."""
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        """Remove every entry from every tier."""
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def keys(self, prefix=''):
+        """
+        List the unexpired keys starting with a prefix in any tier.
+
+        Args:
+            prefix (str): The key prefix
+
+        Returns:
+            list: The matching keys
+        """
+        keys = set(self.local.keys(prefix))
+        if self.shared is not None:
+            keys.update(self.shared.keys(prefix))
+        return sorted(keys)
+
+    def stats(self):
+        """
+        Get counters for every tier.
+
+        Returns:
+            dict: Stats keyed by tier name
+        """
+        return {
+            'local': self.local.stats(),
+            'shared': self.shared.stats() if self.shared is not None else None
+        }
+
+
+class _Call:
+    """An in-flight call tracked by SingleFlight."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into a single execution.
+
+    The first caller for a key runs the function; concurrent callers for the
+    same key block until it finishes and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.background = 0
+
+    def do(self, key, fn):
+        """
+        Run fn once for all concurrent callers of the same key.
+
+        Args:
+            key (str): The coalescing key
+            fn (callable): The function to run
+
+        Returns:
+            The result of fn
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self._run(key, call, fn)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run(self, key, call, fn):
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def do_background(self, key, fn):
+        """
+        Run fn in a daemon thread unless a call for the key is already in flight.
+
+        Args:
+            key (str): The coalescing key
+            fn (callable): The function to run
+
+        Returns:
+            bool: True if a new background call was started
+        """
+        with self._lock:
+            if key in self._calls:
+                return False
+            call = _Call()
+            self._calls[key] = call
+            self.background += 1
+
+        def run():
+            self._run(key, call, fn)
+            if call.error is not None:
+                print("Error: Background refresh of {} failed. {}".format(key, str(call.error)))
+
+        thread = threading.Thread(target=run, name='refresh:{}'.format(key), daemon=True)
+        thread.start()
+        return True
+
+    def stats(self):
+        """
+        Get coalescing counters.
+
+        Returns:
+            dict: Number of coalesced callers, background refreshes and calls in flight
+        """
+        with self._lock:
+            return {
+                'coalesced': self.coalesced,
+                'background_refreshes': self.background,
+                'in_flight': len(self._calls)
+            }
@@ -0,0 +1,186 @@
+"""
+Asynchronous, batched click accounting for short links.
+
+Redirects only add the code to an in-memory buffer. A daemon thread flushes
+the buffer every CLICKS_FLUSH_INTERVAL seconds (or sooner once it holds
+CLICKS_MAX_PENDING codes) as one executemany UPDATE of Link.last_call plus a
+bulk INSERT of per-code hit counts into link_click, so redirects never wait on
+row locks. The buffer is also flushed when the process exits.
+"""
+import atexit
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import text
+
+from lib.database import db
+from lib.link import LinkClick
+
+DEFAULT_FLUSH_INTERVAL = 10
+DEFAULT_MAX_PENDING = 10000
+
+UPDATE_LAST_CALL = text('UPDATE link SET last_call = :last_call WHERE short_code = :code OR custom_code = :code')
+
+
+class ClickRecorder(threading.Thread):
+    """Buffers clicks per code and writes them to the database in batches."""
+
+    def __init__(self, app):
+        """
+        Args:
+            app (Flask): The application whose database is written to
+        """
+        super().__init__(name='click-recorder', daemon=True)
+        self.app = app
+        self.interval = app.config.get('CLICKS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        self.max_pending = app.config.get('CLICKS_MAX_PENDING', DEFAULT_MAX_PENDING)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._table_ready = False
+        self.flushed = 0
+        self.errors = 0
+
+    def record(self, code):
+        """
+        Count one click on a code.
+
+        Args:
+            code (str): The short code that was followed
+        """
+        now = datetime.now()
+        with self._lock:
+            entry = self._pending.get(code)
+            if entry is None:
+                self._pending[code] = [1, now, now]
+            else:
+                entry[0] += 1
+                entry[2] = now
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def _merge_back(self, batch):
+        # Keep clicks from a failed flush for the next attempt
+        with self._lock:
+            for code, (hits, first_call, last_call) in batch.items():
+                entry = self._pending.get(code)
+                if entry is None:
+                    self._pending[code] = [hits, first_call, last_call]
+                else:
+                    entry[0] += hits
+                    entry[1] = min(entry[1], first_call)
+                    entry[2] = max(entry[2], last_call)
+
+    def flush(self):
+        """
+        Write the buffered clicks.
+
+        Returns:
+            int: Number of codes written
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as conn:
+                        if not self._table_ready:
+                            LinkClick.__table__.create(bind=conn, checkfirst=True)
+                            self._table_ready = True
+                        conn.execute(UPDATE_LAST_CALL, [
+                            {'code': code, 'last_call': entry[2]} for code, entry in batch.items()
+                        ])
+                        conn.execute(LinkClick.__table__.insert(), [
+                            {'code': code, 'hits': entry[0], 'first_call': entry[1], 'last_call': entry[2]}
+                            for code, entry in batch.items()
+                        ])
+            except Exception as e:
+                self.errors += 1
+                self._merge_back(batch)
+                self.app.logger.error("Error flushing {} link click(s): {}".format(len(batch), str(e)))
+                return 0
+            self.flushed += len(batch)
+            return len(batch)
+
+    def stop(self):
+        """Stop the thread and flush what is left."""
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+    def run(self):
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self):
+        """
+        Get recorder counters.
+
+        Returns:
+            dict: Buffered codes, flushed codes and failed flushes
+        """
+        with self._lock:
+            pending = len(self._pending)
+        return {'pending': pending, 'flushed': self.flushed, 'errors': self.errors}
+
+
+_lock = threading.Lock()
+_recorders = {}
+
+
+def get_recorder(app):
+    """
+    Get the click recorder of this process, starting it on first use.
+
+    Args:
+        app (Flask): The application
+
+    Returns:
+        ClickRecorder: The recorder or None if click accounting is disabled
+    """
+    if not app.config.get('CLICKS_ENABLED', True):
+        return None
+    pid = os.getpid()
+    recorder = _recorders.get(pid)
+    if recorder is None:
+        with _lock:
+            recorder = _recorders.get(pid)
+            if recorder is None:
+                # Threads do not survive a fork, so each worker starts its own
+                recorder = ClickRecorder(app)
+                recorder.start()
+                atexit.register(recorder.stop)
+                _recorders[pid] = recorder
+    return recorder
+
+
+def record(app, code):
+    """
+    Count one click on a short code.
+
+    Args:
+        app (Flask): The application
+        code (str): The short code that was followed
+    """
+    recorder = get_recorder(app)
+    if recorder is not None:
+        recorder.record(code)
+
+
+def stats():
+    """
+    Get click recorder counters for this process.
+
+    Returns:
+        dict: Counters, or None if no click was recorded yet
+    """
+    recorder = _recorders.get(os.getpid())
+    return recorder.stats() if recorder is not None else None
@@ -1,4 +1,67 @@
+import os
+
 from flask_sqlalchemy import SQLAlchemy
 
 # Create the database instance
-db = SQLAlchemy(session_options={"autoflush": False}) 
\ No newline at end of file
+db = SQLAlchemy(session_options={"autoflush": False})
+
+# Pool settings: config key -> type used to parse an environment override
+POOL_SETTINGS = {
+    'DB_POOL_SIZE': int,
+    'DB_MAX_OVERFLOW': int,
+    'DB_POOL_TIMEOUT': int,
+    'DB_POOL_RECYCLE': int,
+    'DB_POOL_PRE_PING': lambda value: value.lower() in ('1', 'true', 'yes', 'on'),
+}
+
+
+def get_engine_options(app, uri):
+    """
+    Build the SQLAlchemy engine options from the app config and environment.
+
+    Args:
+        app (Flask): The application
+        uri (str): The database URI
+
+    Returns:
+        dict: Keyword arguments for create_engine
+    """
+    settings = {}
+    for name, parse in POOL_SETTINGS.items():
+        value = os.environ.get(name)
+        settings[name] = parse(value) if value is not None else app.config.get(name)
+
+    options = {'pool_pre_ping': settings['DB_POOL_PRE_PING']}
+    # In-memory SQLite uses a single shared connection and takes no pool sizing
+    if not (uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') in ('sqlite:', 'sqlite:/'))):
+        options.update(
+            pool_size=settings['DB_POOL_SIZE'],
+            max_overflow=settings['DB_MAX_OVERFLOW'],
+            pool_timeout=settings['DB_POOL_TIMEOUT'],
+            pool_recycle=settings['DB_POOL_RECYCLE'],
+        )
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def init_app(app):
+    """
+    Configure the database from SQLALCHEMY_DATABASE_URI (environment first, then config).
+
+    The app keeps working without a database; only the short-link routes need it.
+
+    Args:
+        app (Flask): The application
+
+    Returns:
+        bool: True if a database was configured
+    """
+    uri = os.environ.get('SQLALCHEMY_DATABASE_URI') or app.config.get('SQLALCHEMY_DATABASE_URI')
+    if not uri:
+        app.logger.warning("SQLALCHEMY_DATABASE_URI is not set; short links are disabled")
+        return False
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options(app, uri)
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    db.init_app(app)
+    return True
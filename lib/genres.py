@@ -0,0 +1,125 @@
+"""
+In-process catalog of the TMDB movie and TV genre lists.
+
+The lists are loaded once per process and refreshed rarely (GENRE_CATALOG_TTL),
+with id->name dictionaries for the genre pages and pre-serialized JSON plus an
+ETag for the /api/genres endpoints. Failed loads are retried after a short
+delay instead of pinning an empty list for a full day, and a failed reload
+keeps serving the last list that loaded.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from flask import current_app
+
+import tmdb_api
+
+DEFAULT_TTL = 24 * 60 * 60
+RETRY_AFTER = 60
+
+LOADERS = {
+    'movie': tmdb_api.get_movie_genres,
+    'tv': tmdb_api.get_tv_show_genres
+}
+
+
+class GenreList:
+    """One loaded genre list with its lookup table and serialized form."""
+
+    def __init__(self, genres, loaded_at):
+        self.genres = genres
+        self.names = {genre['id']: genre['name'] for genre in genres}
+        self.json = json.dumps(genres, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.json).hexdigest()[:16]
+        self.loaded_at = loaded_at
+
+
+class GenreCatalog:
+    """Thread-safe holder of the genre lists, refreshed on access when expired."""
+
+    def __init__(self):
+        self._lists = {}
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def _load(self, media_type):
+        try:
+            genres = LOADERS[media_type]()
+        except tmdb_api.UpstreamUnavailable:
+            genres = []
+        previous = self._lists.get(media_type)
+        if genres or previous is None or not previous.genres:
+            genre_list = GenreList(genres, time.time())
+        else:
+            # A failed reload keeps the last good list instead of blanking it
+            genre_list = previous
+        if not genres:
+            # Treat as expired again after RETRY_AFTER seconds
+            genre_list.loaded_at = time.time() - max(self._ttl() - RETRY_AFTER, 0)
+        self._lists[media_type] = genre_list
+        return genre_list
+
+    def _ttl(self):
+        return current_app.config.get('GENRE_CATALOG_TTL', DEFAULT_TTL)
+
+    def get(self, media_type='movie'):
+        """
+        Get a genre list, loading it on first use.
+
+        Once loaded, an expired list keeps being served while a single caller
+        reloads it. Must be called inside an application context.
+
+        Args:
+            media_type (str): 'movie' or 'tv'
+
+        Returns:
+            GenreList: The genre list
+        """
+        genre_list = self._lists.get(media_type)
+        if genre_list is not None and time.time() - genre_list.loaded_at < self._ttl():
+            return genre_list
+
+        with self._lock:
+            genre_list = self._lists.get(media_type)
+            if genre_list is not None and (media_type in self._refreshing or time.time() - genre_list.loaded_at < self._ttl()):
+                return genre_list
+            self._refreshing.add(media_type)
+        try:
+            return self._load(media_type)
+        finally:
+            with self._lock:
+                self._refreshing.discard(media_type)
+
+    def refresh(self):
+        """Reload both lists now, keeping a list whose reload fails (used by the pre-warmer)."""
+        for media_type in LOADERS:
+            self._load(media_type)
+
+    def get_genres(self, media_type='movie'):
+        """
+        Args:
+            media_type (str): 'movie' or 'tv'
+
+        Returns:
+            list: Genre dicts with 'id' and 'name'
+        """
+        return self.get(media_type).genres
+
+    def get_name(self, genre_id, media_type='movie', default='Unknown Genre'):
+        """
+        Look up a genre name by id.
+
+        Args:
+            genre_id (int): The TMDB genre id
+            media_type (str): 'movie' or 'tv'
+            default (str): Name returned for unknown ids
+
+        Returns:
+            str: The genre name
+        """
+        return self.get(media_type).names.get(genre_id, default)
+
+
+catalog = GenreCatalog()
@@ -0,0 +1,61 @@
+"""
+HTTP validators and Cache-Control headers for the TMDB-backed routes.
+
+Successful GET responses of routes registered with pagecache.cached() get a
+strong ETag (hash of the rendered body, reused together with Last-Modified
+from the rendered-output cache when available) and a Cache-Control header
+chosen by the route's data cache policy. Requests carrying a matching
+If-None-Match or If-Modified-Since are answered with 304. Error pages are
+marked no-store so neither browsers nor the CDN keep them.
+"""
+import hashlib
+
+from flask import current_app, g, request
+
+from lib import pagecache
+
+DEFAULT_POLICY = {'max_age': 60, 's_maxage': 300, 'stale_while_revalidate': 600}
+
+
+def get_policy(endpoint):
+    """
+    Get the Cache-Control settings for an endpoint.
+
+    Args:
+        endpoint (str): The route endpoint
+
+    Returns:
+        dict: max_age, s_maxage and stale_while_revalidate in seconds
+    """
+    policies = current_app.config.get('HTTP_CACHE_POLICIES', {})
+    name = pagecache.policies.get(endpoint, 'default')
+    return policies.get(name, policies.get('default', DEFAULT_POLICY))
+
+
+def apply(response):
+    """
+    Add validators and Cache-Control to a response and make it conditional.
+
+    Args:
+        response (Response): The response about to be sent
+
+    Returns:
+        Response: The response, possibly turned into a 304
+    """
+    endpoint = request.endpoint
+    if endpoint not in pagecache.policies or request.method not in ('GET', 'HEAD'):
+        return response
+    if response.status_code != 200 or g.get('render_cache_skip'):
+        response.cache_control.no_store = True
+        return response
+    if response.direct_passthrough:
+        return response
+
+    if response.get_etag()[0] is None:
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest()[:20])
+    policy = get_policy(endpoint)
+    response.cache_control.public = True
+    response.cache_control.max_age = policy['max_age']
+    response.cache_control.s_maxage = policy['s_maxage']
+    response.cache_control.stale_while_revalidate = policy['stale_while_revalidate']
+    return response.make_conditional(request)
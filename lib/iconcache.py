@@ -0,0 +1,108 @@
+"""
+In-memory cache for the small files requested on every visit.
+
+The touch icons, favicon, web manifest and robots.txt are read once when the
+app starts and kept as immutable bytes, each with a content-hash ETag, so
+requests never touch the disk and revalidations are answered with an empty
+304. Every response shares the same bytes object (WSGI servers require bytes,
+so a memoryview would only be copied again on write).
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import current_app, request
+
+# Name -> path relative to the static folder
+FILES = {
+    'logo-76.png': 'images/logo-76.png',
+    'logo-120.png': 'images/logo-120.png',
+    'logo-152.png': 'images/logo-152.png',
+    'logo-180.png': 'images/logo-180.png',
+    'logo_fav.png': 'images/logo_fav.png',
+    'manifest.json': 'manifest.json',
+    'robots.txt': 'robots.txt',
+}
+
+
+class CachedFile:
+    """A file held in memory with its validators."""
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self.etag = hashlib.sha1(data).hexdigest()[:16]
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.mtime = int(os.path.getmtime(path))
+
+
+_files = {}
+_lock = threading.Lock()
+
+
+def load(static_folder):
+    """
+    Read every file in FILES into memory, replacing earlier copies.
+
+    Args:
+        static_folder (str): The app's static folder
+
+    Returns:
+        int: Number of files loaded
+    """
+    loaded = {}
+    for name, relative in FILES.items():
+        path = os.path.join(static_folder, relative)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                loaded[name] = CachedFile(path, f.read())
+    with _lock:
+        _files.clear()
+        _files.update(loaded)
+    return len(loaded)
+
+
+def get(name):
+    """
+    Get a cached file, loading the set on first use.
+
+    Args:
+        name (str): A key of FILES
+
+    Returns:
+        CachedFile: The file or None if it does not exist
+    """
+    if not _files:
+        load(current_app.static_folder)
+    return _files.get(name)
+
+
+def make_response(name, max_age=None, revalidate=False):
+    """
+    Serve a cached file with its ETag, answering If-None-Match with 304.
+
+    Args:
+        name (str): A key of FILES
+        max_age (int): Cache lifetime in seconds
+        revalidate (bool): Require clients to revalidate on every use
+
+    Returns:
+        Response: The response or None if the file does not exist
+    """
+    cached = get(name)
+    if cached is None:
+        return None
+    response = current_app.response_class(cached.data, mimetype=cached.mimetype)
+    response.set_etag(cached.etag)
+    response.last_modified = cached.mtime
+    if revalidate:
+        response.cache_control.no_cache = True
+        response.cache_control.must_revalidate = True
+        response.cache_control.max_age = 0
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age if max_age is not None else current_app.config.get('STATIC_ICON_MAX_AGE', 24 * 60 * 60)
+    return response.make_conditional(request)
@@ -0,0 +1,346 @@
+"""
+Caching proxy for TMDB images served from /img/<size>/<path>.
+
+Images are fetched from image.tmdb.org once, stored under IMAGE_CACHE_DIR and
+served from disk with sendfile (or X-Accel-Redirect), an ETag and one-year
+immutable caching: a TMDB file name never changes content. Concurrent misses
+for the same image share one upstream fetch.
+
+The directory is bounded by IMAGE_CACHE_MAX_BYTES. Hits bump the file's mtime
+(at most once per TOUCH_INTERVAL). The running total of bytes stored lives in
+a small counter file in the directory, updated under flock by every worker
+that shares it, so the limit applies to the directory rather than to each
+process. Once the total exceeds the limit the directory is rescanned under
+the same lock and the least recently used files are removed until it is back
+under EVICT_TO of the limit.
+
+Only raster formats are proxied: SVG served from our own origin could run
+script.
+"""
+import hashlib
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+
+import requests
+from flask import abort, current_app, redirect, send_file
+
+from lib import transport
+from lib.cache import SingleFlight
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Sizes image.tmdb.org serves for posters, backdrops, profiles and logos
+SIZES = frozenset(('w45', 'w92', 'w154', 'w185', 'w300', 'w342', 'w500', 'w780', 'w1280', 'h632', 'original'))
+FILENAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+\.(?:jpg|jpeg|png|webp)$')
+MIMETYPES = {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+NOT_FOUND_MAX_AGE = 60 * 60
+TOUCH_INTERVAL = 60 * 60
+EVICT_TO = 0.9
+CHUNK_SIZE = 64 * 1024
+
+USAGE_FILE = '.usage'
+_USAGE = struct.Struct('q')  # bytes stored in the directory
+
+
+class NotFound(Exception):
+    """The image does not exist upstream."""
+
+
+class DiskImageCache:
+    """Image files in one directory, bounded by their total size."""
+
+    def __init__(self, directory, max_bytes):
+        """
+        Args:
+            directory (str): Where images are stored (created if missing)
+            max_bytes (int): Size limit of all cached images
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._fd = None
+        self._fd_pid = None
+        os.makedirs(directory, exist_ok=True)
+        self._update_usage(lambda total: sum(size for _, _, size in self._scan()))
+
+    def _usage_file(self):
+        # A descriptor inherited over fork would share its flock with the parent
+        if self._fd is None or self._fd_pid != os.getpid():
+            self._fd = os.open(os.path.join(self.directory, USAGE_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+            self._fd_pid = os.getpid()
+        return self._fd
+
+    def _update_usage(self, update):
+        """
+        Replace the directory's byte total while holding the shared lock.
+
+        Args:
+            update (callable): Gets the current total, returns the new one
+
+        Returns:
+            int: The new total
+        """
+        with self._lock:
+            if fcntl is None:
+                self.total_bytes = update(self.total_bytes)
+                return self.total_bytes
+            fd = self._usage_file()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(fd, _USAGE.size, 0)
+                total = _USAGE.unpack(data)[0] if len(data) == _USAGE.size else 0
+                self.total_bytes = max(0, update(total))
+                os.pwrite(fd, _USAGE.pack(self.total_bytes), 0)
+                return self.total_bytes
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def path(self, size, filename):
+        return os.path.join(self.directory, '{}-{}'.format(size, filename))
+
+    def _scan(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def get(self, size, filename):
+        """
+        Get the path of a cached image, marking it as recently used.
+
+        Returns:
+            str: The path or None on a miss
+        """
+        path = self.path(size, filename)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        self.hits += 1
+        return path
+
+    def fetch(self, size, filename, url, timeout):
+        """
+        Get an image, downloading it on a miss. Concurrent misses for the same
+        image wait for a single download.
+
+        Args:
+            size (str): The TMDB size
+            filename (str): The TMDB file name
+            url (str): The upstream URL
+            timeout (float): Upstream timeout in seconds
+
+        Returns:
+            str: The path of the cached file
+
+        Raises:
+            NotFound: The image does not exist upstream
+            requests.exceptions.RequestException: The download failed
+        """
+        path = self.get(size, filename)
+        if path is not None:
+            return path
+        return self._flight.do(self.path(size, filename), lambda: self._download(size, filename, url, timeout))
+
+    def _download(self, size, filename, url, timeout):
+        path = self.path(size, filename)
+        if os.path.exists(path):
+            # Another caller finished the download while we waited
+            return path
+        self.misses += 1
+        response = transport.get_session().get(url, timeout=timeout, stream=True, headers={'Accept': 'image/*'})
+        try:
+            if response.status_code == 404:
+                raise NotFound(url)
+            response.raise_for_status()
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+            written = 0
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        finally:
+            response.close()
+
+        if self._update_usage(lambda total: total + written) > self.max_bytes:
+            self.evict()
+        return path
+
+    def evict(self):
+        """
+        Remove least recently used images until the directory is below
+        EVICT_TO of the limit.
+
+        Returns:
+            int: Number of files removed
+        """
+        removed = []
+
+        def rescan_and_remove(_):
+            # Another worker may have evicted while this one waited for the lock
+            entries = sorted(self._scan())
+            total = sum(size for _, _, size in entries)
+            target = self.max_bytes * EVICT_TO
+            for _, path, size in entries:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed.append(path)
+            return total
+
+        self._update_usage(rescan_and_remove)
+        self.evictions += len(removed)
+        return len(removed)
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Hits, misses, evictions, bytes used and the limit
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'coalesced': self._flight.coalesced,
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+_lock = threading.Lock()
+_caches = {}
+
+
+def get_cache(app=None):
+    """
+    Get the image cache of this process.
+
+    Args:
+        app (Flask): The application, defaults to current_app
+
+    Returns:
+        DiskImageCache: The cache
+    """
+    app = app or current_app
+    directory = app.config.get('IMAGE_CACHE_DIR') or os.path.join(app.instance_path, 'images')
+    cache = _caches.get(directory)
+    if cache is None:
+        with _lock:
+            cache = _caches.get(directory)
+            if cache is None:
+                cache = DiskImageCache(directory, app.config.get('IMAGE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+                _caches[directory] = cache
+    return cache
+
+
+def stats():
+    """
+    Get counters of the image caches used by this process.
+
+    Returns:
+        dict: Stats of the cache, or None if no image was served yet
+    """
+    for cache in _caches.values():
+        return cache.stats()
+    return None
+
+
+def upstream_url(size, filename):
+    """
+    Get the image.tmdb.org URL of an image.
+
+    Args:
+        size (str): The TMDB size
+        filename (str): The TMDB file name
+
+    Returns:
+        str: The URL
+    """
+    base_url = current_app.config.get('IMAGE_PROXY_UPSTREAM_URL') or current_app.config['TMDB_IMAGE_BASE_URL']
+    return '{}{}/{}'.format(base_url, size, filename)
+
+
+def make_response(size, filename):
+    """
+    Serve an image from the cache, fetching it on a miss.
+
+    Upstream failures redirect to image.tmdb.org, so pages keep their images
+    while the proxy cannot reach it.
+
+    Args:
+        size (str): The TMDB size
+        filename (str): The TMDB file name
+
+    Returns:
+        Response: The image
+    """
+    if size not in SIZES or not FILENAME_PATTERN.match(filename):
+        abort(404)
+    config = current_app.config
+    url = upstream_url(size, filename)
+    cache = get_cache()
+    try:
+        path = cache.fetch(size, filename, url, config.get('IMAGE_PROXY_TIMEOUT', 10))
+    except NotFound:
+        response = current_app.response_class('Not found', status=404, mimetype='text/plain')
+        response.cache_control.public = True
+        response.cache_control.max_age = NOT_FOUND_MAX_AGE
+        return response
+    except requests.exceptions.RequestException as e:
+        current_app.logger.warning("Image proxy could not fetch {}: {}".format(url, str(e)))
+        return redirect(url)
+
+    max_age = config.get('IMAGE_PROXY_MAX_AGE', IMMUTABLE_MAX_AGE)
+    etag = hashlib.sha1('{}/{}'.format(size, filename).encode('utf-8')).hexdigest()[:16]
+    mimetype = MIMETYPES[filename.rsplit('.', 1)[1].lower()]
+    accel_prefix = config.get('IMAGE_PROXY_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        # Let the front server send the file; only headers come from here
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + os.path.basename(path)
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        # send_file answers If-None-Match itself and uses the server's sendfile path
+        response = send_file(path, mimetype=mimetype, etag=etag, conditional=True, max_age=max_age)
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,171 @@
+"""
+Responsive image policy for TMDB posters, backdrops and profile photos.
+
+Each context (a grid card, a detail poster, a hero backdrop, a cast avatar...)
+has a ladder of TMDB sizes, a default size for the src fallback and a `sizes`
+attribute describing how wide the image is rendered, so browsers download the
+smallest file that is sharp on the current screen. Only hero backdrops go up
+to large sizes.
+
+The 10-foot TV layout (tv.css) reuses the same templates, so its rendered
+widths are part of each context's `sizes` under TV_MEDIA rather than a
+separate context.
+
+Templates use image_attrs(), which renders src/srcset/sizes together with the
+loading and decoding hints:
+
+    <img {{ image_attrs('card', movie.poster_path) }} alt="...">
+"""
+import re
+
+from markupsafe import Markup, escape
+
+from tmdb_api import get_image_url
+
+# Same media query as tv.css
+TV_MEDIA = '(min-width: 1920px) and (min-height: 1080px)'
+
+_WIDTH = re.compile(r'^w(\d+)$')
+
+
+class ImagePolicy:
+    """Sizes and loading hints of one image context."""
+
+    def __init__(self, ladder, default, sizes, widths=None, loading='lazy', fetchpriority=None):
+        """
+        Args:
+            ladder (tuple): TMDB size names, smallest first (e.g. 'w185')
+            default (str): Size used for src and for non-responsive uses
+            sizes (str): The sizes attribute
+            widths (dict): Pixel widths of sizes that do not encode one
+                ('original', 'h632'), used as srcset descriptors
+            loading (str): 'lazy' or 'eager'
+            fetchpriority (str): Optional fetchpriority hint
+        """
+        self.ladder = ladder
+        self.default = default
+        self.sizes = sizes
+        self.widths = widths or {}
+        self.loading = loading
+        self.fetchpriority = fetchpriority
+
+    def width(self, size):
+        match = _WIDTH.match(size)
+        return int(match.group(1)) if match else self.widths.get(size)
+
+
+CONTEXTS = {
+    # Poster cards in grids and sliders (175px grid columns, two columns on phones)
+    'card': ImagePolicy(
+        ('w154', 'w185', 'w342', 'w500'), 'w342',
+        '{} 220px, (max-width: 480px) 50vw, 200px'.format(TV_MEDIA),
+    ),
+    # Person cards in search results (profile photos only come in these sizes)
+    'person_card': ImagePolicy(
+        ('w185', 'h632'), 'w185',
+        '{} 220px, (max-width: 480px) 50vw, 200px'.format(TV_MEDIA),
+        widths={'h632': 421},
+    ),
+    # The poster on detail and watch pages
+    'poster': ImagePolicy(
+        ('w185', 'w342', 'w500', 'w780'), 'w500',
+        '{} 300px, (max-width: 768px) 60vw, 300px'.format(TV_MEDIA),
+        loading='eager',
+    ),
+    # Full-width backdrops: detail page headers and the home carousel. Originals
+    # have no known width (often 3840px), so the ladder stops at w1280
+    'hero': ImagePolicy(
+        ('w780', 'w1280'), 'w1280', '100vw',
+        loading='eager', fetchpriority='high',
+    ),
+    # Cast photos in credits grids (150px columns)
+    'avatar': ImagePolicy(
+        ('w45', 'w185', 'h632'), 'w185',
+        '{} 200px, 150px'.format(TV_MEDIA),
+        widths={'h632': 421},
+    ),
+    # The large photo on actor pages
+    'profile': ImagePolicy(
+        ('w185', 'h632'), 'h632',
+        '{} 400px, (max-width: 768px) 60vw, 300px'.format(TV_MEDIA),
+        widths={'h632': 421}, loading='eager',
+    ),
+}
+
+
+def image_url(context, path, size=None):
+    """
+    Get the URL of an image at the default size of a context.
+
+    Args:
+        context (str): A key of CONTEXTS
+        path (str): The TMDB image path
+        size (str): Override the context's default size
+
+    Returns:
+        str: The URL or None if path is empty
+    """
+    return get_image_url(path, size or CONTEXTS[context].default)
+
+
+def srcset(context, path):
+    """
+    Build the srcset of an image in a context.
+
+    Args:
+        context (str): A key of CONTEXTS
+        path (str): The TMDB image path
+
+    Returns:
+        str: Comma separated "<url> <width>w" candidates, '' if path is empty
+    """
+    if not path:
+        return ''
+    policy = CONTEXTS[context]
+    candidates = []
+    for size in policy.ladder:
+        width = policy.width(size)
+        if width is not None:
+            candidates.append('{} {}w'.format(get_image_url(path, size), width))
+    return ', '.join(candidates)
+
+
+def image_attrs(context, path, eager=None):
+    """
+    Render the src, srcset, sizes and loading attributes of an <img>.
+
+    Args:
+        context (str): A key of CONTEXTS
+        path (str): The TMDB image path
+        eager (bool): Override the context's loading hint, e.g. for the first
+            item above the fold
+
+    Returns:
+        Markup: The attributes, empty if path is empty
+    """
+    if not path:
+        return Markup('')
+    policy = CONTEXTS[context]
+    loading = policy.loading if eager is None else ('eager' if eager else 'lazy')
+    attrs = [
+        ('src', image_url(context, path)),
+        ('srcset', srcset(context, path)),
+        ('sizes', policy.sizes),
+        ('loading', loading),
+        ('decoding', 'async'),
+    ]
+    if policy.fetchpriority and loading == 'eager':
+        attrs.append(('fetchpriority', policy.fetchpriority))
+    return Markup(' '.join('{}="{}"'.format(name, escape(value)) for name, value in attrs))
+
+
+def init_app(app):
+    """
+    Expose the policy to templates as image_attrs, image_url and image_srcset.
+
+    Args:
+        app (Flask): The application
+    """
+    app.add_template_global(image_attrs, 'image_attrs')
+    app.add_template_global(image_url, 'image_url')
+    app.add_template_global(srcset, 'image_srcset')
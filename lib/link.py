@@ -27,3 +27,13 @@ class Link(db.Model):
         self.last_call = datetime.now()
 
 
+class LinkClick(db.Model):
+    """Clicks on a short code, aggregated per flush of the click recorder"""
+
+    __tablename__ = 'link_click'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    code = db.Column(db.VARCHAR(100), index=True)
+    hits = db.Column(db.Integer, default=0)
+    first_call = db.Column(db.DateTime)
+    last_call = db.Column(db.DateTime)
@@ -0,0 +1,242 @@
+"""
+Bulk import and streaming export of short links.
+
+Imports read CSV (with a header row) or JSON Lines, generate a short_code for
+rows that do not carry one, and insert in batches with one executemany and
+one commit per batch. Codes given in the file are never rewritten: a row
+whose short_code or custom_code is already taken is skipped and counted as a
+conflict. Exports stream rows from a server-side cursor, so memory stays flat
+however many links there are.
+"""
+import csv
+import json
+import secrets
+import string
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from lib.database import db
+from lib.link import Link
+
+CODE_ALPHABET = string.ascii_letters + string.digits
+DEFAULT_CODE_LENGTH = 7
+DEFAULT_BATCH_SIZE = 1000
+
+FIELDS = ('url', 'short_code', 'custom_code', 'description', 'expire_after', 'is_disabled', 'last_call')
+
+
+def generate_code(length=DEFAULT_CODE_LENGTH):
+    """
+    Generate a random short code.
+
+    Args:
+        length (int): Number of characters
+
+    Returns:
+        str: The code
+    """
+    return ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def read_rows(stream, fmt):
+    """
+    Read link rows from a CSV or JSONL stream.
+
+    Args:
+        stream: A text stream
+        fmt (str): 'csv' or 'jsonl'
+
+    Yields:
+        dict: One row per link
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        raise ValueError("Unknown format: {}".format(fmt))
+
+
+def _existing_codes(conn, codes):
+    if not codes:
+        return set()
+    query = select(Link.short_code, Link.custom_code).where(
+        Link.short_code.in_(codes) | Link.custom_code.in_(codes)
+    )
+    found = set()
+    for short_code, custom_code in conn.execute(query):
+        found.update(code for code in (short_code, custom_code) if code)
+    return found
+
+
+def _insert_batch(conn, batch, code_length, seen, drawn):
+    # Rows whose own codes already exist are skipped: user-supplied codes are never rewritten
+    taken = _existing_codes(conn, [code for row in batch for code in _explicit_codes(row)])
+    rows = [row for row in batch if not taken.intersection(_explicit_codes(row))]
+    # Codes are generated only now, once the explicit codes of the batch are in seen,
+    # and drawn again while they collide with existing rows
+    generated = [row for row in rows if row['short_code'] is None]
+    taken = set()
+    while True:
+        for row in generated:
+            if row['short_code'] is None or row['short_code'] in taken:
+                drawn.discard(row['short_code'])
+                row['short_code'] = generate_code(code_length)
+                while row['short_code'] in seen or row['short_code'] in drawn:
+                    row['short_code'] = generate_code(code_length)
+                drawn.add(row['short_code'])
+        taken = _existing_codes(conn, [row['short_code'] for row in generated])
+        if not taken:
+            break
+    if rows:
+        conn.execute(Link.__table__.insert(), rows)
+    conn.commit()
+    return len(rows)
+
+
+def _redraw(conn, code, code_length, seen, drawn):
+    # A code generated for an earlier, already written row turned up in the file: move that row
+    new_code = generate_code(code_length)
+    while new_code in seen or new_code in drawn or _existing_codes(conn, [new_code]):
+        new_code = generate_code(code_length)
+    conn.execute(update(Link).where(Link.short_code == code).values(short_code=new_code))
+    conn.commit()
+    drawn.discard(code)
+    drawn.add(new_code)
+
+
+def _explicit_codes(row):
+    return [code for code in (row['short_code'], row['custom_code']) if code]
+
+
+def _parse_row(row, now):
+    url = row.get('url') or ''
+    if not isinstance(url, str):
+        raise ValueError("url must be a string")
+    custom_code = row.get('custom_code') or None
+    return {
+        'url': url.strip(),
+        'short_code': row.get('short_code') or None,
+        'custom_code': custom_code,
+        'description': row.get('description') or None,
+        'expire_after': _parse_datetime(row.get('expire_after')),
+        'is_custom': custom_code is not None,
+        'is_disabled': _parse_bool(row.get('is_disabled')),
+        'created_at': now,
+        'updated_at': now,
+        'last_call': _parse_datetime(row.get('last_call'))
+    }
+
+
+def import_links(stream, fmt, batch_size=DEFAULT_BATCH_SIZE, code_length=DEFAULT_CODE_LENGTH):
+    """
+    Insert links from a CSV or JSONL stream in batches.
+
+    Rows need at least a url. Rows without short_code get a generated one.
+    A row whose short_code or custom_code is already used, by an existing
+    link or an earlier row of the file, is skipped as a conflict (a code that
+    was only generated for an earlier row is drawn again instead). A row with
+    a malformed value, e.g. a date that is not ISO 8601, is skipped as
+    invalid. Each batch is committed on its own, so a failure part way keeps
+    the batches already written.
+
+    Args:
+        stream: A text stream
+        fmt (str): 'csv' or 'jsonl'
+        batch_size (int): Rows per INSERT
+        code_length (int): Length of generated codes
+
+    Returns:
+        tuple: (links imported, rows skipped without url, rows skipped for a
+            code conflict, rows skipped as invalid)
+    """
+    imported = skipped = invalid = with_url = 0
+    now = datetime.now()
+    # Codes given in the file, and codes generated so far
+    seen = set()
+    drawn = set()
+    batch = []
+    with db.engine.connect() as conn:
+        for row in read_rows(stream, fmt):
+            try:
+                row = _parse_row(row, now)
+            except (ValueError, TypeError):
+                invalid += 1
+                continue
+            if not row['url']:
+                skipped += 1
+                continue
+            with_url += 1
+            codes = _explicit_codes(row)
+            if any(code in seen for code in codes):
+                continue
+            seen.update(codes)
+            for code in codes:
+                if code in drawn:
+                    _redraw(conn, code, code_length, seen, drawn)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                imported += _insert_batch(conn, batch, code_length, seen, drawn)
+                batch = []
+        if batch:
+            imported += _insert_batch(conn, batch, code_length, seen, drawn)
+    return imported, skipped, with_url - imported, invalid
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_links(out, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write every link to a stream as CSV or JSONL.
+
+    Args:
+        out: A text stream
+        fmt (str): 'csv' or 'jsonl'
+        batch_size (int): Rows fetched per round trip
+
+    Returns:
+        int: Number of links written
+    """
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError("Unknown format: {}".format(fmt))
+    columns = [getattr(Link, field) for field in FIELDS]
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(FIELDS)
+
+    count = 0
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+            select(*columns).order_by(Link.id)
+        )
+        for row in result:
+            values = [_format_value(value) for value in row]
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                out.write(json.dumps(dict(zip(FIELDS, values))) + '\n')
+            count += 1
+    return count
@@ -0,0 +1,175 @@
+"""
+Rendered-output cache for full pages, AJAX fragments and their JSON envelopes.
+
+Anonymous visitors all see the same HTML for a given URL, so successful
+responses of the TMDB-backed routes are kept in a byte-bounded in-process LRU
+keyed by endpoint, host, path and the sorted query arguments. Each entry lives
+as long as the data cache policy of its route (TMDB_CACHE_TTLS), capped by
+RENDER_CACHE_MAX_TTL. Error pages are never stored.
+
+The cache is per process on purpose: a deploy starts with empty caches, so
+rendered output never outlives the templates it came from.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+
+from flask import current_app, g, make_response, request, template_rendered
+
+from lib.cache import LRUCache
+
+# Templates that signal a failed fetch even when the status is 200
+ERROR_TEMPLATES = ('error.html', '404.html', '500.html')
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Endpoint -> data cache policy name, filled by the cached() decorator
+policies = {}
+
+
+def get_cache():
+    """
+    Get the process-wide rendered-output cache, creating it on first use.
+
+    Returns:
+        LRUCache: The cache or None if disabled
+    """
+    global _cache
+    if not current_app.config.get('RENDER_CACHE_ENABLED', True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LRUCache(max_bytes=current_app.config.get('RENDER_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    return _cache
+
+
+def get_ttl(endpoint):
+    """
+    Get how long the rendered output of an endpoint may be reused.
+
+    Args:
+        endpoint (str): The route endpoint
+
+    Returns:
+        int: TTL in seconds
+    """
+    ttls = current_app.config.get('TMDB_CACHE_TTLS', {})
+    policy = policies.get(endpoint, 'default')
+    ttl = ttls.get(policy, ttls.get('default', 5 * 60))
+    return min(ttl, current_app.config.get('RENDER_CACHE_MAX_TTL', 15 * 60))
+
+
+def get_key(endpoint):
+    """
+    Build the cache key for the current request.
+
+    Args:
+        endpoint (str): The route endpoint
+
+    Returns:
+        str: The cache key
+    """
+    args = sorted(request.args.items(multi=True))
+    return 'render:{}:{}{}?{}'.format(
+        endpoint, request.host, request.path, '&'.join('{}={}'.format(k, v) for k, v in args)
+    )
+
+
+def lookup(endpoint):
+    """
+    Get the cached response for the current request.
+
+    Args:
+        endpoint (str): The route endpoint
+
+    Returns:
+        Response: A new response object or None on a miss
+    """
+    cache = get_cache()
+    if cache is None or request.method not in ('GET', 'HEAD'):
+        return None
+    value = cache.get(get_key(endpoint))
+    if value is None:
+        return None
+    header, body = value.split(b'\n', 1)
+    meta = json.loads(header)
+    response = current_app.response_class(body, status=meta['status'], mimetype=meta['mimetype'])
+    response.set_etag(meta['etag'])
+    response.last_modified = meta['rendered_at']
+    response.headers['X-Render-Cache'] = 'HIT'
+    return response
+
+
+def store(endpoint, response):
+    """
+    Store a response for the current request if it can be shared.
+
+    Args:
+        endpoint (str): The route endpoint
+        response (Response): The response returned by the view
+    """
+    cache = get_cache()
+    if cache is None or request.method != 'GET':
+        return
+    if response.status_code != 200 or response.direct_passthrough or g.get('render_cache_skip'):
+        return
+    body = response.get_data()
+    # Validators are kept with the entry so hits revalidate against the same version
+    if response.get_etag()[0] is None:
+        response.set_etag(hashlib.sha1(body).hexdigest()[:20])
+    if response.last_modified is None:
+        response.last_modified = int(time.time())
+    meta = {
+        'status': response.status_code,
+        'mimetype': response.mimetype,
+        'etag': response.get_etag()[0],
+        'rendered_at': int(response.last_modified.timestamp())
+    }
+    header = json.dumps(meta).encode('utf-8')
+    cache.set(get_key(endpoint), header + b'\n' + body, get_ttl(endpoint))
+    response.headers['X-Render-Cache'] = 'MISS'
+
+
+def cached(policy):
+    """
+    Decorator caching the rendered output of a Flask view.
+
+    Args:
+        policy (str): The data cache policy the route depends on (see TMDB_CACHE_TTLS)
+    """
+    def decorator(view):
+        policies[view.__name__] = policy
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            endpoint = request.endpoint
+            response = lookup(endpoint)
+            if response is not None:
+                return response
+            response = make_response(view(*args, **kwargs))
+            store(endpoint, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    """
+    Get rendered-output cache counters.
+
+    Returns:
+        dict: Counters of the LRU tier, or None if the cache was never used
+    """
+    return _cache.stats() if _cache is not None else None
+
+
+def _on_template_rendered(sender, template, context, **extra):
+    if template.name in ERROR_TEMPLATES:
+        g.render_cache_skip = True
+
+
+template_rendered.connect(_on_template_rendered)
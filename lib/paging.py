@@ -0,0 +1,222 @@
+"""
+Maps our 24-item logical listing pages onto TMDB's 20-item upstream pages.
+
+A logical page spans at most two upstream pages. Processed upstream pages are
+stored under a scroll "snapshot" id handed to the browser with the first page,
+so each upstream page is fetched at most once per scroll session and items
+cannot shift between logical pages while the user scrolls. Snapshot pages have
+their own bounded store (see get_store) rather than sharing the TMDB response
+cache's budget.
+"""
+import json
+import math
+import re
+import threading
+import time
+
+from flask import current_app
+
+from lib.cache import LRUCache, SQLiteCache, TieredCache
+
+LOGICAL_PAGE_SIZE = 24
+UPSTREAM_PAGE_SIZE = 20
+
+# TMDB refuses to serve list pages beyond this
+UPSTREAM_MAX_PAGES = 500
+
+DEFAULT_SNAPSHOT_TTL = 30 * 60
+
+_snapshot_pattern = re.compile(r'^[0-9a-f]{1,12}$')
+
+_store_cache = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Get the process-wide snapshot page store, creating it on first use.
+
+    Returns:
+        TieredCache: An LRU bounded by PAGING_SNAPSHOT_MAX_BYTES, in front of
+            the SQLite file at PAGING_SNAPSHOT_SHARED_PATH if set
+    """
+    global _store_cache
+    if _store_cache is None:
+        with _store_lock:
+            if _store_cache is None:
+                config = current_app.config
+                local = LRUCache(max_bytes=config.get('PAGING_SNAPSHOT_MAX_BYTES', 16 * 1024 * 1024))
+                shared = None
+                shared_path = config.get('PAGING_SNAPSHOT_SHARED_PATH')
+                if shared_path:
+                    shared = SQLiteCache(shared_path, max_entries=config.get('PAGING_SNAPSHOT_MAX_ENTRIES', 20000))
+                _store_cache = TieredCache(local, shared)
+    return _store_cache
+
+
+def new_snapshot():
+    """
+    Create a new scroll snapshot id.
+
+    Returns:
+        str: The snapshot id
+    """
+    return '{:x}'.format(int(time.time() * 1000))
+
+
+def is_valid_snapshot(snapshot, ttl=DEFAULT_SNAPSHOT_TTL):
+    """
+    Check a snapshot id sent back by the browser.
+
+    Args:
+        snapshot (str): The snapshot id
+        ttl (int): How long snapshots stay valid in seconds
+
+    Returns:
+        bool: True if the id is well formed and not older than ttl
+    """
+    if not snapshot or not _snapshot_pattern.match(snapshot):
+        return False
+    age = time.time() - int(snapshot, 16) / 1000.0
+    return 0 <= age < ttl
+
+
+def get_upstream_range(page, page_size=LOGICAL_PAGE_SIZE, upstream_size=UPSTREAM_PAGE_SIZE):
+    """
+    Get the upstream pages that hold a logical page.
+
+    Args:
+        page (int): The logical page number (1-based)
+        page_size (int): Items per logical page
+        upstream_size (int): Items per upstream page
+
+    Returns:
+        tuple: (first upstream page, last upstream page, offset into the first page)
+    """
+    start = (max(page, 1) - 1) * page_size
+    first = start // upstream_size + 1
+    last = (start + page_size - 1) // upstream_size + 1
+    return first, last, start - (first - 1) * upstream_size
+
+
+def assemble_page(page, upstream_pages, offset, snapshot, page_size=LOGICAL_PAGE_SIZE, upstream_size=UPSTREAM_PAGE_SIZE):
+    """
+    Build a logical page from consecutive upstream pages.
+
+    Args:
+        page (int): The logical page number
+        upstream_pages (list): Upstream responses, in order
+        offset (int): Offset of the first item in the first upstream page
+        snapshot (str): The scroll snapshot id
+        page_size (int): Items per logical page
+        upstream_size (int): Items per upstream page
+
+    Returns:
+        dict: A TMDB-style listing with logical page, total_pages and snapshot
+    """
+    first = upstream_pages[0] if upstream_pages else {}
+    total_results = first.get('total_results', 0)
+    upstream_total = min(first.get('total_pages', 0), UPSTREAM_MAX_PAGES)
+    available = min(total_results, upstream_total * upstream_size)
+
+    results = []
+    seen = set()
+    for data in upstream_pages:
+        for item in data.get('results', []):
+            # TMDB occasionally repeats an item on adjacent pages
+            if item.get('id') in seen:
+                continue
+            seen.add(item.get('id'))
+            results.append(item)
+
+    return {
+        'results': results[offset:offset + page_size],
+        'page': page,
+        'total_pages': int(math.ceil(available / float(page_size))),
+        'total_results': total_results,
+        'snapshot': snapshot
+    }
+
+
+def _key(feed, snapshot, upstream_page):
+    return 'page:{}:{}:{}'.format(feed, snapshot, upstream_page)
+
+
+def _load(cache, feed, snapshot, upstream_page):
+    if cache is None:
+        return None
+    content = cache.get(_key(feed, snapshot, upstream_page))
+    return json.loads(content) if content is not None else None
+
+
+def _store(cache, feed, snapshot, upstream_page, data, ttl):
+    # Empty pages are usually upstream errors, so never pin them to a session
+    if cache is not None and data.get('results'):
+        cache.set(_key(feed, snapshot, upstream_page), json.dumps(data).encode('utf-8'), ttl)
+
+
+def _paginate(feed, page, snapshot, cache, ttl):
+    # Yields the upstream pages to fetch, is sent their data, and returns the logical page
+    if not is_valid_snapshot(snapshot, ttl):
+        snapshot = new_snapshot()
+    first, last, offset = get_upstream_range(page)
+
+    upstream_pages = []
+    for upstream_page in range(first, last + 1):
+        data = _load(cache, feed, snapshot, upstream_page)
+        if data is None:
+            if upstream_pages and upstream_page > upstream_pages[0].get('total_pages', 0):
+                break
+            data = yield upstream_page
+            _store(cache, feed, snapshot, upstream_page, data, ttl)
+        upstream_pages.append(data)
+
+    return assemble_page(page, upstream_pages, offset, snapshot)
+
+
+def paginate(feed, fetch, page, snapshot=None, cache=None, ttl=DEFAULT_SNAPSHOT_TTL):
+    """
+    Get a logical listing page, reusing upstream pages from the scroll snapshot.
+
+    Args:
+        feed (str): Identifies the listing, e.g. 'popular_movies' or 'trending_tv_shows:day'
+        fetch (callable): Fetches one upstream page, e.g. tmdb_api.get_popular_movies
+        page (int): The logical page number
+        snapshot (str): Snapshot id sent back by the browser, if any
+        cache: Store for snapshot pages (see get_store)
+        ttl (int): How long snapshots stay valid in seconds
+
+    Returns:
+        dict: The logical page (see assemble_page)
+    """
+    steps = _paginate(feed, page, snapshot, cache, ttl)
+    try:
+        upstream_page = next(steps)
+        while True:
+            upstream_page = steps.send(fetch(upstream_page))
+    except StopIteration as done:
+        return done.value
+
+
+async def paginate_async(feed, fetch, page, snapshot=None, cache=None, ttl=DEFAULT_SNAPSHOT_TTL):
+    """
+    Async version of paginate; fetch must be a coroutine function.
+
+    Args:
+        feed (str): Identifies the listing
+        fetch (callable): Coroutine function fetching one upstream page
+        page (int): The logical page number
+        snapshot (str): Snapshot id sent back by the browser, if any
+        cache: Store for snapshot pages (see get_store)
+        ttl (int): How long snapshots stay valid in seconds
+
+    Returns:
+        dict: The logical page (see assemble_page)
+    """
+    steps = _paginate(feed, page, snapshot, cache, ttl)
+    try:
+        upstream_page = next(steps)
+        while True:
+            upstream_page = steps.send(await fetch(upstream_page))
+    except StopIteration as done:
+        return done.value
@@ -0,0 +1,68 @@
+"""
+Concurrent fan-out for routes that make several independent upstream calls.
+
+Calls run on a bounded, process-wide thread pool with the Flask application
+context pushed, so page latency becomes the slowest call instead of the sum.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from lib import ratelimit
+
+DEFAULT_MAX_WORKERS = 16
+
+_lock = threading.Lock()
+_executors = {}
+
+
+def get_executor(max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Get the fan-out thread pool for the current process.
+
+    Args:
+        max_workers (int): Maximum number of concurrent calls
+
+    Returns:
+        ThreadPoolExecutor: The shared executor
+    """
+    pid = os.getpid()
+    executor = _executors.get(pid)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(pid)
+            if executor is None:
+                # Threads do not survive a fork, so never reuse the parent's pool
+                _executors.clear()
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fanout')
+                _executors[pid] = executor
+    return executor
+
+
+def fetch_parallel(*calls):
+    """
+    Run several calls concurrently and return their results in order.
+
+    Each call is a tuple of a function followed by its positional arguments,
+    e.g. ``fetch_parallel((tmdb_api.get_popular_movies, 1), (tmdb_api.get_movie_genres,))``.
+    Exceptions raised by a call are re-raised in the caller.
+
+    Args:
+        *calls (tuple): (function, *args) tuples
+
+    Returns:
+        list: The results of the calls, in the order given
+    """
+    app = current_app._get_current_object()
+    executor = get_executor(app.config.get('TMDB_FANOUT_WORKERS', DEFAULT_MAX_WORKERS))
+    # Pool threads do not inherit the caller's context, so carry its TMDB priority
+    level = ratelimit.get_priority()
+
+    def run(fn, args):
+        with app.app_context(), ratelimit.priority(level):
+            return fn(*args)
+
+    futures = [executor.submit(run, call[0], call[1:]) for call in calls]
+    return [future.result() for future in futures]
@@ -0,0 +1,70 @@
+"""
+Pre-rendered pop-under scripts.
+
+Each variant in POP_SCRIPTS renders pop_templatex.js with constant parameters,
+so it is rendered once per process and kept in memory together with a content
+hash. The hash is the ETag: responses are cacheable for POP_SCRIPT_MAX_AGE and
+revalidate with 304.
+"""
+import hashlib
+import threading
+
+from flask import current_app, render_template, request
+
+TEMPLATE = 'pop_templatex.js'
+
+_scripts = {}
+_lock = threading.Lock()
+
+
+class PopScript:
+    """A rendered script variant."""
+
+    def __init__(self, body):
+        self.body = body.encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()[:16]
+
+
+def get(name):
+    """
+    Get a rendered script variant, rendering it on first use.
+
+    Args:
+        name (str): The variant name (a key of POP_SCRIPTS)
+
+    Returns:
+        PopScript: The script
+    """
+    script = _scripts.get(name)
+    if script is None:
+        with _lock:
+            script = _scripts.get(name)
+            if script is None:
+                params = current_app.config['POP_SCRIPTS'][name]
+                script = PopScript(render_template(TEMPLATE, **params))
+                _scripts[name] = script
+    return script
+
+
+def clear():
+    """Forget the rendered variants, e.g. after POP_SCRIPTS changed."""
+    with _lock:
+        _scripts.clear()
+
+
+def make_response(name):
+    """
+    Serve a script variant with its ETag and caching headers.
+
+    Args:
+        name (str): The variant name
+
+    Returns:
+        Response: The script, or a 304 if the client copy is current
+    """
+    script = get(name)
+    response = current_app.response_class(script.body, mimetype='application/javascript')
+    response.set_etag(script.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('POP_SCRIPT_MAX_AGE', 60 * 60)
+    return response.make_conditional(request)
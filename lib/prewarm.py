@@ -0,0 +1,197 @@
+"""
+Background pre-warmer for the home, listing and genre feeds.
+
+A daemon thread periodically re-fetches the feeds behind /, /tv, the listing
+pages and every genre page through the regular tmdb_api functions, so their
+cache entries are replaced before they expire and no visitor hits a cold
+cache.
+
+With the shared cache tier (TMDB_CACHE_SHARED_PATH) a round's results are
+visible to every worker, so only one process per host warms at a time
+(guarded by PREWARM_LOCK_PATH). Without it each worker only has its own
+in-process cache, so every worker warms for itself and the lock is not used.
+"""
+import os
+import random
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+import tmdb_api
+from lib import ratelimit
+from lib.genres import catalog as genre_catalog
+
+_lock = threading.Lock()
+_started = {}
+
+
+def get_jobs(pages=2):
+    """
+    Build the list of feeds to warm.
+
+    Args:
+        pages (int): Number of upstream pages to warm for each listing
+
+    Returns:
+        list: (function, *args) tuples
+    """
+    jobs = [
+        (genre_catalog.refresh,),
+        (tmdb_api.get_trending_movies, 'week'),
+        (tmdb_api.get_trending_tv_shows, 'week'),
+    ]
+    # A 24-item logical page spans the first two upstream pages
+    for page in range(1, pages + 1):
+        jobs.extend([
+            (tmdb_api.get_popular_movies, page),
+            (tmdb_api.get_top_rated_movies, page),
+            (tmdb_api.get_recently_released_movies, page),
+            (tmdb_api.get_trending_movies, 'day', page),
+            (tmdb_api.get_popular_tv_shows, page),
+            (tmdb_api.get_top_rated_tv_shows, page),
+            (tmdb_api.get_recently_released_tv_shows, page),
+            (tmdb_api.get_trending_tv_shows, 'day', page),
+        ])
+        if page > 1:
+            jobs.extend([
+                (tmdb_api.get_trending_movies, 'week', page),
+                (tmdb_api.get_trending_tv_shows, 'week', page),
+            ])
+    return jobs
+
+
+def get_genre_jobs():
+    """
+    Build the list of genre feeds to warm from the genre catalog.
+
+    Returns:
+        list: (function, *args) tuples
+    """
+    jobs = [(tmdb_api.get_movies_by_genre, genre['id'], 1) for genre in genre_catalog.get_genres('movie')]
+    jobs.extend((tmdb_api.get_tv_shows_by_genre, genre['id'], 1) for genre in genre_catalog.get_genres('tv'))
+    return jobs
+
+
+class Prewarmer(threading.Thread):
+    """Daemon thread refreshing the configured feeds on a schedule."""
+
+    def __init__(self, app):
+        """
+        Args:
+            app (Flask): The application whose config and context are used
+        """
+        super().__init__(name='prewarmer', daemon=True)
+        self.app = app
+        self.interval = app.config.get('PREWARM_INTERVAL', 5 * 60)
+        self.jitter = app.config.get('PREWARM_JITTER', 30)
+        self.rate = app.config.get('PREWARM_RATE', 4)
+        self.pages = app.config.get('PREWARM_PAGES', 2)
+        # The host-wide lock only makes sense when workers share cached results
+        self.lock_path = app.config.get('PREWARM_LOCK_PATH') if app.config.get('TMDB_CACHE_SHARED_PATH') else None
+        self._stop_event = threading.Event()
+        self.last_run = None
+        self.last_duration = None
+        self.last_errors = 0
+
+    def stop(self):
+        """Ask the thread to stop after the current job."""
+        self._stop_event.set()
+
+    def _acquire_lock(self):
+        if not self.lock_path or fcntl is None:
+            return True, None
+        handle = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False, None
+        return True, handle
+
+    def run_once(self):
+        """
+        Refresh every feed once, spacing calls to stay within PREWARM_RATE.
+
+        Returns:
+            int: Number of jobs that raised an error
+        """
+        acquired, handle = self._acquire_lock()
+        if not acquired:
+            # Another worker on this host is warming the shared cache
+            return 0
+
+        errors = 0
+        started = time.time()
+        delay = 1.0 / self.rate if self.rate else 0
+        try:
+            with self.app.app_context(), tmdb_api.force_refresh(), ratelimit.priority(ratelimit.BACKGROUND):
+                jobs = get_jobs(self.pages)
+                for index, job in enumerate(jobs):
+                    if self._stop_event.is_set():
+                        break
+                    try:
+                        job[0](*job[1:])
+                    except Exception as e:
+                        errors += 1
+                        self.app.logger.error("Prewarm of {} failed: {}".format(job[0].__name__, str(e)))
+                    # Genre feeds are discovered once the genre lists are fresh
+                    if index == 0:
+                        jobs.extend(get_genre_jobs())
+                    self._stop_event.wait(delay)
+        finally:
+            if handle is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+                handle.close()
+
+        self.last_run = started
+        self.last_duration = time.time() - started
+        self.last_errors = errors
+        return errors
+
+    def run(self):
+        # Spread the first round so workers started together do not align
+        self._stop_event.wait(random.uniform(0, self.jitter))
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval + random.uniform(-self.jitter, self.jitter))
+
+
+def start(app):
+    """
+    Start the pre-warmer for this process if enabled and not already running.
+
+    Safe to call on every request: the thread is started once per process
+    (threads do not survive a fork, so each worker checks its own pid).
+
+    Args:
+        app (Flask): The application
+
+    Returns:
+        Prewarmer: The running pre-warmer or None if disabled
+    """
+    if not app.config.get('PREWARM_ENABLED'):
+        return None
+    pid = os.getpid()
+    prewarmer = _started.get(pid)
+    if prewarmer is None:
+        with _lock:
+            prewarmer = _started.get(pid)
+            if prewarmer is None:
+                prewarmer = Prewarmer(app)
+                prewarmer.start()
+                _started[pid] = prewarmer
+    return prewarmer
+
+
+def get_running():
+    """
+    Get this process's pre-warmer without starting one.
+
+    Returns:
+        Prewarmer: The running pre-warmer or None if it has not been started
+    """
+    return _started.get(os.getpid())
@@ -0,0 +1,257 @@
+"""
+Client-side token bucket for TMDB API calls, with priority classes.
+
+Every upstream attempt takes a token from a bucket refilled at
+TMDB_RATE_LIMIT tokens per second and holding at most TMDB_RATE_BURST. With
+TMDB_RATE_LIMIT_PATH set, the bucket lives in a small file guarded by flock,
+so all workers on the host share one budget for the API key. Otherwise each
+process has its own.
+
+Priorities keep interactive page loads ahead of background work:
+
+- INTERACTIVE (requests) may use the whole bucket.
+- PREFETCH (stale-while-revalidate refreshes) only takes a token while more
+  than PRIORITY_RESERVE[PREFETCH] of the burst is left.
+- BACKGROUND (prewarming, sitemap builds) needs an even larger reserve.
+
+Callers below their threshold wait for the bucket to refill, up to the
+class's maximum wait (TMDB_RATE_MAX_WAIT). After that the call is shed with
+RateLimitedError, a requests exception that callers already handle.
+"""
+import asyncio
+import contextvars
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INTERACTIVE = 'interactive'
+PREFETCH = 'prefetch'
+BACKGROUND = 'background'
+
+# Fraction of the burst that must remain after a call of this class
+PRIORITY_RESERVE = {INTERACTIVE: 0.0, PREFETCH: 0.25, BACKGROUND: 0.5}
+DEFAULT_MAX_WAIT = {INTERACTIVE: 2.0, PREFETCH: 5.0, BACKGROUND: 30.0}
+
+_STATE = struct.Struct('dd')  # tokens, last refill time
+
+_priority = contextvars.ContextVar('tmdb_priority', default=INTERACTIVE)
+
+
+class RateLimitedError(requests.exceptions.RequestException):
+    """Raised when a call waited too long for a token and was shed."""
+
+
+@contextmanager
+def priority(level):
+    """
+    Context manager setting the priority of TMDB calls made inside it.
+
+    Args:
+        level (str): INTERACTIVE, PREFETCH or BACKGROUND
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def get_priority():
+    """
+    Get the priority of TMDB calls in the current context.
+
+    Returns:
+        str: The priority class
+    """
+    return _priority.get()
+
+
+class TokenBucket:
+    """Token bucket kept in memory or in a file shared by processes."""
+
+    def __init__(self, rate, burst, path=None):
+        """
+        Args:
+            rate (float): Tokens added per second
+            burst (float): Bucket size
+            path (str): File holding the shared state, or None for per-process
+        """
+        self.rate = rate
+        self.burst = burst
+        self.path = path if fcntl is not None else None
+        self._lock = threading.Lock()
+        self._fd = None
+        self._fd_pid = None
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self.acquired = {level: 0 for level in PRIORITY_RESERVE}
+        self.shed = {level: 0 for level in PRIORITY_RESERVE}
+        self.waited = {level: 0.0 for level in PRIORITY_RESERVE}
+
+    def _file(self):
+        # A descriptor inherited over fork would share its flock with the parent
+        if self._fd is None or self._fd_pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._fd_pid = os.getpid()
+        return self._fd
+
+    def _take(self, needed, now):
+        # Refill, then take one token if at least `needed` are available
+        tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if tokens >= needed:
+            self._tokens = tokens - 1
+            return 0.0
+        self._tokens = tokens
+        return (needed - tokens) / self.rate
+
+    def try_acquire(self, level=INTERACTIVE):
+        """
+        Take a token if the priority class may have one now.
+
+        Args:
+            level (str): The priority class
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one may be
+        """
+        needed = 1 + self.burst * PRIORITY_RESERVE[level]
+        now = time.time()
+        with self._lock:
+            if self.path is None:
+                return self._take(needed, now)
+            fd = self._file()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(fd, _STATE.size, 0)
+                if len(data) == _STATE.size:
+                    self._tokens, self._updated = _STATE.unpack(data)
+                else:
+                    self._tokens, self._updated = float(self.burst), now
+                wait = self._take(needed, now)
+                os.pwrite(fd, _STATE.pack(self._tokens, self._updated), 0)
+                return wait
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def acquire(self, level=INTERACTIVE, max_wait=None):
+        """
+        Take a token, waiting for the bucket to refill if needed.
+
+        Args:
+            level (str): The priority class
+            max_wait (float): Give up after waiting this long
+
+        Raises:
+            RateLimitedError: No token became available within max_wait
+        """
+        max_wait = DEFAULT_MAX_WAIT[level] if max_wait is None else max_wait
+        deadline = time.time() + max_wait
+        started = time.time()
+        while True:
+            wait = self.try_acquire(level)
+            if wait == 0:
+                self.acquired[level] += 1
+                self.waited[level] += time.time() - started
+                return
+            if time.time() + wait > deadline:
+                self.shed[level] += 1
+                raise RateLimitedError("TMDB rate limit: {} call shed".format(level))
+            time.sleep(wait)
+
+    async def acquire_async(self, level=INTERACTIVE, max_wait=None):
+        """Like acquire, but waits without blocking the event loop."""
+        max_wait = DEFAULT_MAX_WAIT[level] if max_wait is None else max_wait
+        deadline = time.time() + max_wait
+        started = time.time()
+        while True:
+            if self.path is None:
+                wait = self.try_acquire(level)
+            else:
+                # flock may block on another process, so keep it off the event loop
+                wait = await asyncio.to_thread(self.try_acquire, level)
+            if wait == 0:
+                self.acquired[level] += 1
+                self.waited[level] += time.time() - started
+                return
+            if time.time() + wait > deadline:
+                self.shed[level] += 1
+                raise RateLimitedError("TMDB rate limit: {} call shed".format(level))
+            await asyncio.sleep(wait)
+
+    def stats(self):
+        """
+        Get limiter counters for this process.
+
+        Returns:
+            dict: Rate, burst, shared flag and per-class counters
+        """
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'shared': self.path is not None,
+            'acquired': dict(self.acquired),
+            'shed': dict(self.shed),
+            'waited': {level: round(seconds, 3) for level, seconds in self.waited.items()},
+        }
+
+
+_lock = threading.Lock()
+_bucket = None
+
+
+def get_bucket(config):
+    """
+    Get the process-wide token bucket.
+
+    Args:
+        config (dict): The Flask config
+
+    Returns:
+        TokenBucket: The bucket or None if rate limiting is disabled
+    """
+    global _bucket
+    if not config.get('TMDB_RATE_LIMIT'):
+        return None
+    if _bucket is None:
+        with _lock:
+            if _bucket is None:
+                _bucket = TokenBucket(
+                    config['TMDB_RATE_LIMIT'],
+                    config.get('TMDB_RATE_BURST') or config['TMDB_RATE_LIMIT'],
+                    config.get('TMDB_RATE_LIMIT_PATH')
+                )
+    return _bucket
+
+
+def get_max_wait(config, level):
+    """
+    Get how long a call of a priority class may wait for a token.
+
+    Args:
+        config (dict): The Flask config
+        level (str): The priority class
+
+    Returns:
+        float: Seconds
+    """
+    return config.get('TMDB_RATE_MAX_WAIT', {}).get(level, DEFAULT_MAX_WAIT[level])
+
+
+def stats():
+    """
+    Get limiter counters for this process.
+
+    Returns:
+        dict: The counters, or None if rate limiting is disabled or unused
+    """
+    return _bucket.stats() if _bucket is not None else None
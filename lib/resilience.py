@@ -0,0 +1,358 @@
+"""
+Timeouts, retries and circuit breakers for upstream TMDB calls.
+
+GET requests that fail with a connection error, a timeout, 429 or a 5xx are
+retried up to TMDB_RETRIES times with full-jitter exponential backoff, or
+after the delay the upstream asked for in Retry-After.
+
+Each endpoint (the path with ids replaced, e.g. /movie/{id}) has a circuit
+breaker. After TMDB_BREAKER_THRESHOLD consecutive failed calls it opens and
+calls fail fast with CircuitOpenError, so workers stop waiting on an upstream
+that is down while cached responses keep being served. After
+TMDB_BREAKER_RESET_TIMEOUT seconds one probe call is let through (half-open):
+success closes the breaker, failure opens it again.
+"""
+import email.utils
+import random
+import re
+import threading
+import time
+
+import requests
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.25
+DEFAULT_BACKOFF_MAX = 4
+DEFAULT_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one endpoint."""
+
+    def __init__(self, name, threshold=DEFAULT_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        """
+        Args:
+            name (str): The endpoint the breaker guards
+            threshold (int): Consecutive failures that open the breaker
+            reset_timeout (float): Seconds to stay open before a probe call
+        """
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check whether a call may go upstream.
+
+        Returns:
+            bool: False while the breaker is open (or a probe is in flight)
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Give up an allowed call without a result (e.g. it was rate limited)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def is_open(self):
+        """
+        Check whether calls are currently being rejected.
+
+        Returns:
+            bool: True while open and not yet due for a probe
+        """
+        with self._lock:
+            return self.state == OPEN and time.time() - self.opened_at < self.reset_timeout
+
+    def retry_after(self):
+        """
+        Get the seconds until the next probe call.
+
+        Returns:
+            int: Seconds, 0 if the breaker is not open
+        """
+        with self._lock:
+            if self.state != OPEN:
+                return 0
+            return max(0, int(self.opened_at + self.reset_timeout - time.time()) + 1)
+
+    def stats(self):
+        """
+        Get the breaker state.
+
+        Returns:
+            dict: State, consecutive failures, rejected calls and trips
+        """
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'trips': self.trips,
+                'opened_at': self.opened_at,
+            }
+
+
+class RetryPolicy:
+    """Timeouts and retry settings, read from the config once per call."""
+
+    def __init__(self, config):
+        """
+        Args:
+            config (dict): The Flask config
+        """
+        self.timeout = (
+            config.get('TMDB_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            config.get('TMDB_READ_TIMEOUT', DEFAULT_READ_TIMEOUT)
+        )
+        self.retries = config.get('TMDB_RETRIES', DEFAULT_RETRIES)
+        self.backoff = config.get('TMDB_RETRY_BACKOFF', DEFAULT_BACKOFF)
+        self.backoff_max = config.get('TMDB_RETRY_BACKOFF_MAX', DEFAULT_BACKOFF_MAX)
+
+    def delay(self, attempt, response=None):
+        """
+        Get the wait before a retry.
+
+        Args:
+            attempt (int): Number of attempts made so far (1 after the first)
+            response: The failed response, if any
+
+        Returns:
+            float: Seconds to wait, or None if Retry-After asks for longer
+                than the backoff limit (the call should fail instead)
+        """
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.backoff_max else None
+        # Full jitter: uniformly random up to the exponential bound
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+
+class Attempts:
+    """
+    Retry and breaker bookkeeping of one upstream call.
+
+    Used by get and by the async client, which only differ in how they wait.
+    """
+
+    def __init__(self, breaker, policy):
+        """
+        Args:
+            breaker (CircuitBreaker): The endpoint's breaker
+            policy (RetryPolicy): Timeouts and retry settings
+
+        Raises:
+            CircuitOpenError: The breaker is open
+        """
+        if not breaker.allow():
+            raise CircuitOpenError("Circuit open for {}".format(breaker.name))
+        self.breaker = breaker
+        self.policy = policy
+        self.count = 0
+
+    def abandon(self):
+        """Give the call up before an attempt, e.g. when no rate limiter token came."""
+        self.breaker.release()
+
+    def record(self, response):
+        """
+        Record the outcome of an attempt.
+
+        Responses that are not retryable (2xx, 3xx and 4xx other than 429)
+        count as upstream successes.
+
+        Args:
+            response: The response, or None if the attempt raised
+
+        Returns:
+            float: Seconds to wait before the next attempt, or None if the
+                call is over (return the response or raise the error)
+        """
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            self.breaker.record_success()
+            return None
+        self.count += 1
+        delay = self.policy.delay(self.count, response) if self.count <= self.policy.retries else None
+        if delay is None:
+            self.breaker.record_failure()
+        return delay
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (seconds or an HTTP date).
+
+    Args:
+        value (str): The header value
+
+    Returns:
+        float: Seconds to wait or None if missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def endpoint_name(endpoint):
+    """
+    Group an API path by endpoint, e.g. '/movie/550' -> '/movie/{id}'.
+
+    Args:
+        endpoint (str): The API path
+
+    Returns:
+        str: The endpoint name
+    """
+    return _ID_SEGMENT.sub('/{id}', endpoint)
+
+
+_lock = threading.Lock()
+_breakers = {}
+
+
+def get_breaker(endpoint, config):
+    """
+    Get the circuit breaker of an endpoint.
+
+    Args:
+        endpoint (str): The API path
+        config (dict): The Flask config
+
+    Returns:
+        CircuitBreaker: The breaker shared by all calls to the endpoint
+    """
+    name = endpoint_name(endpoint)
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    threshold=config.get('TMDB_BREAKER_THRESHOLD', DEFAULT_THRESHOLD),
+                    reset_timeout=config.get('TMDB_BREAKER_RESET_TIMEOUT', DEFAULT_RESET_TIMEOUT)
+                )
+                _breakers[name] = breaker
+    return breaker
+
+
+def open_breakers():
+    """
+    Get the breakers that are currently rejecting calls.
+
+    Returns:
+        list: The open CircuitBreaker objects
+    """
+    return [breaker for breaker in list(_breakers.values()) if breaker.is_open()]
+
+
+def stats():
+    """
+    Get the state of every circuit breaker.
+
+    Returns:
+        dict: Breaker stats keyed by endpoint name
+    """
+    return {name: breaker.stats() for name, breaker in sorted(_breakers.items())}
+
+
+def get(session, url, breaker, policy, acquire=None):
+    """
+    GET a URL with timeouts, retries and the endpoint's circuit breaker.
+
+    Responses that are not retryable (2xx, 3xx and 4xx other than 429) are
+    returned at once and count as upstream successes. When retries are used
+    up, the last retryable response is returned, or the last exception raised.
+
+    Args:
+        session (requests.Session): The pooled session
+        url (str): The URL
+        breaker (CircuitBreaker): The endpoint's breaker
+        policy (RetryPolicy): Timeouts and retry settings
+        acquire (callable): Called before every attempt, e.g. to take a
+            rate limiter token; may raise to abandon the call
+
+    Returns:
+        requests.Response: The response
+
+    Raises:
+        CircuitOpenError: The breaker is open
+        requests.exceptions.RequestException: The last attempt failed
+    """
+    attempts = Attempts(breaker, policy)
+    while True:
+        response = error = None
+        if acquire is not None:
+            try:
+                acquire()
+            except Exception:
+                attempts.abandon()
+                raise
+        try:
+            response = session.get(url, timeout=policy.timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        delay = attempts.record(response)
+        if delay is None:
+            if response is not None:
+                return response
+            raise error
+        if response is not None:
+            response.close()
+        time.sleep(delay)
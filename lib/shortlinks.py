@@ -0,0 +1,330 @@
+"""
+Short-code resolver for the /<zap_code> redirect route.
+
+Resolved codes are kept in a bounded, thread-safe LRU with per-entry TTLs.
+Unknown, disabled and expired codes are cached too (negative entries, in a
+separate and smaller LRU), because the catch-all route also receives every
+stray path, favicon probe and crawler guess. Concurrent misses for the same
+code share one database lookup.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, or_, select
+
+from lib.cache import SingleFlight
+from lib.database import db
+from lib.link import Link
+
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_TTL = 60 * 60
+DEFAULT_NEGATIVE_MAX_ENTRIES = 20000
+DEFAULT_NEGATIVE_TTL = 5 * 60
+
+LOOKUP_LINK = (
+    select(Link.url, Link.is_disabled, Link.expire_after)
+    .where(or_(Link.short_code == bindparam('code'), Link.custom_code == bindparam('code')))
+    .limit(1)
+)
+
+
+class ShortLinkCache:
+    """Thread-safe LRU of code -> URL with separate bounds for negative entries."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_negative=DEFAULT_NEGATIVE_MAX_ENTRIES):
+        """
+        Args:
+            max_entries (int): Upper bound for resolved codes
+            max_negative (int): Upper bound for unknown codes
+        """
+        self.max_entries = max_entries
+        self.max_negative = max_negative
+        self._links = OrderedDict()
+        self._missing = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _lookup(data, code, now):
+        item = data.get(code)
+        if item is None:
+            return None
+        if item[1] <= now:
+            del data[code]
+            return None
+        data.move_to_end(code)
+        return item
+
+    def get(self, code):
+        """
+        Look up a code.
+
+        Args:
+            code (str): The short code
+
+        Returns:
+            tuple: (True, url) for a resolved code, (True, None) for a known
+            miss, or (False, None) if the code is not cached
+        """
+        now = time.time()
+        with self._lock:
+            item = self._lookup(self._links, code, now)
+            if item is not None:
+                self.hits += 1
+                return True, item[0]
+            if self._lookup(self._missing, code, now) is not None:
+                self.negative_hits += 1
+                return True, None
+            self.misses += 1
+            return False, None
+
+    @staticmethod
+    def _store(data, code, value, ttl, max_entries):
+        data.pop(code, None)
+        data[code] = (value, time.time() + ttl)
+        evicted = 0
+        while len(data) > max_entries:
+            data.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def set(self, code, url, ttl):
+        """
+        Cache a resolved code.
+
+        Args:
+            code (str): The short code
+            url (str): The target URL
+            ttl (float): Time to live in seconds
+        """
+        with self._lock:
+            self._missing.pop(code, None)
+            self.evictions += self._store(self._links, code, url, ttl, self.max_entries)
+
+    def set_missing(self, code, ttl):
+        """
+        Cache a code that does not resolve.
+
+        Args:
+            code (str): The short code
+            ttl (float): Time to live in seconds
+        """
+        with self._lock:
+            self._links.pop(code, None)
+            self.evictions += self._store(self._missing, code, None, ttl, self.max_negative)
+
+    def delete(self, code):
+        """Forget a code, e.g. after its link was changed."""
+        with self._lock:
+            self._links.pop(code, None)
+            self._missing.pop(code, None)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._links.clear()
+            self._missing.clear()
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Hit, miss and eviction counters plus current sizes
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._links),
+                'negative_entries': len(self._missing)
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_flight = SingleFlight()
+
+
+def get_cache():
+    """
+    Get the process-wide short-link cache, creating it on first use.
+
+    Returns:
+        ShortLinkCache: The cache
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ShortLinkCache(
+                    max_entries=current_app.config.get('SHORTLINK_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+                    max_negative=current_app.config.get('SHORTLINK_NEGATIVE_MAX_ENTRIES', DEFAULT_NEGATIVE_MAX_ENTRIES)
+                )
+    return _cache
+
+
+def get_link_ttl(link, now=None):
+    """
+    Get how long a link may be served from the cache.
+
+    Args:
+        link: An object with url, is_disabled and expire_after attributes
+        now (datetime): The current time
+
+    Returns:
+        float: TTL in seconds, or 0 if the link must not be followed
+    """
+    if link is None or link.is_disabled or not link.url:
+        return 0
+    ttl = current_app.config.get('SHORTLINK_CACHE_TTL', DEFAULT_TTL)
+    if link.expire_after is not None:
+        remaining = (link.expire_after - (now or datetime.now())).total_seconds()
+        if remaining <= 0:
+            return 0
+        ttl = min(ttl, remaining)
+    return ttl
+
+
+def load_link(code):
+    """
+    Load a link by short or custom code from the database.
+
+    Runs a single indexed Core query on a pooled connection and returns a
+    plain row, without building ORM objects or a session.
+
+    Args:
+        code (str): The short or custom code
+
+    Returns:
+        Row: The link's url, is_disabled and expire_after, or None
+    """
+    with db.engine.connect() as conn:
+        return conn.execute(LOOKUP_LINK, {'code': code}).first()
+
+
+def resolve(code):
+    """
+    Resolve a short or custom code to its target URL.
+
+    Disabled and expired links resolve to None. Database errors are not
+    cached, so the next request tries again.
+
+    Args:
+        code (str): The short code
+
+    Returns:
+        str: The target URL or None
+    """
+    if not current_app.config.get('SQLALCHEMY_DATABASE_URI'):
+        # No database configured (see lib.database.init_app)
+        return None
+    cache = get_cache()
+    hit, url = cache.get(code)
+    if hit:
+        return url
+
+    def load():
+        link = load_link(code)
+        ttl = get_link_ttl(link)
+        if ttl > 0:
+            cache.set(code, link.url, ttl)
+            return link.url
+        cache.set_missing(code, current_app.config.get('SHORTLINK_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL))
+        return None
+
+    return _flight.do('link:{}'.format(code), load)
+
+
+def warm(limit):
+    """
+    Pre-load the most recently called codes into the cache.
+
+    Args:
+        limit (int): Number of links to load
+
+    Returns:
+        int: Number of codes cached
+    """
+    cache = get_cache()
+    query = (
+        select(Link.short_code, Link.custom_code, Link.url, Link.is_disabled, Link.expire_after)
+        .where(Link.last_call.isnot(None))
+        .order_by(Link.last_call.desc())
+        .limit(limit)
+    )
+    count = 0
+    now = datetime.now()
+    with db.engine.connect() as conn:
+        for link in conn.execute(query):
+            ttl = get_link_ttl(link, now)
+            if ttl <= 0:
+                continue
+            for code in (link.short_code, link.custom_code):
+                if code:
+                    cache.set(code, link.url, ttl)
+                    count += 1
+    return count
+
+
+_warmed = {}
+
+
+def start_warming(app):
+    """
+    Warm the cache of this process in a background thread, once per process.
+
+    Args:
+        app (Flask): The application
+    """
+    limit = app.config.get('SHORTLINK_WARM_COUNT', 0)
+    pid = os.getpid()
+    if not limit or pid in _warmed or not app.config.get('SQLALCHEMY_DATABASE_URI'):
+        return
+    with _cache_lock:
+        if pid in _warmed:
+            return
+        _warmed[pid] = True
+
+    def run():
+        with app.app_context():
+            try:
+                count = warm(limit)
+                app.logger.info("Pre-loaded {} short code(s)".format(count))
+            except Exception as e:
+                app.logger.error("Error pre-loading short codes: {}".format(str(e)))
+
+    threading.Thread(target=run, name='shortlink-warm', daemon=True).start()
+
+
+def invalidate(code=None):
+    """
+    Forget one code, or every cached code.
+
+    Args:
+        code (str): The short code, or None for all
+    """
+    cache = get_cache()
+    if code is None:
+        cache.clear()
+    else:
+        cache.delete(code)
+
+
+def stats():
+    """
+    Get short-link cache counters.
+
+    Returns:
+        dict: Counters, or None if the cache was never used
+    """
+    return _cache.stats() if _cache is not None else None
@@ -0,0 +1,378 @@
+"""
+Sharded sitemap index built in the background and streamed to crawlers.
+
+/sitemap.xml is a sitemap index pointing at child sitemaps of at most
+SITEMAP_SHARD_SIZE URLs each (the protocol allows 50,000): one for the static,
+listing and genre pages, and as many as needed for movie, TV show and actor
+pages. Ids come from the popular/top-rated/recent/trending feeds and from the
+detail pages already in the TMDB response cache; they are accumulated across
+rounds so pages stay listed until they have not been seen for SITEMAP_ID_TTL.
+
+Each round writes a generation to SITEMAP_DIR: a directory holding the index,
+the shards and the id sets, switched in by rewriting the `current` file. All
+workers read the same generation, so they agree on the shard count, and
+nothing is evicted under a crawler; the previous generation is kept for
+crawlers that fetched the index just before the switch. Once the current
+generation is older than SITEMAP_TTL it keeps being served while a single
+background round (one per host, under a lock file) builds the next one. The
+first generation is built by `flask sitemap` at deploy time or, failing that,
+in the background while /sitemap.xml answers 503.
+Responses are streamed from a generator, with the request host applied on the
+fly.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+import tmdb_api
+from lib import ratelimit
+from lib.cache import SingleFlight
+from lib.genres import catalog as genre_catalog
+from lib.parallel import fetch_parallel
+
+# The sitemap protocol limit is 50,000 URLs per file
+DEFAULT_SHARD_SIZE = 45000
+
+# Generations kept on disk: the current one and the one before it
+KEEP_GENERATIONS = 2
+
+# Retry-After seconds sent while the first generation is being built
+RETRY_AFTER = 120
+
+INDEX_KEY = 'sitemap:index'
+
+# Static, listing and genre pages: (path, changefreq, priority)
+PAGES = [
+    ('/', 'daily', '1.0'),
+    ('/about', 'monthly', '0.7'),
+    ('/contact', 'monthly', '0.7'),
+    ('/privacy', 'yearly', '0.5'),
+    ('/terms', 'yearly', '0.5'),
+    ('/popular', 'daily', '0.8'),
+    ('/recent', 'daily', '0.8'),
+    ('/trending', 'daily', '0.8'),
+    ('/top_rated', 'weekly', '0.8'),
+    ('/tv', 'daily', '0.8'),
+    ('/tv/popular', 'daily', '0.8'),
+    ('/tv/recent', 'daily', '0.8'),
+    ('/tv/trending', 'daily', '0.8'),
+    ('/tv/top_rated', 'weekly', '0.8'),
+]
+
+# Id sections: media type -> (shard name, page path, feeds)
+SECTIONS = {
+    'movie': ('movies', '/movie/{}', (
+        tmdb_api.get_popular_movies,
+        tmdb_api.get_top_rated_movies,
+        tmdb_api.get_recently_released_movies,
+        lambda page: tmdb_api.get_trending_movies('week', page),
+        lambda page: tmdb_api.get_trending_movies('day', page),
+    )),
+    'tv': ('tv', '/tv/{}', (
+        tmdb_api.get_popular_tv_shows,
+        tmdb_api.get_top_rated_tv_shows,
+        tmdb_api.get_recently_released_tv_shows,
+        lambda page: tmdb_api.get_trending_tv_shows('week', page),
+        lambda page: tmdb_api.get_trending_tv_shows('day', page),
+    )),
+    'person': ('people', '/actor/{}', ()),
+}
+
+# Detail pages whose upstream response is cached, e.g. 'tmdb:/movie/603?append_to_response=...'
+_detail_key_pattern = re.compile(r'^tmdb:/(movie|tv|person)/(\d+)\?')
+
+_flight = SingleFlight()
+
+
+def get_directory():
+    """
+    Get the directory holding the sitemap generations.
+
+    Returns:
+        str: SITEMAP_DIR, defaulting to <instance path>/sitemap
+    """
+    return current_app.config.get('SITEMAP_DIR') or os.path.join(current_app.instance_path, 'sitemap')
+
+
+def _write_file(path, data):
+    # Readers in other workers must never see a partly written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path, 'rb') as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _current_generation(directory):
+    try:
+        with open(os.path.join(directory, 'current'), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_index(directory):
+    """
+    Read the index of the current generation.
+
+    Args:
+        directory (str): The sitemap directory
+
+    Returns:
+        dict: The index (see regenerate) or None if none was built yet
+    """
+    generation = _current_generation(directory)
+    return _read_json(os.path.join(directory, generation, 'index.json')) if generation else None
+
+
+@contextmanager
+def _build_lock(directory):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, '.lock'), 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _prune(directory, keep):
+    generations = sorted(
+        (entry.name for entry in os.scandir(directory) if entry.is_dir() and not entry.name.startswith('.')),
+        key=lambda name: int(name.split('-')[0]) if name.split('-')[0].isdigit() else 0
+    )
+    for name in generations[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def _today():
+    # Day granularity keeps lastmod stable across rounds on the same day
+    return int(time.time()) // 86400 * 86400
+
+
+def _fetch_feed(fetch, page):
+    try:
+        return fetch(page)
+    except tmdb_api.UpstreamUnavailable:
+        # A failing feed only delays new ids; the ones already collected are kept
+        return {}
+
+
+def collect_ids(previous, media_type, feed_pages):
+    """
+    Merge the ids seen in feeds and cached detail pages into the previous id set.
+
+    Args:
+        previous (dict): Id (as a string) -> last day seen, from the previous generation
+        media_type (str): 'movie', 'tv' or 'person'
+        feed_pages (int): Upstream pages to read from each feed
+
+    Returns:
+        dict: Id -> last day it was seen (unix time)
+    """
+    ids = {int(k): v for k, v in (previous or {}).items()}
+    today = _today()
+
+    calls = [(_fetch_feed, fetch, page) for fetch in SECTIONS[media_type][2] for page in range(1, feed_pages + 1)]
+    for data in fetch_parallel(*calls):
+        for item in data.get('results', []):
+            ids[item['id']] = today
+
+    cache = tmdb_api.get_cache()
+    for key in (cache.keys('tmdb:/{}/'.format(media_type)) if cache is not None else ()):
+        match = _detail_key_pattern.match(key)
+        if match:
+            ids[int(match.group(2))] = today
+
+    max_age = current_app.config.get('SITEMAP_ID_TTL', 30 * 24 * 60 * 60)
+    return {item_id: seen for item_id, seen in ids.items() if today - seen < max_age}
+
+
+def get_page_entries():
+    """
+    Build the entries of the static, listing and genre pages.
+
+    Returns:
+        list: [path, lastmod, changefreq, priority] entries
+    """
+    entries = [[path, None, changefreq, priority] for path, changefreq, priority in PAGES]
+    entries.extend(['/genre/{}'.format(g['id']), None, 'weekly', '0.7'] for g in genre_catalog.get_genres('movie'))
+    entries.extend(['/tv/genre/{}'.format(g['id']), None, 'weekly', '0.7'] for g in genre_catalog.get_genres('tv'))
+    return entries
+
+
+def regenerate():
+    """
+    Build a new generation of the index, shards and id sets and switch to it.
+
+    Must be called inside an application context. Workers on the same host
+    take turns; a worker that waited for another's round returns that round's
+    index instead of building again.
+
+    Returns:
+        dict: The new index ({'generated': time, 'generation': name, 'shards': [[name, number, lastmod], ...]})
+    """
+    config = current_app.config
+    directory = get_directory()
+    os.makedirs(directory, exist_ok=True)
+    ttl = config.get('SITEMAP_TTL', 6 * 60 * 60)
+    shard_size = min(config.get('SITEMAP_SHARD_SIZE', DEFAULT_SHARD_SIZE), 50000)
+    feed_pages = config.get('SITEMAP_FEED_PAGES', 5)
+
+    with _build_lock(directory):
+        index = load_index(directory)
+        if index is not None and time.time() - index['generated'] < ttl:
+            return index
+        previous = _current_generation(directory)
+        generated = int(time.time())
+        path = tempfile.mkdtemp(prefix='{}-'.format(generated), dir=directory)
+        generation = os.path.basename(path)
+
+        sections = [('pages', get_page_entries())]
+        for media_type, (name, page_path, _) in SECTIONS.items():
+            old_ids = _read_json(os.path.join(directory, previous, 'ids-{}.json'.format(media_type))) if previous else None
+            ids = collect_ids(old_ids, media_type, feed_pages)
+            _write_file(os.path.join(path, 'ids-{}.json'.format(media_type)), json.dumps(ids).encode('utf-8'))
+            entries = [[page_path.format(item_id), seen, 'weekly', '0.6'] for item_id, seen in sorted(ids.items(), key=lambda x: -x[1])]
+            sections.append((name, entries))
+
+        shards = []
+        for name, entries in sections:
+            for number, start in enumerate(range(0, max(len(entries), 1), shard_size)):
+                chunk = entries[start:start + shard_size]
+                if not chunk:
+                    continue
+                _write_file(os.path.join(path, '{}-{}.json'.format(name, number)), json.dumps(chunk).encode('utf-8'))
+                lastmod = max([entry[1] for entry in chunk if entry[1]] or [generated])
+                shards.append([name, number, lastmod])
+
+        index = {'generated': generated, 'generation': generation, 'shards': shards}
+        _write_file(os.path.join(path, 'index.json'), json.dumps(index).encode('utf-8'))
+        _write_file(os.path.join(directory, 'current'), generation.encode('utf-8'))
+        _prune(directory, KEEP_GENERATIONS)
+    return index
+
+
+def _regenerate_in_background():
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context(), ratelimit.priority(ratelimit.BACKGROUND):
+            return regenerate()
+
+    _flight.do_background(INDEX_KEY, run)
+
+
+def get_index():
+    """
+    Get the sitemap index.
+
+    Until the first generation exists (see `flask sitemap`) a background
+    round is started and None is returned, so requests never wait for the
+    feed calls or compete with page views for the rate limit.
+
+    Returns:
+        dict: The index (see regenerate) or None while the first one is built
+    """
+    index = load_index(get_directory())
+    if index is None or time.time() - index['generated'] >= current_app.config.get('SITEMAP_TTL', 6 * 60 * 60):
+        _regenerate_in_background()
+    return index
+
+
+def get_shard(name, number):
+    """
+    Get the entries of one child sitemap.
+
+    Args:
+        name (str): The shard name ('pages', 'movies', 'tv' or 'people')
+        number (int): The shard number within its section
+
+    Returns:
+        list: [path, lastmod, changefreq, priority] entries or None if unknown
+
+    Raises:
+        LookupError: No generation has been built yet
+    """
+    index = get_index()
+    if index is None:
+        raise LookupError('The sitemap is being built')
+    if [name, number] not in [shard[:2] for shard in index['shards']]:
+        return None
+    return _read_json(os.path.join(get_directory(), index['generation'], '{}-{}.json'.format(name, number)))
+
+
+def format_lastmod(timestamp):
+    """Format a unix time as a W3C date."""
+    return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+
+
+def stream_index(index, host_base, shard_url):
+    """
+    Stream a sitemap index document.
+
+    Args:
+        index (dict): The index (see regenerate)
+        host_base (str): Scheme and host, without trailing slash
+        shard_url (callable): Builds the path of a shard from (name, number)
+
+    Yields:
+        str: Chunks of XML
+    """
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for name, number, lastmod in index['shards']:
+        yield '  <sitemap>\n    <loc>{}</loc>\n    <lastmod>{}</lastmod>\n  </sitemap>\n'.format(
+            escape(host_base + shard_url(name, number)), format_lastmod(lastmod)
+        )
+    yield '</sitemapindex>\n'
+
+
+def stream_shard(entries, host_base, chunk_size=500):
+    """
+    Stream a child sitemap document.
+
+    Args:
+        entries (list): [path, lastmod, changefreq, priority] entries
+        host_base (str): Scheme and host, without trailing slash
+        chunk_size (int): Entries per yielded chunk
+
+    Yields:
+        str: Chunks of XML
+    """
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for start in range(0, len(entries), chunk_size):
+        parts = []
+        for path, lastmod, changefreq, priority in entries[start:start + chunk_size]:
+            parts.append('  <url>\n    <loc>{}</loc>\n'.format(escape(host_base + path)))
+            if lastmod:
+                parts.append('    <lastmod>{}</lastmod>\n'.format(format_lastmod(lastmod)))
+            parts.append('    <changefreq>{}</changefreq>\n    <priority>{}</priority>\n  </url>\n'.format(changefreq, priority))
+        yield ''.join(parts)
+    yield '</urlset>\n'
@@ -0,0 +1,645 @@
+"""
+Local stand-in for the TMDB API and image server, for offline load tests.
+
+`flask standin serve` starts a small threaded HTTP server that answers every
+endpoint tmdb_api.py and tmdb_api_async.py call (listings, trending, discover,
+search, details with append_to_response, external IDs, people and genre
+lists) plus /t/p/<size>/<file> images. Point the app at it through the
+environment:
+
+    TMDB_API_URL=http://127.0.0.1:8710/3
+    TMDB_IMAGE_BASE_URL=http://127.0.0.1:8710/t/p/
+
+Responses come from recorded fixtures, one JSON file per request under the
+fixture directory (the path, then the sorted query without api_key). With
+--record, requests that have no fixture are fetched from the real TMDB once
+and saved, so a later replay needs no network and no API key. Requests that
+are neither recorded nor recordable get a deterministic synthesized response
+of the right shape (disable with --no-synthesize to find gaps in a fixture
+set).
+
+Latency, jitter, error responses and dropped connections can be injected to
+exercise timeouts, retries, circuit breakers and the stale cache. They can be
+changed while a test runs with POST /_standin?latency=200&error_rate=0.1; GET
+/_standin returns the settings and counters.
+"""
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from lib.resilience import endpoint_name
+
+DEFAULT_PORT = 8710
+UPSTREAM_API_URL = 'https://api.themoviedb.org/3'
+UPSTREAM_IMAGE_URL = 'https://image.tmdb.org/t/p/'
+
+API_PREFIX = '/3'
+CONTROL_PATH = '/_standin'
+
+# Upstream answers worth keeping; anything else (401, 429, 5xx) is passed through
+RECORD_STATUSES = frozenset((200, 404))
+RECORD_TIMEOUT = (3.05, 20)
+
+_FIXTURE_NAME = re.compile(r'^[A-Za-z0-9=&,._%+-]{1,120}$')
+_PATH_SEGMENT = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.-]*$')
+_IMAGE_PATH = re.compile(r'^/t/p/([a-z0-9]+)/([A-Za-z0-9_-]+\.(?:jpg|jpeg|png|svg|webp))$')
+_IMAGE_TYPES = {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'svg': 'image/svg+xml', 'webp': 'image/webp'}
+
+# Served for images that were not recorded (a transparent 1x1 GIF; browsers sniff the type)
+PLACEHOLDER_IMAGE = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+NOT_FOUND = {'success': False, 'status_code': 34, 'status_message': 'The resource you requested could not be found.'}
+INJECTED_ERROR = {'success': False, 'status_code': 11, 'status_message': 'Internal error: injected by the TMDB stand-in.'}
+
+MOVIE_GENRES = [
+    (28, 'Action'), (12, 'Adventure'), (16, 'Animation'), (35, 'Comedy'), (80, 'Crime'), (99, 'Documentary'),
+    (18, 'Drama'), (10751, 'Family'), (14, 'Fantasy'), (36, 'History'), (27, 'Horror'), (10402, 'Music'),
+    (9648, 'Mystery'), (10749, 'Romance'), (878, 'Science Fiction'), (10770, 'TV Movie'), (53, 'Thriller'),
+    (10752, 'War'), (37, 'Western'),
+]
+TV_GENRES = [
+    (10759, 'Action & Adventure'), (16, 'Animation'), (35, 'Comedy'), (80, 'Crime'), (99, 'Documentary'),
+    (18, 'Drama'), (10751, 'Family'), (10762, 'Kids'), (9648, 'Mystery'), (10763, 'News'), (10764, 'Reality'),
+    (10765, 'Sci-Fi & Fantasy'), (10766, 'Soap'), (10767, 'Talk'), (10768, 'War & Politics'), (37, 'Western'),
+]
+
+_WORDS = (
+    'Silent', 'Harbor', 'Crimson', 'Echo', 'Midnight', 'Garden', 'Last', 'Kingdom', 'Broken', 'Signal', 'Hidden',
+    'River', 'Iron', 'Summer', 'Glass', 'Empire', 'Wild', 'Horizon', 'Paper', 'Moon', 'Golden', 'Storm', 'Lost',
+    'City', 'Velvet', 'Frontier', 'Northern', 'Lights', 'Shadow', 'Protocol', 'Winter', 'Road',
+)
+_FIRST_NAMES = ('Ava', 'Noah', 'Mia', 'Leo', 'Zoe', 'Omar', 'Ines', 'Kai', 'Lena', 'Ravi', 'Sofia', 'Theo', 'Yara', 'Jonas')
+_LAST_NAMES = ('Hart', 'Okafor', 'Lindqvist', 'Moreau', 'Tanaka', 'Reyes', 'Novak', 'Byrne', 'Shah', 'Costa', 'Weber')
+
+PAGE_SIZE = 20
+MAX_PAGES = 500
+
+
+def fixture_path(directory, path, params):
+    """
+    Get the fixture file of an API request.
+
+    Args:
+        directory (str): The fixture directory
+        path (str): The API path without the /3 prefix (e.g. '/movie/550')
+        params (list): The query parameters as (name, value) pairs
+
+    Returns:
+        str: The file path, or None if the path has a segment that is empty,
+            '.', '..' or otherwise not a plain name (it could leave the directory)
+    """
+    segments = path.strip('/').split('/')
+    if not all(_PATH_SEGMENT.match(segment) for segment in segments):
+        return None
+    query = urlencode(sorted((k, v) for k, v in params if k != 'api_key'))
+    name = query if _FIXTURE_NAME.match(query) else hashlib.sha1(query.encode('utf-8')).hexdigest()
+    return os.path.join(directory, 'api', *segments, (name or '_') + '.json')
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class Faults:
+    """Latency and error injection settings, changeable while serving."""
+
+    FIELDS = {
+        'latency': float,  # Milliseconds added to every response
+        'jitter': float,  # Extra random milliseconds, uniform up to this
+        'error_rate': float,  # Fraction of requests answered with error_status
+        'error_status': int,
+        'retry_after': int,  # Retry-After seconds sent with injected errors (0: none)
+        'drop_rate': float,  # Fraction of connections closed without a response
+    }
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, retry_after=0, drop_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.drop_rate = drop_rate
+
+    def update(self, values):
+        """
+        Change settings from query parameters.
+
+        Args:
+            values (dict): Field names and string values; unknown names are ignored
+
+        Raises:
+            ValueError: A value does not parse
+        """
+        parsed = {name: self.FIELDS[name](value) for name, value in values.items() if name in self.FIELDS}
+        for name, value in parsed.items():
+            setattr(self, name, value)
+
+    def delay(self):
+        """
+        Get the injected delay of one response.
+
+        Returns:
+            float: Seconds
+        """
+        return (self.latency + random.uniform(0, self.jitter)) / 1000.0
+
+    def pick(self):
+        """
+        Decide whether to fail one request.
+
+        Returns:
+            str: 'drop', 'error' or None
+        """
+        roll = random.random()
+        if roll < self.drop_rate:
+            return 'drop'
+        if roll < self.drop_rate + self.error_rate:
+            return 'error'
+        return None
+
+    def settings(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class StandIn:
+    """Fixture lookup, recording, synthesis and counters behind the HTTP handler."""
+
+    def __init__(self, directory, record=False, synthesize=True, faults=None,
+                 upstream_api_url=UPSTREAM_API_URL, upstream_image_url=UPSTREAM_IMAGE_URL):
+        """
+        Args:
+            directory (str): The fixture directory (created if missing)
+            record (bool): Fetch and save requests that have no fixture
+            synthesize (bool): Generate responses for requests that have none
+            faults (Faults): Latency and error injection
+            upstream_api_url (str): The real API, used when recording
+            upstream_image_url (str): The real image server, used when recording
+        """
+        self.directory = directory
+        self.record = record
+        self.synthesize = synthesize
+        self.faults = faults or Faults()
+        self.upstream_api_url = upstream_api_url.rstrip('/')
+        self.upstream_image_url = upstream_image_url.rstrip('/') + '/'
+        self._session = requests.Session() if record else None
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.endpoints = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def count(self, source, endpoint=None):
+        with self._lock:
+            self.counts[source] = self.counts.get(source, 0) + 1
+            if endpoint is not None:
+                self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+
+    def stats(self):
+        """
+        Get the settings and counters.
+
+        Returns:
+            dict: Fault settings, modes, responses by source and requests by endpoint
+        """
+        with self._lock:
+            return {
+                'faults': self.faults.settings(),
+                'record': self.record,
+                'synthesize': self.synthesize,
+                'directory': self.directory,
+                'responses': dict(self.counts),
+                'endpoints': dict(sorted(self.endpoints.items())),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+            self.endpoints = {}
+
+    def api(self, path, params):
+        """
+        Answer an API request.
+
+        Args:
+            path (str): The API path without the /3 prefix
+            params (list): The query parameters as (name, value) pairs
+
+        Returns:
+            tuple: (status, body bytes, source)
+        """
+        fixture = fixture_path(self.directory, path, params)
+        if fixture is None:
+            return 404, json.dumps(NOT_FOUND).encode('utf-8'), 'invalid_path'
+        try:
+            with open(fixture, 'rb') as f:
+                stored = json.loads(f.read())
+            return stored['status'], json.dumps(stored['body']).encode('utf-8'), 'fixture'
+        except FileNotFoundError:
+            pass
+
+        if self.record:
+            url = '{}{}?{}'.format(self.upstream_api_url, path, urlencode(params))
+            try:
+                response = self._session.get(url, timeout=RECORD_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                return 502, json.dumps({'success': False, 'status_message': str(e)}).encode('utf-8'), 'upstream_error'
+            if response.status_code in RECORD_STATUSES:
+                stored = {'status': response.status_code, 'body': response.json()}
+                _write_atomic(fixture, json.dumps(stored, indent=1, sort_keys=True).encode('utf-8'))
+                return response.status_code, response.content, 'recorded'
+            return response.status_code, response.content, 'upstream_error'
+
+        if self.synthesize:
+            status, body = synthesize(path, dict(params))
+            return status, json.dumps(body).encode('utf-8'), 'synthesized'
+        return 404, json.dumps(NOT_FOUND).encode('utf-8'), 'missing'
+
+    def image(self, size, filename):
+        """
+        Answer an image request.
+
+        Args:
+            size (str): The TMDB size
+            filename (str): The TMDB file name
+
+        Returns:
+            tuple: (status, body bytes, source)
+        """
+        fixture = os.path.join(self.directory, 'images', size, filename)
+        try:
+            with open(fixture, 'rb') as f:
+                return 200, f.read(), 'fixture'
+        except FileNotFoundError:
+            pass
+
+        if self.record:
+            try:
+                response = self._session.get(self.upstream_image_url + '{}/{}'.format(size, filename), timeout=RECORD_TIMEOUT)
+            except requests.exceptions.RequestException:
+                return 502, b'', 'upstream_error'
+            if response.status_code == 200:
+                _write_atomic(fixture, response.content)
+                return 200, response.content, 'recorded'
+            return response.status_code, response.content, 'upstream_error'
+
+        if self.synthesize:
+            return 200, PLACEHOLDER_IMAGE, 'synthesized'
+        return 404, b'', 'missing'
+
+
+# Synthesized responses. Every value derives from the request, so the same
+# request always gets the same answer and an id has the same title in lists,
+# details and credits.
+
+def _rng(*parts):
+    return random.Random(':'.join(str(part) for part in parts))
+
+
+def _title(rng, words=None):
+    count = rng.choice((1, 2, 2, 3))
+    title = ' '.join(rng.choice(_WORDS) for _ in range(count))
+    return '{} {}'.format(words, title) if words else ('The ' + title if rng.random() < 0.4 else title)
+
+
+def _date(rng, start=1970, end=2026):
+    return '{:04d}-{:02d}-{:02d}'.format(rng.randint(start, end), rng.randint(1, 12), rng.randint(1, 28))
+
+
+def _image(rng, kind, id_, missing=0.05):
+    return None if rng.random() < missing else '/standin-{}{}-{}.jpg'.format(kind, id_, rng.randint(0, 9))
+
+
+def _media(media_type, id_, genre_id=None, words=None):
+    rng = _rng(media_type, id_)
+    genres = MOVIE_GENRES if media_type == 'movie' else TV_GENRES
+    genre_ids = [genre_id for genre_id, _ in rng.sample(genres, rng.randint(1, 3))]
+    if genre_id is not None and genre_id not in genre_ids:
+        genre_ids.insert(0, genre_id)
+    item = {
+        'id': id_,
+        'adult': False,
+        'overview': 'A synthesized {} for offline testing.'.format('film' if media_type == 'movie' else 'series'),
+        'poster_path': _image(rng, 'p', id_),
+        'backdrop_path': _image(rng, 'b', id_, missing=0.1),
+        'genre_ids': genre_ids,
+        'original_language': 'en',
+        'popularity': round(rng.uniform(5, 500), 3),
+        'vote_average': round(rng.uniform(4, 9), 1),
+        'vote_count': rng.randint(10, 30000),
+    }
+    title = _title(rng, words)
+    if media_type == 'movie':
+        item.update(title=title, original_title=title, release_date=_date(rng), video=False)
+    else:
+        item.update(name=title, original_name=title, first_air_date=_date(rng, 1990), origin_country=['US'])
+    return item
+
+
+def _person(id_):
+    rng = _rng('person', id_)
+    return {
+        'id': id_,
+        'name': '{} {}'.format(rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES)),
+        'profile_path': _image(rng, 'f', id_, missing=0.15),
+        'known_for_department': rng.choice(('Acting', 'Acting', 'Directing', 'Writing')),
+        'gender': rng.choice((1, 2)),
+        'popularity': round(rng.uniform(1, 80), 3),
+        'adult': False,
+    }
+
+
+def _ids(rng, count, low=100, high=999999):
+    return rng.sample(range(low, high), count)
+
+
+def _page(params):
+    try:
+        return max(1, int(params.get('page', 1)))
+    except ValueError:
+        return 1
+
+
+def _listing(key, params, make, total_pages=MAX_PAGES):
+    page = _page(params)
+    rng = _rng(key, page)
+    results = [make(id_) for id_ in _ids(rng, PAGE_SIZE)] if page <= total_pages else []
+    return {'page': page, 'results': results, 'total_pages': total_pages, 'total_results': total_pages * PAGE_SIZE}
+
+
+def _search(media_type, params):
+    query = params.get('query', '').strip()
+    if not query:
+        return {'page': 1, 'results': [], 'total_pages': 0, 'total_results': 0}
+    total = _rng('search', media_type, query.lower()).randint(0, 120)
+    total_pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    page = _page(params)
+    count = max(0, min(PAGE_SIZE, total - (page - 1) * PAGE_SIZE))
+    ids = _ids(_rng('search', media_type, query.lower(), page), count)
+    if media_type == 'person':
+        results = []
+        for id_ in ids:
+            person = _person(id_)
+            person['name'] = '{} {}'.format(query.title(), person['name'].split()[-1])
+            person['known_for'] = [dict(_media('movie', known), media_type='movie') for known in _ids(_rng('known', id_), 3)]
+            results.append(person)
+    else:
+        results = [_media(media_type, id_, words=query.title()) for id_ in ids]
+    return {'page': page, 'results': results, 'total_pages': total_pages, 'total_results': total}
+
+
+def _details(media_type, id_, append):
+    rng = _rng('details', media_type, id_)
+    item = _media(media_type, id_)
+    names = dict(MOVIE_GENRES if media_type == 'movie' else TV_GENRES)
+    item['genres'] = [{'id': genre_id, 'name': names[genre_id]} for genre_id in item.pop('genre_ids')]
+    item['tagline'] = ' '.join(rng.choice(_WORDS) for _ in range(4)) + '.'
+    item['homepage'] = ''
+    item['status'] = 'Released' if media_type == 'movie' else rng.choice(('Returning Series', 'Ended'))
+    imdb_id = 'tt{:07d}'.format(id_ % 10000000)
+    if media_type == 'movie':
+        item.update(
+            runtime=rng.randint(80, 170), imdb_id=imdb_id, budget=rng.randint(1, 200) * 1000000,
+            revenue=rng.randint(0, 900) * 1000000, spoken_languages=[{'iso_639_1': 'en', 'name': 'English'}],
+        )
+    else:
+        seasons = rng.randint(1, 8)
+        item['seasons'] = [
+            {
+                'id': id_ * 100 + number, 'season_number': number, 'name': 'Season {}'.format(number),
+                'episode_count': rng.randint(6, 13), 'air_date': _date(rng, 1990), 'poster_path': None,
+            }
+            for number in range(1, seasons + 1)
+        ]
+        item.update(
+            number_of_seasons=seasons, number_of_episodes=sum(season['episode_count'] for season in item['seasons']),
+            episode_run_time=[rng.choice((22, 30, 45, 60))], last_air_date=_date(rng, 2000),
+            in_production=item['status'] == 'Returning Series', networks=[{'id': 1, 'name': 'Stand-in Network'}],
+            created_by=[_person(person_id) for person_id in _ids(rng, 1)], type='Scripted',
+        )
+    parts = set(filter(None, append.split(',')))
+    if 'videos' in parts:
+        item['videos'] = {'results': [{
+            'id': '{:x}'.format(rng.getrandbits(64)), 'key': 'standin{}'.format(id_), 'site': 'YouTube',
+            'type': 'Trailer', 'name': 'Official Trailer', 'official': True, 'iso_639_1': 'en',
+        }]}
+    if 'credits' in parts:
+        cast = []
+        for order, person_id in enumerate(_ids(rng, 12)):
+            member = _person(person_id)
+            member.update(character=_title(_rng('character', id_, person_id)), order=order, credit_id=str(person_id))
+            cast.append(member)
+        crew = [dict(_person(person_id), job='Director', department='Directing') for person_id in _ids(rng, 1)]
+        item['credits'] = {'cast': cast, 'crew': crew}
+    if 'external_ids' in parts:
+        item['external_ids'] = _external_ids(media_type, id_)
+    if 'recommendations' in parts:
+        item['recommendations'] = _listing(('recommendations', media_type, id_), {}, lambda rec: _media(media_type, rec), 2)
+    return item
+
+
+def _external_ids(media_type, id_):
+    ids = {'id': id_, 'imdb_id': 'tt{:07d}'.format(id_ % 10000000), 'wikidata_id': None, 'facebook_id': None}
+    if media_type == 'tv':
+        ids['tvdb_id'] = id_
+    return ids
+
+
+def _person_details(id_, append):
+    rng = _rng('person-details', id_)
+    person = _person(id_)
+    person.update(
+        biography='A synthesized person for offline testing.', birthday=_date(rng, 1940, 2005), deathday=None,
+        place_of_birth='Springfield, USA', imdb_id='nm{:07d}'.format(id_ % 10000000), also_known_as=[],
+    )
+    parts = set(filter(None, append.split(',')))
+    if 'movie_credits' in parts:
+        person['movie_credits'] = {'cast': [
+            dict(_media('movie', movie_id), character=_title(_rng('character', movie_id, id_)), credit_id=str(movie_id))
+            for movie_id in _ids(rng, rng.randint(5, 25))
+        ], 'crew': []}
+    if 'tv_credits' in parts:
+        person['tv_credits'] = {'cast': [
+            dict(_media('tv', tv_id), character=_title(_rng('character', tv_id, id_)), credit_id=str(tv_id))
+            for tv_id in _ids(rng, rng.randint(0, 8))
+        ], 'crew': []}
+    if 'images' in parts:
+        person['images'] = {'profiles': [
+            {'file_path': person['profile_path'], 'width': 421, 'height': 632, 'aspect_ratio': 0.666}
+        ] if person['profile_path'] else []}
+    return person
+
+
+_LISTS = re.compile(r'^/(movie|tv)/(popular|top_rated|now_playing|on_the_air|upcoming|airing_today)$')
+_TRENDING = re.compile(r'^/trending/(movie|tv|all)/(day|week)$')
+_DISCOVER = re.compile(r'^/discover/(movie|tv)$')
+_SEARCH = re.compile(r'^/search/(movie|tv|person)$')
+_GENRES = re.compile(r'^/genre/(movie|tv)/list$')
+_DETAILS = re.compile(r'^/(movie|tv)/(\d+)$')
+_EXTERNAL_IDS = re.compile(r'^/(movie|tv)/(\d+)/external_ids$')
+_RECOMMENDATIONS = re.compile(r'^/(movie|tv)/(\d+)/(recommendations|similar)$')
+_PERSON = re.compile(r'^/person/(\d+)$')
+
+
+def synthesize(path, params):
+    """
+    Generate a deterministic response for an API request.
+
+    Args:
+        path (str): The API path without the /3 prefix
+        params (dict): The query parameters
+
+    Returns:
+        tuple: (status, JSON-serializable body)
+    """
+    match = _LISTS.match(path)
+    if match:
+        media_type = match.group(1)
+        return 200, _listing(path, params, lambda id_: _media(media_type, id_))
+    match = _TRENDING.match(path)
+    if match:
+        kind = match.group(1)
+
+        def trending(id_):
+            media_type = kind if kind != 'all' else ('movie' if id_ % 2 else 'tv')
+            return dict(_media(media_type, id_), media_type=media_type)
+        return 200, _listing(path, params, trending)
+    match = _DISCOVER.match(path)
+    if match:
+        media_type = match.group(1)
+        try:
+            genre_id = int(str(params.get('with_genres', '')).split(',')[0])
+        except ValueError:
+            genre_id = None
+        return 200, _listing((path, genre_id), params, lambda id_: _media(media_type, id_, genre_id))
+    match = _SEARCH.match(path)
+    if match:
+        return 200, _search(match.group(1), params)
+    match = _GENRES.match(path)
+    if match:
+        genres = MOVIE_GENRES if match.group(1) == 'movie' else TV_GENRES
+        return 200, {'genres': [{'id': genre_id, 'name': name} for genre_id, name in genres]}
+    match = _DETAILS.match(path)
+    if match:
+        return 200, _details(match.group(1), int(match.group(2)), params.get('append_to_response', ''))
+    match = _EXTERNAL_IDS.match(path)
+    if match:
+        return 200, _external_ids(match.group(1), int(match.group(2)))
+    match = _RECOMMENDATIONS.match(path)
+    if match:
+        media_type = match.group(1)
+        return 200, _listing((path,), params, lambda rec: _media(media_type, rec), 2)
+    match = _PERSON.match(path)
+    if match:
+        return 200, _person_details(int(match.group(1)), params.get('append_to_response', ''))
+    return 404, NOT_FOUND
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Routes /3/... to the API, /t/p/... to images and /_standin to the controls."""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'TMDBStandIn/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send(self, status, body, content_type='application/json;charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        standin = self.server.standin
+        parts = urlsplit(self.path)
+        if parts.path == CONTROL_PATH:
+            return self.send(200, json.dumps(standin.stats(), indent=1).encode('utf-8'))
+
+        image = _IMAGE_PATH.match(parts.path)
+        path = parts.path[len(API_PREFIX):] if parts.path.startswith(API_PREFIX + '/') else parts.path
+        endpoint = '/t/p/{size}' if image else endpoint_name(path)
+
+        time.sleep(standin.faults.delay())
+        fault = standin.faults.pick()
+        if fault == 'drop':
+            standin.count('dropped', endpoint)
+            self.close_connection = True
+            return
+        if fault == 'error':
+            standin.count('injected_error', endpoint)
+            status = standin.faults.error_status
+            retry_after = standin.faults.retry_after
+            return self.send(status, json.dumps(INJECTED_ERROR).encode('utf-8'),
+                             headers={'Retry-After': str(retry_after)} if retry_after else None)
+
+        if image:
+            size, filename = image.groups()
+            status, body, source = standin.image(size, filename)
+            standin.count(source, endpoint)
+            if source == 'synthesized':
+                content_type = 'image/gif'
+            else:
+                content_type = _IMAGE_TYPES[filename.rsplit('.', 1)[1].lower()] if status == 200 else 'text/plain'
+            return self.send(status, body, content_type)
+
+        status, body, source = standin.api(path, parse_qsl(parts.query, keep_blank_values=True))
+        standin.count(source, endpoint)
+        self.send(status, body)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        standin = self.server.standin
+        parts = urlsplit(self.path)
+        if parts.path != CONTROL_PATH:
+            return self.send(405, b'{}')
+        values = dict(parse_qsl(parts.query))
+        try:
+            standin.faults.update(values)
+        except ValueError as e:
+            return self.send(400, json.dumps({'error': str(e)}).encode('utf-8'))
+        if values.get('reset'):
+            standin.reset()
+        self.send(200, json.dumps(standin.stats(), indent=1).encode('utf-8'))
+
+
+def make_server(standin, host='127.0.0.1', port=DEFAULT_PORT, verbose=False):
+    """
+    Create the HTTP server (one thread per connection).
+
+    Args:
+        standin (StandIn): Fixtures, recording and fault settings
+        host (str): The address to bind
+        port (int): The port to bind (0 picks a free one)
+        verbose (bool): Log every request to stderr
+
+    Returns:
+        ThreadingHTTPServer: The server; call serve_forever() to run it
+    """
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.standin = standin
+    server.verbose = verbose
+    return server
@@ -0,0 +1,81 @@
+"""
+Shared HTTP transport for upstream API calls.
+
+A single ``requests.Session`` is kept per process so that connections to the
+upstream API are pooled and reused (keep-alive) instead of paying a new
+TCP+TLS handshake on every call.
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Defaults used when no Flask config is available (e.g. background threads)
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 32
+
+_lock = threading.Lock()
+_sessions = {}
+
+
+def _build_session(pool_connections, pool_maxsize):
+    """
+    Build a session with a pooled, keep-alive adapter mounted for HTTP(S).
+
+    Args:
+        pool_connections (int): Number of host pools to cache
+        pool_maxsize (int): Maximum number of connections kept per host
+
+    Returns:
+        requests.Session: The configured session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=False
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive'
+    })
+    return session
+
+
+def get_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """
+    Get the pooled session for the current process.
+
+    Sessions are keyed by process id so that workers forked by gunicorn never
+    share sockets inherited from the master process.
+
+    Args:
+        pool_connections (int): Number of host pools to cache
+        pool_maxsize (int): Maximum number of connections kept per host
+
+    Returns:
+        requests.Session: The shared session for this process
+    """
+    pid = os.getpid()
+    session = _sessions.get(pid)
+    if session is None:
+        with _lock:
+            session = _sessions.get(pid)
+            if session is None:
+                # Drop sessions inherited from a parent process
+                _sessions.clear()
+                session = _build_session(pool_connections, pool_maxsize)
+                _sessions[pid] = session
+    return session
+
+
+def close_sessions():
+    """Close all pooled sessions owned by this module."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
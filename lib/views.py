@@ -0,0 +1,274 @@
+"""
+Page building shared by the Flask views in app.py and the async views in asgi.py.
+
+Both entry points do their own TMDB I/O (tmdb_api from worker threads,
+tmdb_api_async on the event loop) and hand the results to these helpers,
+which check them and render the page, the AJAX envelope or the error page.
+A change to what a page shows or how a failure is reported is made here once.
+"""
+from flask import current_app, jsonify, render_template, request
+
+import tmdb_api
+from lib import paging, resilience
+
+# Infinite-scroll listing pages by endpoint: (name of the fetch function in
+# tmdb_api and tmdb_api_async, template flag, media type, title, error subject)
+LISTINGS = {
+    'recent_movies': ('get_recently_released_movies', 'is_recent', 'movie', 'Recently Released Movies', 'recently released movies'),
+    'popular_movies': ('get_popular_movies', 'is_popular', 'movie', 'Popular Movies', 'popular movies'),
+    'trending_movies': ('get_trending_movies', 'is_trending', 'movie', 'Trending Movies', 'trending movies'),
+    'top_rated_movies': ('get_top_rated_movies', 'is_top_rated', 'movie', 'Top Rated Movies', 'top-rated movies'),
+    'recent_tv_shows': ('get_recently_released_tv_shows', 'is_recent', 'tv', 'Recently Released TV Shows', 'recently released TV shows'),
+    'popular_tv_shows': ('get_popular_tv_shows', 'is_popular', 'tv', 'Popular TV Shows', 'popular TV shows'),
+    'trending_tv_shows': ('get_trending_tv_shows', 'is_trending', 'tv', 'Trending TV Shows', 'trending TV shows'),
+    'top_rated_tv_shows': ('get_top_rated_tv_shows', 'is_top_rated', 'tv', 'Top Rated TV Shows', 'top-rated TV shows'),
+}
+
+# Detail and watch pages by media type: (detail template, watch template,
+# not-found title, context key of the item, context key of related items)
+DETAILS = {
+    'movie': ('movie_detail.html', 'watch_movie.html', 'Movie Not Found', 'movie', 'related_movies'),
+    'tv': ('tv_detail.html', 'watch_tv.html', 'TV Show Not Found', 'show', 'related_shows'),
+}
+
+
+def api_error_page(subject, unavailable=False):
+    """
+    Render the error page for a TMDB fetch that failed or came back empty.
+
+    When the fetch raised tmdb_api.UpstreamUnavailable, or a circuit breaker
+    is open, the upstream is down rather than the API key being wrong, so the
+    page says so and answers 503 with Retry-After.
+
+    Args:
+        subject (str): What could not be fetched, e.g. 'popular movies'
+        unavailable (bool): The fetch raised tmdb_api.UpstreamUnavailable
+    """
+    open_breakers = resilience.open_breakers()
+    if open_breakers or unavailable:
+        error_message = "Unable to fetch {} right now because the movie database is not responding. Please try again in a minute.".format(subject)
+        response = current_app.make_response((render_template('error.html', title='Service Unavailable', error_message=error_message), 503))
+        if open_breakers:
+            retry_after = max(breaker.retry_after() for breaker in open_breakers)
+        else:
+            retry_after = current_app.config.get('TMDB_BREAKER_RESET_TIMEOUT', resilience.DEFAULT_RESET_TIMEOUT)
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    error_message = (
+        "Unable to fetch {}. Please make sure you have set a valid TMDB API key "
+        "in appconfig.py. You can get an API key from https://www.themoviedb.org/settings/api".format(subject)
+    )
+    return render_template('error.html', title='API Error', error_message=error_message)
+
+
+def error_page(e, subject=None):
+    """
+    Render the error page for an exception raised while building a page.
+
+    Args:
+        e (Exception): The exception
+        subject (str): What the page fetches, e.g. 'popular movies'; given,
+            an UpstreamUnavailable error answers 503 (see api_error_page)
+    """
+    if subject is not None and isinstance(e, tmdb_api.UpstreamUnavailable):
+        # Not a missing title or an empty listing: crawlers must not be told so
+        return api_error_page(subject, unavailable=True)
+    error_message = "An error occurred: {}".format(str(e))
+    return render_template('error.html', title='Error', error_message=error_message)
+
+
+def index_page(popular_movies, trending_movies, trending_tv_shows, page):
+    """Render the home page from its three feeds."""
+    # Check if we got empty results due to an error
+    if not popular_movies.get('results') and not trending_movies.get('results') and not trending_tv_shows.get('results'):
+        return api_error_page('movies')
+    return render_template(
+        'index.html', title='Home',
+        popular_movies=popular_movies,
+        trending_movies=trending_movies,
+        trending_tv_shows=trending_tv_shows,
+        current_page=page
+    )
+
+
+def tv_index_page(popular_shows, trending_shows, page):
+    """Render the TV shows home page from its two feeds."""
+    # Check if we got empty results due to an error
+    if not popular_shows.get('results') and not trending_shows.get('results'):
+        return api_error_page('TV shows')
+    return render_template(
+        'tv_index.html', title='TV Shows',
+        popular_shows=popular_shows,
+        trending_shows=trending_shows,
+        current_page=page
+    )
+
+
+def detail_page(media_type, item_id, details, related, watch=False):
+    """
+    Render a movie or TV show detail or watch page.
+
+    Args:
+        media_type (str): 'movie' or 'tv'
+        item_id (int): The TMDB id
+        details (dict): The details, or None if TMDB does not know the id
+        related (list): Related items
+        watch (bool): Render the watch page with player URLs
+    """
+    template, watch_template, not_found_title, item_key, related_key = DETAILS[media_type]
+    if not details:
+        return render_template('404.html', title=not_found_title), 404
+    name = details.get('title') or details.get('name')
+    context = {item_key: details, related_key: related}
+    if not watch:
+        return render_template(template, title=name, **context)
+
+    if media_type == 'movie':
+        vidsrc_url = tmdb_api.get_vidsrc_url(item_id)
+    else:
+        vidsrc_url = tmdb_api.get_vidsrc_tv_url(item_id)
+    # The embess.ws player needs the IMDB ID
+    imdb_id = details.get('external_ids', {}).get('imdb_id')
+    embess_url = tmdb_api.get_embess_url(imdb_id) if imdb_id else None
+    return render_template(
+        watch_template,
+        title="Watch {}".format(name),
+        vidsrc_url=vidsrc_url,
+        embess_url=embess_url,
+        imdb_id=imdb_id,
+        **context
+    )
+
+
+def combine_search_results(page, movie_results, tv_results, actor_results):
+    """
+    Merge movie, TV show and actor search results into one listing.
+
+    Returns:
+        dict: A TMDB-style listing sorted by popularity, each item tagged with its media_type
+    """
+    groups = (('movie', movie_results), ('tv', tv_results), ('person', actor_results))
+    combined = []
+    for media_type, group in groups:
+        for item in group.get('results', []):
+            item['media_type'] = media_type
+            combined.append(item)
+    return {
+        # Sort by popularity (descending)
+        'results': sorted(combined, key=lambda x: x.get('popularity', 0), reverse=True),
+        'total_results': sum(group.get('total_results', 0) for _, group in groups),
+        'total_pages': max(group.get('total_pages', 0) for _, group in groups),
+        'page': page
+    }
+
+
+def search_page(results, query, page, media_type, is_ajax, title='Search Results'):
+    """Render search results, or only the result cards for AJAX requests."""
+    has_more = page < results.get('total_pages', 1)
+    next_page = page + 1 if has_more else None
+    if is_ajax:
+        movie_cards_html = render_template(
+            'search_results.html',
+            results=results,
+            current_page=page,
+            media_type=media_type,
+            query=query,
+            ajax=True
+        )
+        return jsonify({'html': movie_cards_html, 'has_more': has_more, 'next_page': next_page})
+
+    return render_template(
+        'search_results.html',
+        title=title,
+        query=query,
+        results=results,
+        current_page=page,
+        media_type=media_type,
+        has_more=has_more,
+        next_page=next_page
+    )
+
+
+def get_listing_feed(endpoint, fetch):
+    """
+    Get the paging feed of a listing for the current request.
+
+    Args:
+        endpoint (str): A key of LISTINGS
+        fetch (callable): The listing's fetch function from tmdb_api or tmdb_api_async
+
+    Returns:
+        tuple: (feed name, function fetching one upstream page, time window or None)
+    """
+    if LISTINGS[endpoint][1] != 'is_trending':
+        return endpoint, fetch, None
+    time_window = request.args.get('time_window', 'week')
+    return '{}:{}'.format(endpoint, time_window), lambda page: fetch(time_window, page), time_window
+
+
+def get_paging_options():
+    """
+    Get the snapshot arguments of paging.paginate for the current request.
+
+    Upstream pages are pinned to the scroll snapshot sent back by the
+    browser, so scrolling never re-fetches or skips items (see lib.paging).
+
+    Returns:
+        dict: snapshot, cache and ttl
+    """
+    return {
+        'snapshot': request.args.get('snapshot'),
+        'cache': paging.get_store(),
+        'ttl': current_app.config.get('PAGING_SNAPSHOT_TTL', paging.DEFAULT_SNAPSHOT_TTL)
+    }
+
+
+def listing_page(endpoint, results, page, is_ajax, time_window=None):
+    """
+    Render an infinite-scroll listing page, or only its cards for AJAX requests.
+
+    Args:
+        endpoint (str): A key of LISTINGS
+        results (dict): The logical page (see paging.paginate)
+        page (int): The logical page number
+        is_ajax (bool): Answer with the JSON envelope
+        time_window (str): The trending window, for trending listings
+    """
+    _, flag, media_type, title, subject = LISTINGS[endpoint]
+    if not results.get('results'):
+        return api_error_page(subject)
+
+    has_more = page < results.get('total_pages', 1)
+    next_page = page + 1 if has_more else None
+    extra = {flag: True}
+    if time_window is not None:
+        extra['time_window'] = time_window
+    if is_ajax:
+        movie_cards_html = render_template(
+            'search_results.html',
+            results=results,
+            current_page=page,
+            media_type=media_type,
+            ajax=True,
+            **extra
+        )
+        return jsonify({
+            'html': movie_cards_html,
+            'has_more': has_more,
+            'next_page': next_page,
+            'snapshot': results.get('snapshot')
+        })
+
+    if flag == 'is_recent':
+        extra['page_type'] = 'recent'
+    return render_template(
+        'search_results.html',
+        title=title,
+        results=results,
+        current_page=page,
+        media_type=media_type,
+        has_more=has_more,
+        next_page=next_page,
+        snapshot=results.get('snapshot'),
+        **extra
+    )
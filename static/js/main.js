@@ -51,6 +51,8 @@ function initializeInfiniteScroll() {
     let hasMore = container.dataset.hasMore === 'true' || container.dataset.hasMore === true;
     let nextPage = parseInt(container.dataset.nextPage, 10);
     if (isNaN(nextPage) || nextPage < 1) nextPage = 2;
+    // Scroll snapshot id: keeps listing pages consistent while scrolling
+    let snapshot = container.dataset.snapshot;
     
     // Track loaded item IDs to prevent duplicates
     const loadedItemIds = new Set();
@@ -151,6 +153,10 @@ function initializeInfiniteScroll() {
             return;
         }
         
+        if (snapshot) {
+            url += `&snapshot=${encodeURIComponent(snapshot)}`;
+        }
+        
         // Make AJAX request
         fetch(url)
             .then(response => {
@@ -221,7 +227,7 @@ function initializeInfiniteScroll() {
                                 movieCard.innerHTML = `
                                     <div class="movie-poster">
                                         ${item.profile_url ? 
-                                            `<img src="${item.profile_url}" alt="${item.name} Photo">` : 
+                                            `<img src="${item.profile_url}" loading="lazy" decoding="async" alt="${item.name} Photo">` : 
                                             '<div class="no-poster">No Photo Available</div>'}
                                     </div>
                                     <div class="movie-info">
@@ -236,7 +242,7 @@ function initializeInfiniteScroll() {
                                 movieCard.innerHTML = `
                                     <div class="movie-poster">
                                         ${item.poster_url ? 
-                                            `<img src="${item.poster_url}" alt="${item.name} Poster">` : 
+                                            `<img src="${item.poster_url}" loading="lazy" decoding="async" alt="${item.name} Poster">` : 
                                             '<div class="no-poster">No Poster Available</div>'}
                                     </div>
                                     <div class="movie-info">
@@ -252,7 +258,7 @@ function initializeInfiniteScroll() {
                                 movieCard.innerHTML = `
                                     <div class="movie-poster">
                                         ${item.poster_url ? 
-                                            `<img src="${item.poster_url}" alt="${item.title} Poster">` : 
+                                            `<img src="${item.poster_url}" loading="lazy" decoding="async" alt="${item.title} Poster">` : 
                                             '<div class="no-poster">No Poster Available</div>'}
                                     </div>
                                     <div class="movie-info">
@@ -286,6 +292,10 @@ function initializeInfiniteScroll() {
                 container.dataset.currentPage = String(currentPage);
                 container.dataset.hasMore = hasMore ? 'true' : 'false';
                 container.dataset.nextPage = String(nextPage);
+                if (data.snapshot) {
+                    snapshot = data.snapshot;
+                    container.dataset.snapshot = snapshot;
+                }
                 
                 // Hide loading indicator
                 if (loadingIndicator) {
@@ -1,9 +1,59 @@
 """
 TMDB API utility module for fetching movie and TV series data.
 """
+import json
+import re
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
 import requests
 from flask import current_app
 
+from lib import ratelimit, resilience, transport
+from lib.cache import LRUCache, SQLiteCache, TieredCache, SingleFlight
+
+# Maps endpoint patterns to the TMDB_CACHE_TTLS policy that applies to them.
+# The first matching pattern wins; unmatched endpoints use the 'default' policy.
+CACHE_POLICIES = [
+    (re.compile(r'^/genre/'), 'genres'),
+    (re.compile(r'^/trending/'), 'trending'),
+    (re.compile(r'^/(movie|tv)/(popular|top_rated|now_playing|on_the_air)$'), 'lists'),
+    (re.compile(r'^/discover/'), 'discover'),
+    (re.compile(r'^/search/'), 'search'),
+    (re.compile(r'^/(movie|tv|person)/\d+'), 'details'),
+]
+
+# Sub-resources fetched with every detail request, so a detail page needs a
+# single upstream round trip (see get_movie_bundle / get_tv_show_bundle)
+DETAIL_APPEND_TO_RESPONSE = 'videos,credits,external_ids,recommendations'
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Coalesces concurrent upstream fetches of the same cache key
+_flight = SingleFlight()
+
+# Per-thread flags, e.g. set by force_refresh()
+_local = threading.local()
+
+class UpstreamUnavailable(Exception):
+    """TMDB answered 429/5xx or could not be reached (as opposed to a 404 or an empty result)."""
+
+class CachedResponse:
+    """Minimal stand-in for requests.Response built from a cached body."""
+
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
 def get_api_url(endpoint, **kwargs):
     """
     Construct a TMDB API URL with the given endpoint and parameters.
@@ -39,6 +89,219 @@ def get_api_url(endpoint, **kwargs):
     
     return "{0}{1}?{2}".format(base_url, endpoint, query_string)
 
+class CachedCall:
+    """
+    Cache, breaker and rate limiter state of one http_get call.
+    
+    Built in the app context; shared by http_get and tmdb_api_async.http_get,
+    which only differ in how they wait on the upstream.
+    """
+    
+    def __init__(self, url):
+        """
+        Args:
+            url (str): The complete API URL
+        """
+        config = current_app.config
+        self.cache = get_cache()
+        self.key, endpoint = get_cache_key(url)
+        self.ttl = get_cache_ttl(endpoint)
+        self.stale_ttl = config.get('TMDB_CACHE_STALE_TTL', 0)
+        self.breaker = resilience.get_breaker(endpoint, config)
+        self.policy = resilience.RetryPolicy(config)
+        self.bucket = ratelimit.get_bucket(config)
+        self.max_wait = {level: ratelimit.get_max_wait(config, level) for level in ratelimit.PRIORITY_RESERVE}
+    
+    def cached(self):
+        """
+        Look the call up in the cache.
+        
+        Returns:
+            tuple: (content, whether to refresh it in the background) or None on a miss
+        """
+        entry = self.cache.get_entry(self.key) if self.cache is not None else None
+        if entry is None:
+            return None
+        content, fresh, _ = entry
+        return content, not fresh and not self.breaker.is_open()
+    
+    def store(self, response, stale=None):
+        """
+        Cache an upstream response.
+        
+        Args:
+            response: The response
+            stale (bytes): The expired copy being refreshed, if any
+        
+        Returns:
+            The response
+        """
+        # Only successful responses are cached; errors are always retried upstream
+        if self.cache is not None and response.status_code == 200:
+            self.cache.set(self.key, response.content, self.ttl, self.stale_ttl)
+        elif response.status_code in resilience.RETRY_STATUSES:
+            self.failed(stale)
+        return response
+    
+    def failed(self, stale=None):
+        """Keep serving the expired copy, if any, while the upstream is failing."""
+        if stale is not None:
+            self.cache.set(self.key, stale, 0, self.stale_ttl)
+    
+    def flight_key(self, level):
+        """Get the coalescing key of the call at a priority (see get_flight_key)."""
+        return get_flight_key(self.key, level)
+
+def http_get(url):
+    """
+    Perform a GET request against the TMDB API using the shared pooled session.
+    
+    Responses are cached per endpoint TTL (see CACHE_POLICIES) and served
+    stale for TMDB_CACHE_STALE_TTL seconds while one refresh runs. Concurrent
+    calls of the same priority share one upstream fetch. Retries, circuit
+    breakers and rate limiting live in lib/resilience.py and lib/ratelimit.py.
+    
+    Args:
+        url (str): The complete API URL (see get_api_url)
+    
+    Returns:
+        requests.Response: The upstream response (or a CachedResponse on a cache hit)
+    
+    Raises:
+        requests.exceptions.RequestException: The upstream call failed (including CircuitOpenError)
+    """
+    call = CachedCall(url)
+    session = transport.get_session(
+        pool_connections=current_app.config.get('TMDB_POOL_CONNECTIONS', transport.DEFAULT_POOL_CONNECTIONS),
+        pool_maxsize=current_app.config.get('TMDB_POOL_MAXSIZE', transport.DEFAULT_POOL_MAXSIZE)
+    )
+    
+    # Runs without an app context so it can also be used for background refreshes
+    def fetch(stale=None, level=None):
+        level = level or ratelimit.get_priority()
+        acquire = (lambda: call.bucket.acquire(level, call.max_wait[level])) if call.bucket is not None else None
+        try:
+            response = resilience.get(session, url, call.breaker, call.policy, acquire)
+        except requests.exceptions.RequestException:
+            call.failed(stale)
+            raise
+        return call.store(response, stale)
+    
+    if not getattr(_local, 'refresh', False):
+        entry = call.cached()
+        if entry is not None:
+            content, refresh = entry
+            if refresh:
+                _flight.do_background(call.flight_key(ratelimit.PREFETCH), lambda: fetch(content, ratelimit.PREFETCH))
+            return CachedResponse(content)
+    
+    level = ratelimit.get_priority()
+    return _flight.do(call.flight_key(level), lambda: fetch(level=level))
+
+def get_flight_key(key, level):
+    """
+    Get the coalescing key of a fetch at a priority.
+    
+    Args:
+        key (str): The cache key
+        level (str): The rate limiter priority class
+    
+    Returns:
+        str: The cache key itself for interactive calls, a per-priority key otherwise
+    """
+    return key if level == ratelimit.INTERACTIVE else '{}#{}'.format(key, level)
+
+@contextmanager
+def force_refresh():
+    """
+    Context manager making http_get bypass cached entries in this thread.
+    
+    Fetched responses still replace the cached entries, so background jobs
+    can refresh feeds before they expire.
+    """
+    previous = getattr(_local, 'refresh', False)
+    _local.refresh = True
+    try:
+        yield
+    finally:
+        _local.refresh = previous
+
+def get_cache():
+    """
+    Get the process-wide TMDB response cache, creating it on first use.
+    
+    Returns:
+        TieredCache: The response cache or None if caching is disabled
+    """
+    global _cache
+    if not current_app.config.get('TMDB_CACHE_ENABLED', True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                local = LRUCache(max_bytes=current_app.config.get('TMDB_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+                shared = None
+                shared_path = current_app.config.get('TMDB_CACHE_SHARED_PATH')
+                if shared_path:
+                    shared = SQLiteCache(shared_path)
+                _cache = TieredCache(local, shared)
+    return _cache
+
+def get_cache_key(url):
+    """
+    Build a cache key for a TMDB API URL.
+    
+    The API key is stripped and the query parameters are sorted so that
+    equivalent requests share a single entry.
+    
+    Args:
+        url (str): The complete API URL (see get_api_url)
+    
+    Returns:
+        tuple: (cache key, endpoint path relative to TMDB_API_URL)
+    """
+    parts = urlsplit(url)
+    base_path = urlsplit(current_app.config['TMDB_API_URL']).path.rstrip('/')
+    endpoint = parts.path[len(base_path):] if parts.path.startswith(base_path) else parts.path
+    params = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'api_key')
+    return "tmdb:{}?{}".format(endpoint, urlencode(params)), endpoint
+
+def get_cache_ttl(endpoint):
+    """
+    Get the cache TTL for a TMDB endpoint from the TMDB_CACHE_TTLS policies.
+    
+    Args:
+        endpoint (str): The API endpoint (e.g., '/movie/popular')
+    
+    Returns:
+        int: Time to live in seconds
+    """
+    ttls = current_app.config.get('TMDB_CACHE_TTLS', {})
+    for pattern, policy in CACHE_POLICIES:
+        if pattern.match(endpoint):
+            return ttls.get(policy, ttls.get('default', 300))
+    return ttls.get('default', 300)
+
+def cache_stats():
+    """
+    Get hit/miss/eviction counters for the TMDB response cache.
+    
+    Returns:
+        dict: Stats keyed by cache tier plus request coalescing counters,
+            or None if caching is disabled
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+    stats = cache.stats()
+    stats['upstream'] = _flight.stats()
+    return stats
+
+# Backdrops of list items are only shown small (cards, social previews); detail
+# pages show theirs full width. lib/images.py builds the responsive ladders.
+BACKDROP_SIZE = 'w780'
+HERO_BACKDROP_SIZE = 'w1280'
+
 def get_image_url(path, size='w500'):
     """
     Construct a TMDB image URL with the given path and size.
@@ -53,7 +316,11 @@ def get_image_url(path, size='w500'):
     if not path:
         return None
         
-    base_url = current_app.config['TMDB_IMAGE_BASE_URL']
+    if current_app.config.get('IMAGE_PROXY_ENABLED'):
+        # Served and cached by our own /img/<size>/<path> route (lib/imageproxy.py)
+        base_url = current_app.config.get('IMAGE_PROXY_BASE_URL', '/img/')
+    else:
+        base_url = current_app.config['TMDB_IMAGE_BASE_URL']
     return "{0}{1}{2}".format(base_url, size, path)
 
 def get_popular_movies(page=1):
@@ -65,11 +332,14 @@ def get_popular_movies(page=1):
     
     Returns:
         dict: The API response containing popular movies
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/movie/popular', page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -79,18 +349,21 @@ def get_popular_movies(page=1):
                 if movie.get('poster_path'):
                     movie['poster_url'] = get_image_url(movie['poster_path'])
                 if movie.get('backdrop_path'):
-                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], 'original')
+                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch popular movies. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch popular movies. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -104,11 +377,14 @@ def get_top_rated_movies(page=1):
     
     Returns:
         dict: The API response containing top-rated movies
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/movie/top_rated', page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -118,18 +394,21 @@ def get_top_rated_movies(page=1):
                 if movie.get('poster_path'):
                     movie['poster_url'] = get_image_url(movie['poster_path'])
                 if movie.get('backdrop_path'):
-                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], 'original')
+                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch top-rated movies. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch top-rated movies. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -143,11 +422,14 @@ def get_recently_released_movies(page=1):
     
     Returns:
         dict: The API response containing recently released movies
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/movie/now_playing', page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -157,18 +439,21 @@ def get_recently_released_movies(page=1):
                 if movie.get('poster_path'):
                     movie['poster_url'] = get_image_url(movie['poster_path'])
                 if movie.get('backdrop_path'):
-                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], 'original')
+                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch recently released movies. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch recently released movies. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -183,11 +468,14 @@ def get_trending_movies(time_window='week', page=1):
     
     Returns:
         dict: The API response containing trending movies
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/trending/movie/{}'.format(time_window), page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -197,18 +485,21 @@ def get_trending_movies(time_window='week', page=1):
                 if movie.get('poster_path'):
                     movie['poster_url'] = get_image_url(movie['poster_path'])
                 if movie.get('backdrop_path'):
-                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], 'original')
+                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch trending movies. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch trending movies. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -225,7 +516,7 @@ def get_movie_external_ids(movie_id):
     """
     try:
         url = get_api_url('/movie/{}/external_ids'.format(movie_id))
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             return response.json()
@@ -259,19 +550,26 @@ def get_embess_url(imdb_id):
     base_url = current_app.config['EMBESS_BASE_URL']
     return "{0}{1}".format(base_url, imdb_id)
 
-def get_movie_details(movie_id):
+def get_movie_bundle(movie_id):
     """
-    Get detailed information for a specific movie.
+    Get the details and related movies for a specific movie in one request.
+    
+    Recommendations are fetched through append_to_response together with
+    videos, credits and external IDs, so detail and watch pages need a
+    single upstream round trip.
     
     Args:
         movie_id (int): The TMDB movie ID
     
     Returns:
-        dict: The movie details or None if not found
+        tuple: (movie details or None if not found, list of up to 10 related movies)
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
-        url = get_api_url('/movie/{}'.format(movie_id), append_to_response='videos,credits,external_ids')
-        response = requests.get(url)
+        url = get_api_url('/movie/{}'.format(movie_id), append_to_response=DETAIL_APPEND_TO_RESPONSE)
+        response = http_get(url)
         
         if response.status_code == 200:
             movie = response.json()
@@ -280,7 +578,7 @@ def get_movie_details(movie_id):
             if movie.get('poster_path'):
                 movie['poster_url'] = get_image_url(movie['poster_path'])
             if movie.get('backdrop_path'):
-                movie['backdrop_url'] = get_image_url(movie['backdrop_path'], 'original')
+                movie['backdrop_url'] = get_image_url(movie['backdrop_path'], HERO_BACKDROP_SIZE)
                 
             # Process cast members
             cast = movie.get('credits', {}).get('cast', [])
@@ -288,20 +586,41 @@ def get_movie_details(movie_id):
                 if person.get('profile_path'):
                     person['profile_url'] = get_image_url(person['profile_path'], 'w185')
             
-            return movie
+            # Related movies come from the appended recommendations
+            related = movie.pop('recommendations', {}).get('results', [])[:10]  # Limit to 10 items
+            for related_movie in related:
+                if related_movie.get('poster_path'):
+                    related_movie['poster_url'] = get_image_url(related_movie['poster_path'])
+                if related_movie.get('backdrop_path'):
+                    related_movie['backdrop_url'] = get_image_url(related_movie['backdrop_path'], BACKDROP_SIZE)
+            
+            return movie, related
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
         elif response.status_code == 404:
             print("Error: Movie with ID {} not found. Status code: {}".format(movie_id, response.status_code))
-        else:
-            print("Error: Failed to fetch movie details. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch movie details. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not a missing title
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
-    return None
+    return None, []
+
+def get_movie_details(movie_id):
+    """
+    Get detailed information for a specific movie.
+    
+    Args:
+        movie_id (int): The TMDB movie ID
+    
+    Returns:
+        dict: The movie details or None if not found
+    """
+    return get_movie_bundle(movie_id)[0]
 
 def search_movies(query, page=1):
     """
@@ -313,10 +632,13 @@ def search_movies(query, page=1):
     
     Returns:
         dict: The API response containing search results
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         url = get_api_url('/search/movie', query=query, page=page)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -326,18 +648,21 @@ def search_movies(query, page=1):
                 if movie.get('poster_path'):
                     movie['poster_url'] = get_image_url(movie['poster_path'])
                 if movie.get('backdrop_path'):
-                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], 'original')
+                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to search movies. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to search movies. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -348,22 +673,28 @@ def get_movie_genres():
     
     Returns:
         list: The list of genres or empty list if not found
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         url = get_api_url('/genre/movie/list')
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             return response.json().get('genres', [])
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch movie genres. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch movie genres. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     return []
 
@@ -377,11 +708,14 @@ def get_movies_by_genre(genre_id, page=1):
     
     Returns:
         dict: The API response containing movies in the specified genre
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/discover/movie', with_genres=genre_id, page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -391,18 +725,21 @@ def get_movies_by_genre(genre_id, page=1):
                 if movie.get('poster_path'):
                     movie['poster_url'] = get_image_url(movie['poster_path'])
                 if movie.get('backdrop_path'):
-                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], 'original')
+                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch movies by genre. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch movies by genre. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -416,11 +753,14 @@ def get_popular_tv_shows(page=1):
     
     Returns:
         dict: The API response containing popular TV shows
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/tv/popular', page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -430,18 +770,21 @@ def get_popular_tv_shows(page=1):
                 if show.get('poster_path'):
                     show['poster_url'] = get_image_url(show['poster_path'])
                 if show.get('backdrop_path'):
-                    show['backdrop_url'] = get_image_url(show['backdrop_path'], 'original')
+                    show['backdrop_url'] = get_image_url(show['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch popular TV shows. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch popular TV shows. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -456,11 +799,14 @@ def get_trending_tv_shows(time_window='week', page=1):
     
     Returns:
         dict: The API response containing trending TV shows
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/trending/tv/{}'.format(time_window), page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -470,18 +816,21 @@ def get_trending_tv_shows(time_window='week', page=1):
                 if show.get('poster_path'):
                     show['poster_url'] = get_image_url(show['poster_path'])
                 if show.get('backdrop_path'):
-                    show['backdrop_url'] = get_image_url(show['backdrop_path'], 'original')
+                    show['backdrop_url'] = get_image_url(show['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch trending TV shows. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch trending TV shows. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -498,7 +847,7 @@ def get_tv_external_ids(tv_id):
     """
     try:
         url = get_api_url('/tv/{}/external_ids'.format(tv_id))
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             return response.json()
@@ -516,19 +865,26 @@ def get_tv_external_ids(tv_id):
     
     return None
 
-def get_tv_show_details(tv_id):
+def get_tv_show_bundle(tv_id):
     """
-    Get detailed information for a specific TV show.
+    Get the details and related TV shows for a specific TV show in one request.
+    
+    Recommendations are fetched through append_to_response together with
+    videos, credits and external IDs, so detail and watch pages need a
+    single upstream round trip.
     
     Args:
         tv_id (int): The TMDB TV show ID
     
     Returns:
-        dict: The TV show details or None if not found
+        tuple: (TV show details or None if not found, list of up to 10 related TV shows)
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
-        url = get_api_url('/tv/{}'.format(tv_id), append_to_response='videos,credits,external_ids')
-        response = requests.get(url)
+        url = get_api_url('/tv/{}'.format(tv_id), append_to_response=DETAIL_APPEND_TO_RESPONSE)
+        response = http_get(url)
         
         if response.status_code == 200:
             show = response.json()
@@ -537,7 +893,7 @@ def get_tv_show_details(tv_id):
             if show.get('poster_path'):
                 show['poster_url'] = get_image_url(show['poster_path'])
             if show.get('backdrop_path'):
-                show['backdrop_url'] = get_image_url(show['backdrop_path'], 'original')
+                show['backdrop_url'] = get_image_url(show['backdrop_path'], HERO_BACKDROP_SIZE)
                 
             # Process cast members
             cast = show.get('credits', {}).get('cast', [])
@@ -545,20 +901,41 @@ def get_tv_show_details(tv_id):
                 if person.get('profile_path'):
                     person['profile_url'] = get_image_url(person['profile_path'], 'w185')
             
-            return show
+            # Related TV shows come from the appended recommendations
+            related = show.pop('recommendations', {}).get('results', [])[:10]  # Limit to 10 items
+            for related_show in related:
+                if related_show.get('poster_path'):
+                    related_show['poster_url'] = get_image_url(related_show['poster_path'])
+                if related_show.get('backdrop_path'):
+                    related_show['backdrop_url'] = get_image_url(related_show['backdrop_path'], BACKDROP_SIZE)
+            
+            return show, related
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
         elif response.status_code == 404:
             print("Error: TV show with ID {} not found. Status code: {}".format(tv_id, response.status_code))
-        else:
-            print("Error: Failed to fetch TV show details. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch TV show details. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not a missing title
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
-    return None
+    return None, []
+
+def get_tv_show_details(tv_id):
+    """
+    Get detailed information for a specific TV show.
+    
+    Args:
+        tv_id (int): The TMDB TV show ID
+    
+    Returns:
+        dict: The TV show details or None if not found
+    """
+    return get_tv_show_bundle(tv_id)[0]
 
 def search_tv_shows(query, page=1):
     """
@@ -570,10 +947,13 @@ def search_tv_shows(query, page=1):
     
     Returns:
         dict: The API response containing search results
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         url = get_api_url('/search/tv', query=query, page=page)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -583,18 +963,21 @@ def search_tv_shows(query, page=1):
                 if show.get('poster_path'):
                     show['poster_url'] = get_image_url(show['poster_path'])
                 if show.get('backdrop_path'):
-                    show['backdrop_url'] = get_image_url(show['backdrop_path'], 'original')
+                    show['backdrop_url'] = get_image_url(show['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to search TV shows. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to search TV shows. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -605,22 +988,28 @@ def get_tv_show_genres():
     
     Returns:
         list: The list of genres or empty list if not found
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         url = get_api_url('/genre/tv/list')
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             return response.json().get('genres', [])
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch TV show genres. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch TV show genres. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     return []
 
@@ -634,11 +1023,14 @@ def get_tv_shows_by_genre(genre_id, page=1):
     
     Returns:
         dict: The API response containing TV shows in the specified genre
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/discover/tv', with_genres=genre_id, page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -648,18 +1040,21 @@ def get_tv_shows_by_genre(genre_id, page=1):
                 if show.get('poster_path'):
                     show['poster_url'] = get_image_url(show['poster_path'])
                 if show.get('backdrop_path'):
-                    show['backdrop_url'] = get_image_url(show['backdrop_path'], 'original')
+                    show['backdrop_url'] = get_image_url(show['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch TV shows by genre. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch TV shows by genre. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -673,11 +1068,14 @@ def get_recently_released_tv_shows(page=1):
     
     Returns:
         dict: The API response containing recently released TV shows
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/tv/on_the_air', page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -687,18 +1085,21 @@ def get_recently_released_tv_shows(page=1):
                 if show.get('poster_path'):
                     show['poster_url'] = get_image_url(show['poster_path'])
                 if show.get('backdrop_path'):
-                    show['backdrop_url'] = get_image_url(show['backdrop_path'], 'original')
+                    show['backdrop_url'] = get_image_url(show['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch recently released TV shows. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch recently released TV shows. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -712,11 +1113,14 @@ def get_top_rated_tv_shows(page=1):
     
     Returns:
         dict: The API response containing top-rated TV shows
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         # Try different parameter names for controlling items per page
         url = get_api_url('/tv/top_rated', page=page, limit=24)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -726,18 +1130,21 @@ def get_top_rated_tv_shows(page=1):
                 if show.get('poster_path'):
                     show['poster_url'] = get_image_url(show['poster_path'])
                 if show.get('backdrop_path'):
-                    show['backdrop_url'] = get_image_url(show['backdrop_path'], 'original')
+                    show['backdrop_url'] = get_image_url(show['backdrop_path'], BACKDROP_SIZE)
             
             return data
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch top-rated TV shows. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to fetch top-rated TV shows. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -779,79 +1186,31 @@ def get_related_movies(movie_id):
     """
     Get related movies for a specific movie.
     
+    Served from the detail bundle (see get_movie_bundle), so calling this
+    after get_movie_details does not cost another upstream request.
+    
     Args:
         movie_id (int): The TMDB movie ID
     
     Returns:
         list: A list of related movies or empty list if not found
     """
-    try:
-        url = get_api_url('/movie/{}/recommendations'.format(movie_id))
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Process the results to add complete image URLs
-            for movie in data.get('results', [])[:10]:  # Limit to 10 items
-                if movie.get('poster_path'):
-                    movie['poster_url'] = get_image_url(movie['poster_path'])
-                if movie.get('backdrop_path'):
-                    movie['backdrop_url'] = get_image_url(movie['backdrop_path'], 'original')
-            
-            return data.get('results', [])[:10]  # Return only the first 10 items
-        elif response.status_code == 401:
-            # Unauthorized - likely an invalid API key
-            print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
-        elif response.status_code == 404:
-            print("Error: Movie with ID {} not found. Status code: {}".format(movie_id, response.status_code))
-        else:
-            print("Error: Failed to fetch related movies. Status code: {}".format(response.status_code))
-    except ValueError as e:
-        print("Error: {}".format(str(e)))
-    except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
-    
-    return []
+    return get_movie_bundle(movie_id)[1]
 
 def get_related_tv_shows(tv_id):
     """
     Get related TV shows for a specific TV show.
     
+    Served from the detail bundle (see get_tv_show_bundle), so calling this
+    after get_tv_show_details does not cost another upstream request.
+    
     Args:
         tv_id (int): The TMDB TV show ID
     
     Returns:
         list: A list of related TV shows or empty list if not found
     """
-    try:
-        url = get_api_url('/tv/{}/recommendations'.format(tv_id))
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Process the results to add complete image URLs
-            for show in data.get('results', [])[:10]:  # Limit to 10 items
-                if show.get('poster_path'):
-                    show['poster_url'] = get_image_url(show['poster_path'])
-                if show.get('backdrop_path'):
-                    show['backdrop_url'] = get_image_url(show['backdrop_path'], 'original')
-            
-            return data.get('results', [])[:10]  # Return only the first 10 items
-        elif response.status_code == 401:
-            # Unauthorized - likely an invalid API key
-            print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
-        elif response.status_code == 404:
-            print("Error: TV show with ID {} not found. Status code: {}".format(tv_id, response.status_code))
-        else:
-            print("Error: Failed to fetch related TV shows. Status code: {}".format(response.status_code))
-    except ValueError as e:
-        print("Error: {}".format(str(e)))
-    except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
-    
-    return []
+    return get_tv_show_bundle(tv_id)[1]
 
 def search_actors(query, page=1):
     """
@@ -863,10 +1222,13 @@ def search_actors(query, page=1):
     
     Returns:
         dict: The API response containing search results
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         url = get_api_url('/search/person', query=query, page=page)
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -893,12 +1255,15 @@ def search_actors(query, page=1):
         elif response.status_code == 401:
             # Unauthorized - likely an invalid API key
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to search actors. Status code: {}".format(response.status_code))
         else:
             print("Error: Failed to search actors. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not an empty listing
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     # Return empty results on error
     return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
@@ -912,10 +1277,13 @@ def get_actor_details(actor_id):
     
     Returns:
         dict: The actor details or None if not found
+    
+    Raises:
+        UpstreamUnavailable: TMDB failed or could not be reached
     """
     try:
         url = get_api_url('/person/{}'.format(actor_id), append_to_response='movie_credits,tv_credits,images')
-        response = requests.get(url)
+        response = http_get(url)
         
         if response.status_code == 200:
             actor = response.json()
@@ -956,11 +1324,12 @@ def get_actor_details(actor_id):
             print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
         elif response.status_code == 404:
             print("Error: Actor with ID {} not found. Status code: {}".format(actor_id, response.status_code))
-        else:
-            print("Error: Failed to fetch actor details. Status code: {}".format(response.status_code))
+        elif response.status_code in resilience.RETRY_STATUSES:
+            raise UpstreamUnavailable("Failed to fetch actor details. Status code: {}".format(response.status_code))
     except ValueError as e:
         print("Error: {}".format(str(e)))
     except requests.exceptions.RequestException as e:
-        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+        # Timeouts, connection errors, open breakers and shed calls: not a missing title
+        raise UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
     
     return None
\ No newline at end of file
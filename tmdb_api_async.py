@@ -0,0 +1,364 @@
+"""
+Async TMDB API client with the same surface as tmdb_api.
+
+Requests go through a pooled httpx.AsyncClient (one per event loop) and share
+URL building, image URLs and the response cache with tmdb_api, so sync and
+async routes see the same cached data. Functions must be awaited inside an
+application context.
+"""
+import asyncio
+
+import httpx
+from flask import current_app
+
+import tmdb_api
+from lib import ratelimit, resilience
+from tmdb_api import BACKDROP_SIZE, DETAIL_APPEND_TO_RESPONSE, HERO_BACKDROP_SIZE, get_api_url, get_image_url
+
+_clients = {}
+
+# In-flight upstream fetches per event loop, keyed by cache key
+_inflight = {}
+
+def get_client():
+    """
+    Get the pooled async HTTP client for the running event loop.
+
+    Returns:
+        httpx.AsyncClient: The shared client
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(
+            max_connections=current_app.config.get('TMDB_POOL_MAXSIZE', 32),
+            max_keepalive_connections=current_app.config.get('TMDB_POOL_MAXSIZE', 32)
+        )
+        client = httpx.AsyncClient(
+            limits=limits,
+            headers={'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'}
+        )
+        _clients[loop] = client
+    return client
+
+async def close_client():
+    """Close the async HTTP client for the running event loop."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+async def _get_with_retries(client, url, breaker, policy, acquire=None):
+    # Async counterpart of resilience.get
+    attempts = resilience.Attempts(breaker, policy)
+    connect_timeout, read_timeout = policy.timeout
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    while True:
+        response = error = None
+        if acquire is not None:
+            try:
+                await acquire()
+            except Exception:
+                attempts.abandon()
+                raise
+        try:
+            response = await client.get(url, timeout=timeout)
+        except httpx.TransportError as e:
+            error = e
+        delay = attempts.record(response)
+        if delay is None:
+            if response is not None:
+                return response
+            raise error
+        await asyncio.sleep(delay)
+
+async def http_get(url):
+    """
+    Perform a GET request against the TMDB API using the pooled async client.
+
+    Mirrors tmdb_api.http_get: responses are cached per endpoint policy,
+    concurrent fetches of the same key are coalesced within the event loop,
+    stale entries are served while one background refresh runs, and calls use
+    the same timeouts, retries and circuit breakers.
+
+    Args:
+        url (str): The complete API URL (see get_api_url)
+
+    Returns:
+        httpx.Response: The upstream response (or a CachedResponse on a cache hit)
+    """
+    call = tmdb_api.CachedCall(url)
+    client = get_client()
+    inflight = _inflight.setdefault(asyncio.get_running_loop(), {})
+
+    async def fetch(level, stale=None):
+        acquire = (lambda: call.bucket.acquire_async(level, call.max_wait[level])) if call.bucket is not None else None
+        try:
+            response = await _get_with_retries(client, url, call.breaker, call.policy, acquire)
+        except (httpx.HTTPError, resilience.CircuitOpenError, ratelimit.RateLimitedError):
+            call.failed(stale)
+            raise
+        return call.store(response, stale)
+
+    def start(level, stale=None):
+        # Only calls of the same priority share a fetch (see tmdb_api.http_get)
+        flight_key = call.flight_key(level)
+
+        def done(task):
+            inflight.pop(flight_key, None)
+            # Background refreshes have no awaiter, so report their failures here
+            if not task.cancelled() and task.exception() is not None:
+                print("Error: Failed to connect to TMDB API. {}".format(str(task.exception())))
+
+        task = inflight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(fetch(level, stale))
+            inflight[flight_key] = task
+            task.add_done_callback(done)
+        return task
+
+    entry = call.cached()
+    if entry is not None:
+        content, refresh = entry
+        # Requests are interactive; stale-while-revalidate refreshes are prefetch
+        if refresh:
+            start(ratelimit.PREFETCH, content)
+        return tmdb_api.CachedResponse(content)
+
+    task = start(ratelimit.get_priority())
+    # Shield so a cancelled caller does not cancel the fetch other callers wait on
+    return await asyncio.shield(task)
+
+def _add_media_urls(items):
+    for item in items:
+        if item.get('poster_path'):
+            item['poster_url'] = get_image_url(item['poster_path'])
+        if item.get('backdrop_path'):
+            item['backdrop_url'] = get_image_url(item['backdrop_path'], BACKDROP_SIZE)
+
+def _add_cast_urls(item):
+    for person in item.get('credits', {}).get('cast', []):
+        if person.get('profile_path'):
+            person['profile_url'] = get_image_url(person['profile_path'], 'w185')
+
+async def _get_json(url, description, not_found=None, raise_unavailable=False):
+    """
+    Fetch a TMDB URL and decode it, logging failures like tmdb_api does.
+
+    Args:
+        url (str): The complete API URL
+        description (str): What is being fetched, used in error messages
+        not_found (str): Error message to print on 404, if any
+        raise_unavailable (bool): Raise instead of returning None when TMDB
+            answered 429/5xx or could not be reached, so pages can tell an
+            outage from a missing title or an empty listing
+
+    Returns:
+        dict: The decoded response or None on error
+
+    Raises:
+        tmdb_api.UpstreamUnavailable: With raise_unavailable, on upstream failure
+    """
+    try:
+        response = await http_get(url)
+        if response.status_code == 200:
+            return response.json()
+        elif response.status_code == 401:
+            # Unauthorized - likely an invalid API key
+            print("Error: Unauthorized API request. Check your TMDB API key. Status code: {}".format(response.status_code))
+        elif response.status_code == 404 and not_found:
+            print("Error: {}. Status code: {}".format(not_found, response.status_code))
+        elif raise_unavailable and response.status_code in resilience.RETRY_STATUSES:
+            raise tmdb_api.UpstreamUnavailable("Failed to fetch {}. Status code: {}".format(description, response.status_code))
+        else:
+            print("Error: Failed to fetch {}. Status code: {}".format(description, response.status_code))
+    except ValueError as e:
+        print("Error: {}".format(str(e)))
+    except (httpx.HTTPError, resilience.CircuitOpenError, ratelimit.RateLimitedError) as e:
+        if raise_unavailable:
+            raise tmdb_api.UpstreamUnavailable("Failed to connect to TMDB API. {}".format(str(e))) from e
+        print("Error: Failed to connect to TMDB API. {}".format(str(e)))
+    return None
+
+async def _get_list(endpoint, page, description, **params):
+    try:
+        url = get_api_url(endpoint, page=page, **params)
+    except ValueError as e:
+        print("Error: {}".format(str(e)))
+        url = None
+    data = await _get_json(url, description, raise_unavailable=True) if url else None
+    if data is None:
+        # Return empty results on error
+        return {'results': [], 'total_pages': 0, 'total_results': 0, 'page': page}
+    _add_media_urls(data.get('results', []))
+    return data
+
+async def get_popular_movies(page=1):
+    """Async version of tmdb_api.get_popular_movies."""
+    return await _get_list('/movie/popular', page, 'popular movies', limit=24)
+
+async def get_top_rated_movies(page=1):
+    """Async version of tmdb_api.get_top_rated_movies."""
+    return await _get_list('/movie/top_rated', page, 'top-rated movies', limit=24)
+
+async def get_recently_released_movies(page=1):
+    """Async version of tmdb_api.get_recently_released_movies."""
+    return await _get_list('/movie/now_playing', page, 'recently released movies', limit=24)
+
+async def get_trending_movies(time_window='week', page=1):
+    """Async version of tmdb_api.get_trending_movies."""
+    return await _get_list('/trending/movie/{}'.format(time_window), page, 'trending movies', limit=24)
+
+async def get_movies_by_genre(genre_id, page=1):
+    """Async version of tmdb_api.get_movies_by_genre."""
+    return await _get_list('/discover/movie', page, 'movies by genre', with_genres=genre_id, limit=24)
+
+async def search_movies(query, page=1):
+    """Async version of tmdb_api.search_movies."""
+    return await _get_list('/search/movie', page, 'search results for movies', query=query)
+
+async def get_popular_tv_shows(page=1):
+    """Async version of tmdb_api.get_popular_tv_shows."""
+    return await _get_list('/tv/popular', page, 'popular TV shows', limit=24)
+
+async def get_trending_tv_shows(time_window='week', page=1):
+    """Async version of tmdb_api.get_trending_tv_shows."""
+    return await _get_list('/trending/tv/{}'.format(time_window), page, 'trending TV shows', limit=24)
+
+async def get_tv_shows_by_genre(genre_id, page=1):
+    """Async version of tmdb_api.get_tv_shows_by_genre."""
+    return await _get_list('/discover/tv', page, 'TV shows by genre', with_genres=genre_id, limit=24)
+
+async def get_recently_released_tv_shows(page=1):
+    """Async version of tmdb_api.get_recently_released_tv_shows."""
+    return await _get_list('/tv/on_the_air', page, 'recently released TV shows', limit=24)
+
+async def get_top_rated_tv_shows(page=1):
+    """Async version of tmdb_api.get_top_rated_tv_shows."""
+    return await _get_list('/tv/top_rated', page, 'top-rated TV shows', limit=24)
+
+async def search_tv_shows(query, page=1):
+    """Async version of tmdb_api.search_tv_shows."""
+    return await _get_list('/search/tv', page, 'search results for TV shows', query=query)
+
+async def search_actors(query, page=1):
+    """Async version of tmdb_api.search_actors."""
+    data = await _get_list('/search/person', page, 'search results for actors', query=query)
+    for person in data.get('results', []):
+        person['profile_url'] = get_image_url(person['profile_path'], 'w185') if person.get('profile_path') else None
+        person['known_for_titles'] = [
+            item['title'] if item.get('media_type') == 'movie' else item['name']
+            for item in person.get('known_for', [])
+            if (item.get('media_type') == 'movie' and item.get('title')) or (item.get('media_type') == 'tv' and item.get('name'))
+        ]
+    return data
+
+async def _get_genres(endpoint, description):
+    try:
+        data = await _get_json(get_api_url(endpoint), description, raise_unavailable=True)
+    except ValueError as e:
+        print("Error: {}".format(str(e)))
+        data = None
+    return data.get('genres', []) if data else []
+
+async def get_movie_genres():
+    """Async version of tmdb_api.get_movie_genres."""
+    return await _get_genres('/genre/movie/list', 'movie genres')
+
+async def get_tv_show_genres():
+    """Async version of tmdb_api.get_tv_show_genres."""
+    return await _get_genres('/genre/tv/list', 'TV show genres')
+
+async def _get_bundle(endpoint, description, not_found):
+    try:
+        item = await _get_json(
+            get_api_url(endpoint, append_to_response=DETAIL_APPEND_TO_RESPONSE), description, not_found,
+            raise_unavailable=True
+        )
+    except ValueError as e:
+        print("Error: {}".format(str(e)))
+        return None, []
+    if item is None:
+        return None, []
+    if item.get('poster_path'):
+        item['poster_url'] = get_image_url(item['poster_path'])
+    if item.get('backdrop_path'):
+        item['backdrop_url'] = get_image_url(item['backdrop_path'], HERO_BACKDROP_SIZE)
+    _add_cast_urls(item)
+    related = item.pop('recommendations', {}).get('results', [])[:10]  # Limit to 10 items
+    _add_media_urls(related)
+    return item, related
+
+async def get_movie_bundle(movie_id):
+    """Async version of tmdb_api.get_movie_bundle."""
+    return await _get_bundle(
+        '/movie/{}'.format(movie_id), 'movie details',
+        'Movie with ID {} not found'.format(movie_id)
+    )
+
+async def get_tv_show_bundle(tv_id):
+    """Async version of tmdb_api.get_tv_show_bundle."""
+    return await _get_bundle(
+        '/tv/{}'.format(tv_id), 'TV show details',
+        'TV show with ID {} not found'.format(tv_id)
+    )
+
+async def get_movie_details(movie_id):
+    """Async version of tmdb_api.get_movie_details."""
+    return (await get_movie_bundle(movie_id))[0]
+
+async def get_tv_show_details(tv_id):
+    """Async version of tmdb_api.get_tv_show_details."""
+    return (await get_tv_show_bundle(tv_id))[0]
+
+async def get_related_movies(movie_id):
+    """Async version of tmdb_api.get_related_movies."""
+    return (await get_movie_bundle(movie_id))[1]
+
+async def get_related_tv_shows(tv_id):
+    """Async version of tmdb_api.get_related_tv_shows."""
+    return (await get_tv_show_bundle(tv_id))[1]
+
+async def get_movie_external_ids(movie_id):
+    """Async version of tmdb_api.get_movie_external_ids."""
+    try:
+        return await _get_json(
+            get_api_url('/movie/{}/external_ids'.format(movie_id)), 'movie external IDs',
+            'Movie with ID {} not found'.format(movie_id)
+        )
+    except ValueError as e:
+        print("Error: {}".format(str(e)))
+        return None
+
+async def get_tv_external_ids(tv_id):
+    """Async version of tmdb_api.get_tv_external_ids."""
+    try:
+        return await _get_json(
+            get_api_url('/tv/{}/external_ids'.format(tv_id)), 'TV show external IDs',
+            'TV show with ID {} not found'.format(tv_id)
+        )
+    except ValueError as e:
+        print("Error: {}".format(str(e)))
+        return None
+
+async def get_actor_details(actor_id):
+    """Async version of tmdb_api.get_actor_details."""
+    try:
+        actor = await _get_json(
+            get_api_url('/person/{}'.format(actor_id), append_to_response='movie_credits,tv_credits,images'),
+            'actor details', 'Actor with ID {} not found'.format(actor_id), raise_unavailable=True
+        )
+    except ValueError as e:
+        print("Error: {}".format(str(e)))
+        return None
+    if actor is None:
+        return None
+    if actor.get('profile_path'):
+        actor['profile_url'] = get_image_url(actor['profile_path'], 'w500')
+    for credits_key in ('movie_credits', 'tv_credits'):
+        credits = actor.get(credits_key, {}).get('cast', [])
+        for item in credits:
+            if item.get('poster_path'):
+                item['poster_url'] = get_image_url(item['poster_path'], 'w185')
+        # Sort credits by popularity (descending)
+        actor.setdefault(credits_key, {})['cast'] = sorted(credits, key=lambda x: x.get('popularity', 0), reverse=True)
+    return actor